@@ -3,25 +3,39 @@ import sys
 from mmif import Mmif
 from mmif import Annotation
 
-from graph import Graph, normalize_id
+from summarizer.graph import Graph, GraphException
+from summarizer.utils import normalized_properties
 
 
-def cut(fname: str, start: int, end: int):
-
-	mmif = Mmif(open(fname).read())
-	graph = Graph(mmif)
+def cut(fname: str, start: int, end: int) -> Graph:
+	"""Trim the graph of a MMIF file or a graph snapshot to the nodes between
+	start and end (in milliseconds) and return the trimmed graph."""
+	if Graph.is_snapshot(fname):
+		graph = Graph.load(fname)
+	else:
+		mmif = Mmif(open(fname).read())
+		graph = Graph(mmif)
 	print()
 	print(graph)
 	graph.trim(start, end)
 	print(graph)
-	exit()
+	return graph
+
 
+def cut_mmif(fname: str, start: int, end: int):
+	"""Remove the annotations outside of start and end from the MMIF file and
+	write the result to new_mmif.json. This needs the MMIF file, a snapshot does
+	not have the annotations."""
+	# TODO: this is work in progress and not used by the command line yet
+	if Graph.is_snapshot(fname):
+		raise GraphException(f'Cannot cut the MMIF of a graph snapshot: {fname}')
+	mmif = Mmif(open(fname).read())
 	print()	
 	removed = set()
 	for view in mmif.views:
 		sys.stderr.write(f'{view.id} {view.metadata.app} {len(view.annotations)}\n')
 		for annotation in view.annotations:
-			normalize_id(view, annotation)
+			annotation.properties.update(normalized_properties(set(), view, annotation))
 		annotations = []
 		for anno in view.annotations:
 			if keep(anno, start, end):
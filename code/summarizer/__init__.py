@@ -1,43 +1,105 @@
 
+import sys
 import argparse
-import pathlib
+from summarizer import stats
+from summarizer.config import RunConfig, GRANULARITY
 from summarizer.summary import Summary
+from summarizer.stream import summarize_stream
+from summarizer.batch import Batch
 from summarizer.summary2html import main as create_html
 
 
 def argparser():
     parser = argparse.ArgumentParser(description='Create a JSON Summary for a MMIF file')
     parser.add_argument('-d', metavar='DIRECTORY', help='directory with input files')
-    parser.add_argument('-i', metavar='MMIF_FILE', help='input MMIF file')
+    parser.add_argument('-i', metavar='MMIF_FILE', help='input MMIF file or graph snapshot')
     parser.add_argument('-o', metavar='JSON_FILE', help='output summary file')
+    parser.add_argument('--snapshot', metavar='FILE', help='save a snapshot of the graph to FILE')
+    parser.add_argument('--html', metavar='DIRECTORY', help='create the HTML mini-site in DIRECTORY')
+    parser.add_argument('--static', action='store_true', help='with --html, shared stylesheet and precompressed pages')
+    parser.add_argument('-r', '--recursive', action='store_true', help='in -d mode, include subdirectories')
+    parser.add_argument('--outdir', metavar='DIRECTORY', help='in -d mode, write summaries to a mirrored tree in DIRECTORY')
+    parser.add_argument('--journal', metavar='FILE', help='in -d mode, journal of completed files used to resume runs')
+    parser.add_argument('--timeout', metavar='SECONDS', type=float, help='in -d mode, time limit per file')
+    parser.add_argument('--memory', metavar='MB', type=int, help='in -d mode, memory limit per file')
+    parser.add_argument('--failures', metavar='FILE', help='in -d mode, report with files that failed')
+    parser.add_argument('--metrics', metavar='FILE', help='in -d mode, write run metrics in Prometheus and JSON format')
+    parser.add_argument('--compress', choices=['gz', 'bz2', 'xz'], help='compress output files in -d mode')
+    parser.add_argument('--stream', action='store_true', help='summarize MMIF lines from stdin to stdout')
+    parser.add_argument('-0', '--null', action='store_true', help='with --stream, read NUL-separated paths')
+    parser.add_argument('--diagnostics', action='store_true', help='add diagnostics to the summary')
+    parser.add_argument('--stats-only', action='store_true', help='only print documents and view statistics, fast')
     parser.add_argument('--full', action='store_true', help='print full report')
     parser.add_argument('--transcript', action='store_true', help='print transcript')
+    parser.add_argument('--all-transcripts', action='store_true', help='print transcripts of all ASR views')
     parser.add_argument('--captions', action='store_true', help='print Llava captions')
     parser.add_argument('--timeframes', action='store_true', help='print all time frames')
-    #parser.add_argument('--entities', action='store_true', help='print entities from transcript')
+    parser.add_argument('--ocr', action='store_true', help='print text recognized by OCR apps')
+    parser.add_argument('--timeline', action='store_true', help='print all sections as one time-ordered list')
+    parser.add_argument('--granularity', metavar='MS', type=int, default=GRANULARITY, help='maximum distance between grouped entities')
+    parser.add_argument('--min-score', metavar='SCORE', type=float, help='only time frames with at least this score')
+    parser.add_argument('--labels', metavar='LABELS', help='only time frames with one of these comma-separated labels')
+    parser.add_argument('--min-duration', metavar='MS', type=float, help='only time frames with at least this duration')
+    parser.add_argument('--entities', action='store_true', help='print entities from transcript')
     return parser
 
 
 def create_summary():
+    # "summarize index ..." is handed off to the corpus index
+    if sys.argv[1:2] == ['index']:
+        from summarizer.index import main as create_index
+        create_index(sys.argv[2:])
+        return
+    # "summarize site ..." is handed off to the corpus site
+    if sys.argv[1:2] == ['site']:
+        from summarizer.site import main as create_site
+        create_site(sys.argv[2:])
+        return
     parser = argparser()
     args = parser.parse_args()
-    if args.d:
-        for mmif_file in pathlib.Path(args.d).iterdir():
-            if mmif_file.is_file() and mmif_file.name.endswith('.mmif'):
-                print(mmif_file)
-                json_file = str(mmif_file)[:-4] + 'json'
-                mmif_summary = Summary(mmif_file.read_text())
-                mmif_summary.report(
-                    outfile=json_file, full=args.full,
-                    timeframes=args.timeframes, transcript=args.transcript,
-                    captions=args.captions, entities=args.entities)
-    elif args.i and args.o:
-        with open(args.i) as fh:
-            mmif_text = fh.read()
-            mmif_summary = Summary(mmif_text)
-            mmif_summary.report(
-                outfile=args.o, full=args.full,
-                timeframes=args.timeframes, transcript=args.transcript,
-                captions=args.captions, entities=args.entities)
+    if args.stream:
+        source = sys.stdin.buffer if args.null else sys.stdin
+        summarize_stream(source, sys.stdout, paths=args.null,
+                         stats_only=args.stats_only, run_config=run_config(args),
+                         **report_options(args))
+    elif args.d:
+        batch = Batch(args.d, outdir=args.outdir, recursive=args.recursive,
+                      journal=args.journal, compress=args.compress,
+                      report_options=report_options(args), timeout=args.timeout,
+                      memory=args.memory, failures=args.failures,
+                      stats_only=args.stats_only, run_config=run_config(args),
+                      metrics=args.metrics, html=args.html,
+                      static=args.static)
+        batch.run()
+    elif args.i and args.o and args.stats_only:
+        stats.report(args.i, outfile=args.o)
+    elif args.i and (args.o or args.snapshot or args.html):
+        mmif_summary = Summary.from_path(args.i, run_config(args))
+        if args.snapshot:
+            mmif_summary.graph.save(args.snapshot)
+        if args.html:
+            mmif_summary.to_html(args.html, outfile=args.o, name=args.o or args.i,
+                                 static=args.static, **report_options(args))
+        elif args.o:
+            mmif_summary.report(outfile=args.o, **report_options(args))
     else:
         parser.print_help()
+
+
+def run_config(args) -> RunConfig:
+    """Return the settings from the command line. The command line never needs the
+    Mmif object after the graph is built and never needs ASR tokens and time frames
+    as nodes, so lean mode and token tables are always used."""
+    return RunConfig(granularity=args.granularity, lean=True, asr_tables=True)
+
+
+def report_options(args) -> dict:
+    """Return the options from the command line that determine what goes into the
+    summary, as keyword arguments for Summary.report() and Summary.as_json()."""
+    return { 'full': args.full, 'timeframes': args.timeframes,
+             'transcript': args.transcript, 'captions': args.captions,
+             'entities': args.entities, 'all_transcripts': args.all_transcripts,
+             'diagnostics': args.diagnostics, 'min_score': args.min_score,
+             'labels': None if args.labels is None else args.labels.split(','),
+             'min_duration': args.min_duration, 'timeline': args.timeline,
+             'ocr': args.ocr }
@@ -0,0 +1,418 @@
+"""Batch mode
+
+Runs the summarizer over all MMIF files in a directory, optionally over the whole
+directory tree and optionally writing the summaries into a separate output tree
+that mirrors the input tree.
+
+Completed input files can be recorded in an append-only journal, one path per
+line, relative to the input directory. When a run is started again with the same
+journal, all files in the journal are skipped, so a crashed or interrupted run
+resumes where it stopped. Summaries are written to a temporary file that is only
+renamed when it is complete and the journal is only updated after that.
+
+With a timeout or a memory limit each file is summarized in a worker process.
+When the worker runs out of time, runs out of memory, raises an error or dies, the
+file is written to a failures report together with the stage of the summarizer it
+was in, the worker is replaced by a fresh one and the run continues. Without them
+files are summarized in the batch process and an error is reported the same way.
+The temporary file of a file that failed is removed. Files in the failures report
+are also skipped when a run is resumed, remove them from the report to try them
+again.
+
+With an HTML directory, the mini-site of each summary is created in a tree under
+that directory that mirrors the input tree, straight from the summary in memory.
+Static sites share one stylesheet at the top of the HTML directory.
+
+With a metrics file, throughput, latency, size and failure numbers for the run are
+written every few seconds and at the end of the run, see metrics.py.
+
+"""
+
+import os
+import json
+import time
+import pathlib
+import resource
+import multiprocessing
+
+from mmif import Mmif
+
+from summarizer import stats, summary2html
+from summarizer.config import RunConfig
+from summarizer.metrics import Metrics, pipeline_name
+from summarizer.summary import Summary
+from summarizer.graph import Graph
+from summarizer.utils import open_file, strip_compression_suffix
+
+
+# Default names of the journal and the failures report when there is an output
+# directory
+JOURNAL_NAME = 'summarize.journal'
+FAILURES_NAME = 'summarize.failures'
+
+# Stages of summarizing one file, these are reported in the failures report
+STAGE_READ = 'read'
+STAGE_GRAPH = 'graph'
+STAGE_SUMMARY = 'summary'
+STAGE_WRITE = 'write'
+
+
+class Batch(object):
+
+    """Summarizes all MMIF files in a directory.
+
+    indir           -  directory with the MMIF files
+    outdir          -  directory for the summaries, None to write the summaries
+                       next to the MMIF files
+    recursive       -  when True, include all subdirectories of indir
+    journal         -  path of the journal, None if no journal is kept
+    compress        -  compression extension for the output (gz, bz2 or xz)
+    report_options  -  keyword arguments handed to Summary.report()
+    timeout         -  maximum number of seconds for a file
+    memory          -  maximum address space of the worker in MB
+    failures        -  path of the failures report, None if there is none
+    stats_only      -  when True, only create the statistics (see stats.py)
+    run_config      -  instance of config.RunConfig, None for the defaults
+    metrics         -  instance of metrics.Metrics, None if there are no metrics,
+                       created from the path handed in
+    html            -  directory for the HTML mini-sites, None if there are none
+    static          -  when True, write the mini-sites for a static web server
+
+    Files are summarized in a worker process if timeout or memory is set.
+
+    """
+
+    def __init__(self, indir, outdir=None, recursive=False, journal=None,
+                 compress=None, report_options=None, timeout=None, memory=None,
+                 failures=None, stats_only=False, run_config=None, metrics=None,
+                 html=None, static=False):
+        self.indir = pathlib.Path(indir)
+        self.outdir = None if outdir is None else pathlib.Path(outdir)
+        self.recursive = recursive
+        if journal is None and self.outdir is not None:
+            journal = self.outdir / JOURNAL_NAME
+        self.journal = None if journal is None else pathlib.Path(journal)
+        self.compress = compress
+        self.report_options = report_options or {}
+        self.timeout = timeout
+        self.memory = memory
+        if failures is None and self.outdir is not None:
+            failures = self.outdir / FAILURES_NAME
+        self.failures = None if failures is None else pathlib.Path(failures)
+        self.stats_only = stats_only
+        self.run_config = run_config
+        self.metrics = None if metrics is None else Metrics(metrics)
+        self.html = None if html is None else pathlib.Path(html)
+        self.static = static
+        self.stylesheet = None
+        self.worker = None
+
+    @property
+    def isolated(self) -> bool:
+        return self.timeout is not None or self.memory is not None
+
+    def __str__(self):
+        return f'<Batch {self.indir} ==> {self.outdir or self.indir}>'
+
+    def mmif_files(self):
+        """Yield all MMIF files, possibly compressed, in the input directory or in
+        the input directory tree, in a fixed order."""
+        if self.recursive:
+            for root, dirs, files in os.walk(self.indir):
+                dirs.sort()
+                for name in sorted(files):
+                    if is_mmif_file(name):
+                        yield pathlib.Path(root) / name
+        else:
+            for path in sorted(self.indir.iterdir()):
+                if path.is_file() and is_mmif_file(path.name):
+                    yield path
+
+    def output_file(self, mmif_file: pathlib.Path) -> pathlib.Path:
+        """Return the path of the summary for a MMIF file. With an output directory
+        the path relative to the input directory is kept."""
+        name = strip_compression_suffix(mmif_file.name)[:-4] + 'json'
+        if self.compress:
+            name += '.' + self.compress
+        if self.outdir is None:
+            return mmif_file.parent / name
+        return self.outdir / mmif_file.parent.relative_to(self.indir) / name
+
+    def html_directory(self, mmif_file: pathlib.Path):
+        """Return the directory of the mini-site for a MMIF file, which is named
+        after the file, or None if no sites are created."""
+        if self.html is None:
+            return None
+        name = strip_compression_suffix(mmif_file.name)[:-5]
+        return self.html / mmif_file.parent.relative_to(self.indir) / name
+
+    def stylesheet_url(self, html_dir: pathlib.Path):
+        """Return the URL of the shared stylesheet relative to the mini-site in
+        html_dir, or None if the sites are not static."""
+        if html_dir is None or self.stylesheet is None:
+            return None
+        return '../' * len(html_dir.relative_to(self.html).parts) + self.stylesheet
+
+    def completed(self) -> set:
+        """Return the set of relative paths of the files listed in the journal or
+        in the failures report."""
+        done = set()
+        if self.journal is not None and self.journal.exists():
+            with open(self.journal) as fh:
+                done.update(line.rstrip('\n') for line in fh if line.strip())
+        if self.failures is not None and self.failures.exists():
+            with open(self.failures) as fh:
+                done.update(json.loads(line)['file'] for line in fh if line.strip())
+        return done
+
+    def run(self):
+        done = self.completed()
+        if done:
+            print(f'Resuming, skipping {len(done)} files that were done before')
+        journal = self._open_log(self.journal)
+        failures = self._open_log(self.failures)
+        if self.html is not None and self.static:
+            self.stylesheet = summary2html.write_stylesheet(self.html)
+        try:
+            for mmif_file in self.mmif_files():
+                relative_path = mmif_file.relative_to(self.indir).as_posix()
+                if relative_path in done:
+                    continue
+                print(mmif_file)
+                json_file = self.output_file(mmif_file)
+                html_dir = self.html_directory(mmif_file)
+                stylesheet = self.stylesheet_url(html_dir)
+                t0 = time.monotonic()
+                if not self.isolated:
+                    failure, pipeline = self.summarize_in_process(
+                        mmif_file, json_file, html_dir, stylesheet)
+                else:
+                    failure, pipeline = self.summarize_in_worker(
+                        mmif_file, json_file, html_dir, stylesheet)
+                self._add_metrics(mmif_file, json_file, failure, pipeline,
+                                  time.monotonic() - t0)
+                if failure is not None:
+                    failure['file'] = relative_path
+                    print(f'FAILED: {failure["status"]} in stage {failure["stage"]}'
+                          f' ({failure["error"]})')
+                    if failures is not None:
+                        failures.write(json.dumps(failure) + '\n')
+                        failures.flush()
+                    continue
+                if journal is not None:
+                    journal.write(relative_path + '\n')
+                    journal.flush()
+        finally:
+            for log in (journal, failures):
+                if log is not None:
+                    log.close()
+            if self.worker is not None:
+                self.worker.stop()
+                self.worker = None
+            if self.metrics is not None:
+                self.metrics.write(force=True)
+
+    def _add_metrics(self, mmif_file, json_file, failure, pipeline, seconds):
+        if self.metrics is None:
+            return
+        status = 'ok' if failure is None else failure['status']
+        output_bytes = json_file.stat().st_size if failure is None else 0
+        self.metrics.add(status, seconds, pipeline, mmif_file.stat().st_size, output_bytes)
+        self.metrics.write()
+
+    @staticmethod
+    def _open_log(path):
+        if path is None:
+            return None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return open(path, 'a')
+
+    def summarize_in_process(self, mmif_file: pathlib.Path, json_file: pathlib.Path,
+                             html_dir: pathlib.Path = None, stylesheet: str = None):
+        """Summarize a file in this process. Returns the failure and the pipeline
+        of the file like summarize_in_worker(), an error in the summarizer is a
+        failure of the file and does not stop the run."""
+        stages = []
+        pipeline = []
+        t0 = time.monotonic()
+        try:
+            summarize(mmif_file, json_file, self.report_options,
+                      report_stage=stages.append, stats_only=self.stats_only,
+                      run_config=self.run_config, report_pipeline=pipeline.append,
+                      html_dir=html_dir, stylesheet=stylesheet)
+            failure = None
+        except Exception as e:
+            failure = {'file': None, 'status': 'error',
+                       'stage': stages[-1] if stages else None,
+                       'error': f'{type(e).__name__}: {e}',
+                       'seconds': round(time.monotonic() - t0, 3)}
+        return failure, pipeline[0] if pipeline else None
+
+    def summarize_in_worker(self, mmif_file: pathlib.Path, json_file: pathlib.Path,
+                            html_dir: pathlib.Path = None, stylesheet: str = None):
+        """Summarize a file in the worker process. Returns a pair with the failure
+        and the pipeline of the file, if the worker got far enough to know it. The
+        failure is None if all went well and a dictionary with the status, the
+        stage, the error and the time spent if not. The worker is replaced after
+        each failure."""
+        if self.worker is None:
+            self.worker = Worker(self.report_options, self.memory, self.stats_only,
+                                 self.run_config)
+        t0 = time.monotonic()
+        status, stage, error = self.worker.summarize(
+            mmif_file, json_file, self.timeout, html_dir, stylesheet)
+        if status == 'ok':
+            return None, self.worker.pipeline
+        pipeline = self.worker.pipeline
+        self.worker.stop()
+        self.worker = None
+        # a worker that was killed did not get to remove its temporary file
+        temporary_file(json_file).unlink(missing_ok=True)
+        return ({'file': None, 'status': status, 'stage': stage, 'error': error,
+                 'seconds': round(time.monotonic() - t0, 3)}, pipeline)
+
+
+class Worker(object):
+
+    """A process that summarizes the files that are sent to it over a pipe. The
+    worker reports each stage it starts, the pipeline of the file and whether
+    summarizing succeeded, which lets the parent enforce a timeout and tell in what
+    stage a file failed. The pipeline of the last file is kept in pipeline."""
+
+    def __init__(self, report_options: dict, memory: int = None, stats_only=False,
+                 run_config: RunConfig = None):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=worker_loop,
+            args=(child_connection, report_options, memory, stats_only, run_config),
+            daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.pipeline = None
+
+    def summarize(self, mmif_file, json_file, timeout: float = None, html_dir=None,
+                  stylesheet: str = None):
+        """Have the worker summarize a file and return a triple with the status (ok,
+        error, timeout or crashed), the last stage and the error message."""
+        html_dir = None if html_dir is None else str(html_dir)
+        self.connection.send((str(mmif_file), str(json_file), html_dir, stylesheet))
+        stage = None
+        self.pipeline = None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return 'timeout', stage, f'no result after {timeout} seconds'
+            if not self.connection.poll(remaining):
+                continue
+            try:
+                message = self.connection.recv()
+            except EOFError:
+                self.process.join()
+                return 'crashed', stage, f'worker exit code {self.process.exitcode}'
+            if message[0] == 'stage':
+                stage = message[1]
+            elif message[0] == 'pipeline':
+                self.pipeline = message[1]
+            elif message[0] == 'done':
+                return 'ok', stage, None
+            elif message[0] == 'error':
+                return 'error', stage, message[1]
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+def worker_loop(connection, report_options: dict, memory: int = None,
+                stats_only=False, run_config: RunConfig = None):
+    """Main loop of the worker process, which runs until the pipe is closed."""
+    if memory is not None:
+        limit = memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    def report_stage(stage):
+        connection.send(('stage', stage))
+    def report_pipeline(pipeline):
+        connection.send(('pipeline', pipeline))
+    while True:
+        try:
+            mmif_file, json_file, html_dir, stylesheet = connection.recv()
+        except EOFError:
+            return
+        try:
+            summarize(pathlib.Path(mmif_file), pathlib.Path(json_file),
+                      report_options, report_stage, stats_only, run_config,
+                      report_pipeline, None if html_dir is None else pathlib.Path(html_dir),
+                      stylesheet)
+            connection.send(('done',))
+        except Exception as e:
+            connection.send(('error', f'{type(e).__name__}: {e}'))
+
+
+def summarize(mmif_file: pathlib.Path, json_file: pathlib.Path,
+              report_options: dict, report_stage=None, stats_only=False,
+              run_config: RunConfig = None, report_pipeline=None, html_dir=None,
+              stylesheet: str = None):
+    """Summarize one file and write the summary to a temporary file that is renamed
+    when complete, so json_file is never left half-written, and that is removed
+    when summarizing fails. The report_stage function is called with the name of
+    each stage when it starts and the report_pipeline function with the pipeline
+    name when the views are read. Without a run_config the default settings are
+    used, in lean mode and with token tables. With html_dir the mini-site is
+    created from the same summary dictionary as the JSON file, as a static site if
+    the URL of a shared stylesheet is given."""
+    report_stage = report_stage or (lambda stage: None)
+    report_pipeline = report_pipeline or (lambda pipeline: None)
+    json_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = temporary_file(json_file)
+    try:
+        report_stage(STAGE_READ)
+        if stats_only:
+            report = stats.stats_from_path(mmif_file)
+            report_pipeline(pipeline_name(view['app'] for view in report['views']))
+            with open_file(tmp_file, 'w') as fh:
+                fh.write(json.dumps(report, indent=2))
+            os.replace(tmp_file, json_file)
+            if html_dir is not None:
+                summary2html.write_html(report, str(json_file), html_dir,
+                                        stylesheet=stylesheet)
+            return
+        with open_file(mmif_file, 'rb') as fh:
+            mmif_obj = json.load(fh)
+        # the pipeline is reported before validation, which can take a while
+        report_pipeline(pipeline_name(view.get('metadata', {}).get('app')
+                                      for view in mmif_obj.get('views', [])))
+        mmif = Mmif(mmif_obj)
+        del mmif_obj
+        report_stage(STAGE_GRAPH)
+        run_config = run_config or RunConfig(lean=True, asr_tables=True)
+        graph = Graph(mmif, run_config)
+        del mmif
+        report_stage(STAGE_SUMMARY)
+        mmif_summary = Summary(graph, run_config)
+        report_stage(STAGE_WRITE)
+        if html_dir is None:
+            mmif_summary.report(outfile=tmp_file, **report_options)
+        else:
+            mmif_summary.to_html(html_dir, outfile=tmp_file, name=json_file,
+                                 stylesheet=stylesheet, **report_options)
+        os.replace(tmp_file, json_file)
+    except BaseException:
+        # also for interrupts, which are not failures of the file
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+
+def temporary_file(json_file: pathlib.Path) -> pathlib.Path:
+    """Return the file that the summary for json_file is written to before it is
+    renamed. The prefix keeps the extension, which determines compression."""
+    return json_file.parent / f'.tmp-{json_file.name}'
+
+
+def is_mmif_file(name: str) -> bool:
+    """Return True if the name has the .mmif extension, which may be followed by
+    a compression extension. Files named just ".mmif" are ignored."""
+    name = strip_compression_suffix(name)
+    return name.endswith('.mmif') and len(name) > 5
@@ -36,12 +36,51 @@ MINIMAL_TIMEFRAME_LENGTH = 1000
 # milliseconds after the end of the previous, then it is just added to the
 # previous one. Taking one minute as the default so two mentions in a minute end
 # up being the same instance. This setting can be changed with the 'granularity'
-# parameter.
+# parameter, which is handed to the summarizer in a RunConfig.
 # TODO: this seems broken
 
 GRANULARITY = 1000
 
 
+# When the ASR app does not create sentences the summarizer creates them by
+# chopping up the tokens in chunks of this size.
+
+SENTENCE_SIZE = 12
+
+
+class RunConfig(object):
+
+    """Settings for one run of the summarizer, handed to Summary and Graph. The
+    summarizer never changes a RunConfig, so one instance can be shared between
+    summaries created at the same time, and summaries with different settings can
+    be created concurrently in one process.
+
+    granularity    -  entities of the same text that start within this number of
+                      milliseconds of each other are put in the same group
+    sentence_size  -  number of tokens in a sentence when the ASR app does not
+                      create sentences itself
+    lean           -  when True, the Mmif object model is released after building
+                      the graph (see Graph.release())
+    asr_tables     -  when True, the Tokens and TimeFrames of ASR views are stored
+                      in a tables.TokenTable instead of as nodes, which is what the
+                      command line does
+
+    """
+
+    def __init__(self, granularity: int = GRANULARITY,
+                 sentence_size: int = SENTENCE_SIZE, lean: bool = False,
+                 asr_tables: bool = False):
+        self.granularity = granularity
+        self.sentence_size = sentence_size
+        self.lean = lean
+        self.asr_tables = asr_tables
+
+    def __str__(self):
+        return (f'<RunConfig granularity={self.granularity}'
+                f' sentence_size={self.sentence_size} lean={self.lean}'
+                f' asr_tables={self.asr_tables}>')
+
+
 # Properties used for the summary for various tags
 
 DOC_PROPS = ('id', 'type', 'location')
@@ -55,11 +94,13 @@ E_PROPS = ('id', 'group', 'cat', 'tag', 'video-start', 'video-end', 'coordinates
 TEXT_DOCUMENT = DocumentTypes.TextDocument.shortname
 VIDEO_DOCUMENT = DocumentTypes.VideoDocument.shortname
 TIME_FRAME = AnnotationTypes.TimeFrame.shortname
+TIME_POINT = AnnotationTypes.TimePoint.shortname
 BOUNDING_BOX = AnnotationTypes.BoundingBox.shortname
 ALIGNMENT = AnnotationTypes.Alignment.shortname
 
 TOKEN = 'Token'
 SENTENCE = 'Sentence'
+PARAGRAPH = 'Paragraph'
 SEMANTIC_TAG = 'SemanticTag'
 NAMED_ENTITY = 'NamedEntity'
 
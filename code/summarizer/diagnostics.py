@@ -0,0 +1,71 @@
+"""Diagnostics
+
+Collects the diagnostic messages that come up while building a graph, for example
+for annotations without anchors or for alignments between types that the graph
+does not know how to handle. Messages are not printed when they occur, instead
+they are counted with a few samples each, which keeps the output of a file with
+thousands of such annotations down to one line per kind of message.
+
+"""
+
+
+# Number of samples kept for each message
+MAX_SAMPLES = 3
+
+
+class Diagnostics(object):
+
+    """Counts of diagnostic messages with a few samples for each message.
+
+    counts   -  message counts indexed on message
+    samples  -  lists of samples indexed on message, at most MAX_SAMPLES each
+
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.samples = {}
+
+    def __str__(self):
+        return f'<Diagnostics {len(self.counts)} messages>'
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, message: str, sample=None):
+        """Count the message and keep the sample if there are not enough samples
+        yet. The sample is typically an annotation identifier."""
+        if message not in self.counts:
+            self.counts[message] = 0
+            self.samples[message] = []
+        self.counts[message] += 1
+        if sample is not None and len(self.samples[message]) < MAX_SAMPLES:
+            self.samples[message].append(sample)
+
+    def warnings(self) -> list:
+        """Return a list with a warning string for each message."""
+        warnings = []
+        for message, count in self.counts.items():
+            warning = f'{message} ({count}x)'
+            if self.samples[message]:
+                samples = ', '.join(str(s) for s in self.samples[message])
+                warning += f', for example {samples}'
+            warnings.append(warning)
+        return warnings
+
+    def print_warnings(self):
+        for warning in self.warnings():
+            print(f'WARNING: {warning}')
+
+    def as_json(self) -> list:
+        return [{'message': message, 'count': count, 'samples': self.samples[message]}
+                for message, count in self.counts.items()]
+
+    @classmethod
+    def from_json(cls, json_obj: list):
+        """Create an instance from the output of as_json()."""
+        diagnostics = cls()
+        for element in json_obj:
+            diagnostics.counts[element['message']] = element['count']
+            diagnostics.samples[element['message']] = list(element['samples'])
+        return diagnostics
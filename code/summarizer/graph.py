@@ -1,16 +1,33 @@
-import sys, json
+import sys, json, pickle, zlib
 from collections import defaultdict
 from operator import itemgetter
 from pathlib import Path
 import argparse
 
 from mmif import Mmif
+from mmif.vocabulary import ThingTypesBase
 
 from summarizer import config
-from summarizer.utils import compose_id, flatten_paths, normalize_id
+from summarizer.diagnostics import Diagnostics
+from summarizer.hooks import Hooks, Progress, STAGE_NODES, STAGE_EDGES, STAGE_TOKENS
+from summarizer.tables import TokenTable
+from summarizer.utils import compose_id, flatten_paths, normalized_properties
 from summarizer.utils import get_shape_and_color, get_view_label, get_label
 
 
+# Snapshots of a graph start with these bytes, followed by a single byte with
+# the snapshot version and then the zlib-compressed pickle of the graph data. The
+# version needs to be bumped whenever the layout of the data in Graph.save()
+# changes. Version 2 added the diagnostics and the token tables.
+
+SNAPSHOT_MAGIC = b'MMIFGRAPH'
+SNAPSHOT_VERSION = 2
+
+
+class GraphException(Exception):
+    pass
+
+
 class Graph(object):
 
     """Graph implementation for a MMIF document. Each node contains an annotation
@@ -19,83 +36,325 @@ class Graph(object):
     to Node.targets is the document that the Node points to (if there is one).
 
     The goal for the graph is to store all useful annotation and to have simple ways
-    to trace nodes all the way up to the primary data."""
-
-    def __init__(self, mmif):
+    to trace nodes all the way up to the primary data.
+
+    Problems found while building the graph are collected in the diagnostics
+    variable, an instance of diagnostics.Diagnostics.
+
+    Settings are taken from run_config, an instance of config.RunConfig. With the
+    lean setting the graph lets go of the Mmif object, the alignments and the
+    original annotations of the nodes once the graph is built, see release().
+
+    With the asr_tables setting, the Tokens and TimeFrames of ASR views where each
+    Token is aligned to one TimeFrame are not added as nodes but stored in a
+    tables.TokenTable, one for each view, in the token_tables dictionary. These
+    Tokens and TimeFrames are not in the nodes dictionary and are not returned by
+    get_nodes(), get_node() creates a node for them when asked for one.
+
+    The entity_idx dictionary has for each node that NamedEntity nodes point at,
+    typically their TextDocument, the list of those entities. It lets add_view() and
+    summaries find the entities that new edges may affect without looking at all
+    entities.
+
+    Progress is reported to hooks, an instance of hooks.Hooks, which can also stop
+    building the graph by raising a hooks.CancelledException.
+
+    Views that are added to the MMIF document after the graph was built can be added
+    with add_view(), which only does the work for the new view. For each added view
+    the updates list has a triple with the ViewInfo, the new nodes and the new edges
+    as (source, target) pairs, summaries use it to update themselves.
+
+    Building the graph does not change the Mmif object and the graph itself is not
+    changed after it is built, except by add_view(), trim() and release(), so a
+    graph can be used by several summaries at the same time. The only exception is
+    the cache of nodes created from the token tables."""
+
+    def __init__(self, mmif, run_config: config.RunConfig = None, hooks: Hooks = None):
+        run_config = run_config or config.RunConfig()
+        hooks = hooks or Hooks()
+        self.run_config = run_config
         self.mmif = mmif if type(mmif) is Mmif else Mmif(mmif)
+        self.mmif_version = str(self.mmif.metadata.mmif)
         self.documents = []
+        self.views = {}
         self.nodes = {}
+        self.nodes_idx = {}
+        self.entity_idx = {}
         self.alignments = []
-        self._init_nodes()
-        self._init_edges()
+        self.diagnostics = Diagnostics()
+        self.token_tables = {}
+        self.updates = []
+        self._table_nodes = {}
+        total = len(self.mmif.documents) + sum(len(v.annotations) for v in self.mmif.views)
+        with hooks.stage(STAGE_NODES, total) as progress:
+            self._init_nodes(progress)
+        with hooks.stage(STAGE_EDGES, len(self.alignments)) as progress:
+            self._init_edges(progress)
         # Third pass to add links between text elements, in particular from
         # entities to tokens, adding lists of tokens to entities.
         tokens = self.get_nodes(config.TOKEN)
         entities = self.get_nodes(config.NAMED_ENTITY)
-        self.token_idx = TokenIndex(tokens)
+        with hooks.stage(STAGE_TOKENS, len(entities)) as progress:
+            self.token_idx = TokenIndex(tokens, self.token_tables.values())
+            for e in entities:
+                e.tokens = self.token_idx.get_tokens_for_node(e)
+                self._index_entity(e)
+                progress.step()
+        if run_config.lean:
+            self.release()
+
+    def release(self, nodes=None):
+        """Drop all references into the mmif-python object model so it can be
+        garbage collected. Nodes keep their identifier, properties, anchors, links
+        to other nodes and a ViewInfo with the view identifier, app and timestamp,
+        which is all the summarizer uses. Nodes of the same type share one at_type
+        object. After this the graph looks like a graph loaded from a snapshot.
+        With a list of nodes only those nodes let go of their annotations."""
+        if nodes is None:
+            nodes = self.nodes.values()
+            self.mmif = None
+            self.alignments = []
+        at_types = {}
+        for node in nodes:
+            node.annotation = None
+            node.at_type = at_types.setdefault(str(node.at_type), node.at_type)
+
+    def add_view(self, view):
+        """Add a mmif.View that was added to the MMIF document after the graph was
+        built, for example by the next app in a pipeline. Only the annotations and
+        alignments of the view are added, existing nodes only change when the new
+        alignments point at them, and the token index and the tokens of entities are
+        only updated for the documents that get new tokens. Returns the ViewInfo of
+        the new view."""
+        if view.id in self.views:
+            raise GraphException(f'View {view.id} is already in the graph')
+        doc_ids = set(d.identifier for d in self.documents)
+        nodes, alignments = self._init_view(view, doc_ids, Progress(Hooks()))
+        edges = [self.add_edge(view, alignment) for _, alignment in alignments]
+        if self.mmif is not None:
+            self.alignments.extend(alignments)
+        tables = [self.token_tables[view.id]] if view.id in self.token_tables else []
+        tokens = [n for n in nodes if n.at_type.shortname == config.TOKEN]
+        documents = self.token_idx.add(tokens, tables)
+        entities = [n for n in nodes if n.at_type.shortname == config.NAMED_ENTITY]
+        for e in entities:
+            self._index_entity(e)
+        for source, target in edges:
+            if source.at_type.shortname == config.NAMED_ENTITY and source.view.id != view.id:
+                self.entity_idx.setdefault(target.identifier, []).append(source)
+        # only the new entities and the entities of documents with new tokens
+        for doc_id in documents:
+            entities.extend(e for e in self.entity_idx.get(doc_id, [])
+                            if e.view.id != view.id and e.document is not None
+                            and e.document.identifier == doc_id)
         for e in entities:
             e.tokens = self.token_idx.get_tokens_for_node(e)
+        if self.run_config.lean:
+            self.release(nodes)
+        view_info = self.views[view.id]
+        self.updates.append((view_info, nodes, edges))
+        return view_info
 
-    def _init_nodes(self):
+    def _init_nodes(self, progress: Progress):
         # The top-level documents are added as nodes, but they are also put in
         # the documents list.
         for doc in self.mmif.documents:
-            self.add_node(None, doc)
-            self.documents.append(doc)
+            self.documents.append(self.add_node(None, doc))
+            progress.step()
         # First pass over all annotations and documents in all views and save
         # them in the graph.
-        doc_ids = [d.id for d in self.documents]
+        doc_ids = set(d.identifier for d in self.documents)
         for view in self.mmif.views:
-            for annotation in view.annotations:
-                normalize_id(doc_ids, view, annotation)
-                if annotation.at_type.shortname == config.ALIGNMENT:
-                    # alignments are not added as nodes, but we do keep them around
-                    self.alignments.append((view, annotation))
-                else:
-                    self.add_node(view, annotation)
-
-    def _init_edges(self):
+            _, alignments = self._init_view(view, doc_ids, progress)
+            # alignments are not added as nodes, but we do keep them around
+            self.alignments.extend(alignments)
+
+    def _init_view(self, view, doc_ids: set, progress: Progress):
+        """Add the view and the nodes for its annotations to the graph. Returns the
+        list of new nodes and the list of alignments, the latter as pairs of the view
+        and the normalized properties of the Alignment."""
+        view_info = ViewInfo.from_view(view)
+        self.views[view.id] = view_info
+        entries = []
+        for annotation in view.annotations:
+            view_info.annotation_types[annotation.at_type.shortname] += 1
+            # a copy of the properties with identifiers that include the view
+            properties = normalized_properties(doc_ids, view, annotation)
+            entries.append((annotation, properties))
+            progress.step()
+        table = None
+        if self.run_config.asr_tables:
+            table = self._token_table(view, entries)
+        in_table = set()
+        if table is not None:
+            self.token_tables[view.id] = table
+            in_table.update(table.identifiers)
+            in_table.update(table.timeframes)
+        nodes = []
+        alignments = []
+        for annotation, properties in entries:
+            if annotation.at_type.shortname == config.ALIGNMENT:
+                # alignments between tokens and time frames in a token table
+                # are not needed
+                if not (properties['source'] in in_table
+                        and properties['target'] in in_table):
+                    alignments.append((view, properties))
+            elif properties['id'] not in in_table:
+                nodes.append(self.add_node(view, annotation, properties))
+        return nodes, alignments
+
+    def _token_table(self, view, entries: list):
+        """Return a TokenTable for the Tokens and TimeFrames of the view if it looks
+        like an ASR view, return None otherwise. The entries are pairs of annotations
+        and their normalized properties."""
+        properties = {config.TOKEN: [], config.TIME_FRAME: [],
+                      config.ALIGNMENT: [], config.SENTENCE: []}
+        at_types = {}
+        for annotation, props in entries:
+            shortname = annotation.at_type.shortname
+            if shortname in properties:
+                properties[shortname].append(props)
+                at_types.setdefault(shortname, annotation.at_type)
+        if not properties[config.TOKEN] or not properties[config.TIME_FRAME]:
+            return None
+        table = TokenTable.from_properties(
+            view.id, str(at_types[config.TOKEN]), str(at_types[config.TIME_FRAME]),
+            properties[config.TOKEN], properties[config.TIME_FRAME],
+            properties[config.ALIGNMENT], properties[config.SENTENCE])
+        if table is None:
+            return None
+        table.document = document_id(
+            view, at_types[config.TOKEN], table.token_constants)
+        table.timeframe_document = document_id(
+            view, at_types[config.TIME_FRAME], table.timeframe_constants)
+        # the token index needs a document for each token, which is typically a
+        # TextDocument in the view itself
+        if (table.document not in self.nodes
+                and not any(props['id'] == table.document for _, props in entries)):
+            return None
+        return table
+
+    def _init_edges(self, progress: Progress):
         # Second pass over the alignments so we create edges.
         for view, alignment in self.alignments:
             self.add_edge(view, alignment)
-
-    def __str__(self):
-        return "<Graph nodes=%d>" % len(self.nodes)
-
-    def add_node(self, view, annotation):
-        """Add an annotation as a node to the graph."""
-        node = Nodes.new(self, view, annotation)
-        self.nodes[node.identifier] = node
-
-    def add_edge(self, view, alignment):
-        source_id = alignment.properties['source']
-        target_id = alignment.properties['target']
+            progress.step()
+
+    def add_edge(self, view, alignment: dict):
+        """Add an edge for an alignment, which is given as the dictionary with the
+        normalized properties of the Alignment. Returns the source and target of
+        the edge."""
+        source_id = alignment['source']
+        target_id = alignment['target']
         #print(alignment.id, source_id, target_id)
-        source = self.get_node(source_id)
-        target = self.get_node(target_id)
+        source = self._graph_node(source_id)
+        target = self._graph_node(target_id)
         # make sure the direction goes from token or textdoc to annotation
-        if target.annotation.at_type.shortname in (config.TOKEN, config.TEXT_DOCUMENT):
+        if target.at_type.shortname in (config.TOKEN, config.TEXT_DOCUMENT):
             source, target = target, source
         source.targets.append(target)
         #if target_id == "v_3:td_1":
         #    source.set_alignment_anchors(target, debug=True)
         source.set_alignment_anchors(target)
         target.set_alignment_anchors(source)
+        return source, target
+
+    def __str__(self):
+        return "<Graph nodes=%d>" % len(self.nodes)
+
+    def add_node(self, view, annotation, properties: dict = None):
+        """Add an annotation as a node to the graph and return the node. The node
+        uses the properties if given and a copy of the annotation's properties
+        otherwise."""
+        node = Nodes.new(self, view, annotation, properties)
+        self.nodes[node.identifier] = node
+        self._index_node(node)
+        return node
+
+    def _index_entity(self, entity):
+        """Add the entity to the index on the identifiers of its targets."""
+        for target in entity.targets:
+            self.entity_idx.setdefault(target.identifier, []).append(entity)
+
+    def _index_node(self, node):
+        """Add the node to the index on short type name and view identifier. Nodes
+        from a view are added together so lists from the index can be concatenated
+        in view order without changing the order of the nodes in the graph."""
+        view_id = None if node.view is None else node.view.id
+        by_view = self.nodes_idx.setdefault(node.at_type.shortname, {})
+        by_view.setdefault(view_id, []).append(node)
 
     def get_node(self, node_id):
-        return self.nodes.get(node_id)
+        """Return the node for the identifier, creating it if the annotation is in
+        one of the token tables. Return None if there is no such annotation."""
+        node = self.nodes.get(node_id)
+        if node is None and self.token_tables:
+            node = self._table_node(node_id)
+        return node
+
+    def _graph_node(self, node_id):
+        """Like get_node(), but a node created from a token table is added to the
+        graph, which is needed when the node is about to be changed."""
+        node = self.get_node(node_id)
+        if node is not None and node_id not in self.nodes:
+            self.nodes[node_id] = node
+            self._index_node(node)
+        return node
+
+    def _table_node(self, node_id):
+        """Return a node for a Token or TimeFrame from a token table, or None if
+        the identifier is not in any of the tables. Nodes are cached so that asking
+        twice gives the same node."""
+        node = self._table_nodes.get(node_id)
+        if node is not None:
+            return node
+        for table in self.token_tables.values():
+            found = table.find(node_id)
+            if found is not None:
+                break
+        else:
+            return None
+        is_token, row = found
+        view = self.views.get(table.view_id)
+        if is_token:
+            properties = table.token_properties(row)
+            anchors = {'text-offsets': (properties['start'], properties['end']),
+                       'time-offsets': (table.time_start[row], table.time_end[row])}
+            at_type = ThingTypesBase.from_str(table.token_type)
+            document_id = table.document
+        else:
+            properties = table.timeframe_properties(row)
+            anchors = {'text-offsets': (properties['start'], properties['end'])}
+            at_type = ThingTypesBase.from_str(table.timeframe_type)
+            document_id = table.timeframe_document
+        node = Nodes.restore(self, view, at_type, node_id, properties, anchors)
+        node.document = None if document_id is None else self.get_node(document_id)
+        node.targets = [] if node.document is None else [node.document]
+        if is_token:
+            node.targets.append(self.get_node(table.timeframes[row]))
+        return self._table_nodes.setdefault(node_id, node)
 
     def get_nodes(self, short_at_type: str, view_id : str = None):
         """Get all nodes for an annotation type, using the short form. If a view
-        identifier is provided then only include nodes from that view."""
-        return [node for node in self.nodes.values()
-                if (node.at_type.shortname == short_at_type
-                    and (view_id is None or node.view.id == view_id))]
+        identifier is provided then only include nodes from that view. Tokens and
+        TimeFrames in the token tables are not included."""
+        by_view = self.nodes_idx.get(short_at_type, {})
+        if view_id is not None:
+            return list(by_view.get(view_id, []))
+        return [node for nodes in by_view.values() for node in nodes]
+
+    def get_view(self, view_id: str):
+        return self.views.get(view_id)
 
     def statistics(self):
         stats = defaultdict(int)
         for node in self.nodes.values():
             stats[node.at_type.shortname] += 1
+        for table in self.token_tables.values():
+            # nodes for the table may have been added to the graph by add_edge()
+            for shortname, identifiers in ((config.TOKEN, table.identifiers),
+                                           (config.TIME_FRAME, table.timeframes)):
+                stats[shortname] += len([i for i in identifiers if i not in self.nodes])
         return stats
 
     def trim(self, start: int, end: int):
@@ -114,43 +373,208 @@ class Graph(object):
                     remove.add(node_id)
         new_nodes = [n for n in self.nodes.values() if not n.identifier in remove]
         self.nodes = { node.identifier: node for node in new_nodes }
+        self.nodes_idx = {}
+        self.entity_idx = {}
+        for node in new_nodes:
+            self._index_node(node)
+            if node.at_type.shortname == config.NAMED_ENTITY:
+                self._index_entity(node)
+        # rows of the token tables are kept or removed with their time frame
+        for view_id, table in self.token_tables.items():
+            rows = [i for i, (p1, p2) in enumerate(zip(table.time_start, table.time_end))
+                    if start <= p1 <= end and start <= p2 <= end]
+            self.token_tables[view_id] = table.select(rows)
+        self._table_nodes = {}
 
     def pp(self, fname=None):
         fh = sys.stdout if fname is None else open(fname, 'w')
         fh.write("%s\n" % self)
-        for view in self.mmif.views:
-            fh.write("  <View %s %s>\n" % (view.id, str(view.metadata['app'])))
+        for view in self.views.values():
+            fh.write("  <View %s %s>\n" % (view.id, view.app))
         for node_id, node in self.nodes.items():
             fh.write("  %-40s" % node)
             targets = [str(t) for t in node.targets]
             fh.write(' -->  [%s]\n' % ' '.join(targets))
 
+    @staticmethod
+    def is_snapshot(path) -> bool:
+        """Return True if the file at path is a graph snapshot as written by
+        Graph.save(), return False if it is anything else (typically MMIF)."""
+        with open(path, 'rb') as fh:
+            return fh.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+    def save(self, path):
+        """Save a snapshot of the graph to a file. The snapshot has the views, the
+        nodes with their properties, anchors and targets, and the token index, but
+        not the Mmif object. Everything is stored as plain Python data so loading
+        the snapshot does not need to parse MMIF or rebuild edges and anchors."""
+        views = [(v.id, v.app, v.timestamp, v.warnings, dict(v.annotation_types))
+                 for v in self.views.values()]
+        nodes = []
+        for node in self.nodes.values():
+            nodes.append((
+                None if node.view is None else node.view.id,
+                str(node.at_type),
+                node.identifier,
+                node.properties,
+                node.anchors,
+                None if node.document is None else node.document.identifier,
+                [t.identifier for t in node.targets],
+                [t.identifier for t in getattr(node, 'tokens', [])]))
+        token_index = {
+            doc_id: [(start, end, token_id) for (start, end), token_id in tokens]
+            for doc_id, tokens in self.token_idx.tokens.items()}
+        data = {
+            'mmif_version': self.mmif_version,
+            'documents': [d.identifier for d in self.documents],
+            'views': views,
+            'nodes': nodes,
+            'token_index': token_index,
+            'token_tables': [t.as_data() for t in self.token_tables.values()],
+            'diagnostics': self.diagnostics.as_json() }
+        with open(path, 'wb') as fh:
+            fh.write(SNAPSHOT_MAGIC)
+            fh.write(bytes([SNAPSHOT_VERSION]))
+            # fast compression, most of the size is in repeated keys and anchors
+            fh.write(zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), 1))
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph from a snapshot created with Graph.save(). The graph that
+        is returned does not have a Mmif object and its nodes do not have the
+        original annotations, everything else is the same as for a graph that was
+        created from the MMIF file. Only load snapshots that you created yourself,
+        the payload is a pickle."""
+        with open(path, 'rb') as fh:
+            if fh.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise GraphException(f'Not a graph snapshot: {path}')
+            version = fh.read(1)[0]
+            if version != SNAPSHOT_VERSION:
+                raise GraphException(
+                    f'Unsupported snapshot version {version} in {path}'
+                    f' (expected {SNAPSHOT_VERSION}), create the snapshot again'
+                    f' from the MMIF file with "summarize --snapshot"')
+            data = pickle.loads(zlib.decompress(fh.read()))
+        graph = cls.__new__(cls)
+        graph.run_config = config.RunConfig(lean=True, asr_tables=True)
+        graph.mmif = None
+        graph.mmif_version = data['mmif_version']
+        graph.alignments = []
+        graph.updates = []
+        graph.diagnostics = Diagnostics.from_json(data['diagnostics'])
+        graph.views = {}
+        graph.nodes = {}
+        graph.nodes_idx = {}
+        graph.entity_idx = {}
+        graph.token_tables = {}
+        graph._table_nodes = {}
+        for table_data in data['token_tables']:
+            table = TokenTable.from_data(table_data)
+            graph.token_tables[table.view_id] = table
+        for view_id, app, timestamp, warnings, annotation_types in data['views']:
+            graph.views[view_id] = ViewInfo(
+                view_id, app, timestamp, warnings, annotation_types)
+        # at_type objects are shared between nodes of the same type
+        at_types = {}
+        for view_id, at_type, identifier, properties, anchors, *_ in data['nodes']:
+            if at_type not in at_types:
+                at_types[at_type] = ThingTypesBase.from_str(at_type)
+            node = Nodes.restore(graph, graph.views.get(view_id), at_types[at_type],
+                                 identifier, properties, anchors)
+            graph.nodes[identifier] = node
+            graph._index_node(node)
+        # second pass to restore the links between nodes
+        for _, _, identifier, _, _, doc_id, target_ids, token_ids in data['nodes']:
+            node = graph.nodes[identifier]
+            node.document = graph.get_node(doc_id)
+            # targets may point at nodes that were removed with Graph.trim()
+            node.targets = [graph.nodes[t] for t in target_ids if t in graph.nodes]
+            if isinstance(node, EntityNode):
+                node.tokens = [graph.get_node(t) for t in token_ids]
+                graph._index_entity(node)
+        graph.documents = [graph.nodes[doc_id] for doc_id in data['documents']]
+        graph.token_idx = TokenIndex.restore(data['token_index'])
+        return graph
+
+
+class ViewInfo(object):
+
+    """Lightweight version of a mmif.View with just the metadata that the summarizer
+    needs and with counts of the annotation types instead of the annotations.
+
+    id                -  the view identifier
+    app               -  the CLAMS app that created the view
+    timestamp         -  the time the view was created
+    warnings          -  True if this is a warnings view, False otherwise
+    annotation_types  -  annotation counts indexed on short type name
+
+    """
+
+    def __init__(self, identifier: str, app: str, timestamp: str,
+                 warnings: bool = False, annotation_types: dict = None):
+        self.id = identifier
+        self.app = app
+        self.timestamp = timestamp
+        self.warnings = warnings
+        self.annotation_types = defaultdict(int, annotation_types or {})
+
+    def __str__(self):
+        return f'<ViewInfo {self.id} {self.app}>'
+
+    @classmethod
+    def from_view(cls, view):
+        """Create an instance from a mmif.View, the annotation types are not
+        counted here but by the code that loops over the annotations."""
+        return cls(view.id, str(view.metadata.app), str(view.metadata.timestamp),
+                   bool(view.metadata.warnings))
+
+    def annotation_count(self):
+        return sum(self.annotation_types.values())
+
 
 class TokenIndex(object):
 
     """
     The tokens are indexed on the identifier on the TextDocument that they occur
-    in and for each text document we have a list of <offsets, Node> pairs
+    in and for each text document we have a list of <offsets, token identifier>
+    pairs
 
     {'v_4:td1': [
-        ((0, 5), <__main__.Node object at 0x1039996d0>),
-        ((5, 6), <__main__.Node object at 0x103999850>),
+        ((0, 5), 'v_4:t1'),
+        ((5, 6), 'v_4:t2'),
         ...
     }
+
+    The index is created from token nodes and from the rows of token tables, using
+    identifiers means that no nodes need to be created for the latter.
     """
 
-    def __init__(self, tokens):
+    def __init__(self, tokens, tables=()):
         self.tokens = {}
-        self.token_count = len(tokens)
+        self.token_count = 0
+        self.add(tokens, tables)
+
+    def add(self, tokens, tables=()) -> set:
+        """Add token nodes and the rows of token tables to the index and return the
+        set of identifiers of the documents that got new tokens."""
+        documents = set()
+        self.token_count += len(tokens)
         for t in tokens:
-            tup = ((t.properties['start'], t.properties['end']), t)
+            tup = ((t.properties['start'], t.properties['end']), t.identifier)
             self.tokens.setdefault(t.document.identifier, []).append(tup)
+            documents.add(t.document.identifier)
+        for table in tables:
+            self.token_count += len(table)
+            self.tokens.setdefault(table.document, []).extend(
+                zip(zip(table.start, table.end), table.identifiers))
+            documents.add(table.document)
         # Make sure the tokens for each document are ordered.
-        for document, token_list in self.tokens.items():
-            self.tokens[document] = sorted(token_list, key=itemgetter(0))
+        for document in documents:
+            self.tokens[document] = sorted(self.tokens[document], key=itemgetter(0))
         # In some cases there are two tokens with identical offset (for example
         # with tokenization from both Kaldi and spaCy, not sure what to do with
         # these, but should probably be more careful on what views to access
+        return documents
 
     def __len__(self):
         return self.token_count
@@ -158,19 +582,30 @@ class TokenIndex(object):
     def __str__(self):
         return f'<TokenIndex on with {len(self)} tokens>'
 
+    @classmethod
+    def restore(cls, token_index: dict):
+        """Create the index from the data saved in a graph snapshot, where the tokens
+        for each document are given as an ordered list of (start, end, token_id)."""
+        idx = cls([])
+        for document, token_list in token_index.items():
+            idx.tokens[document] = [((start, end), token_id)
+                                    for start, end, token_id in token_list]
+            idx.token_count += len(token_list)
+        return idx
+
     # TODO: benchmark this method. I may want to use something like this to 
     # determine encloced nodes and enclosing nodes and that may blow up since
     # that would be O(n^2). If it does matter, probably start using binary
     # search or add an index from character offset to nodes.
     def get_tokens_for_node(self, node):
-        """Return all tokens included in the span of a node."""
+        """Return all tokens included in the span of a node, as nodes."""
         doc = node.document.identifier
         start = node.properties['start']
         end = node.properties['end']
         tokens = []
-        for (t_start, t_end), token in self.tokens.get(doc, []):
+        for (t_start, t_end), token_id in self.tokens.get(doc, []):
             if t_start >= start and t_end <= end:
-                tokens.append(token)
+                tokens.append(node.graph.get_node(token_id))
         return tokens
 
     def pp(self, fname=None):
@@ -183,16 +618,20 @@ class TokenIndex(object):
 
 class Node(object):
 
-    def __init__(self, graph, view, annotation):
+    def __init__(self, graph, view, annotation, properties: dict = None):
         self.graph = graph
-        self.view = view
+        # the node only keeps the lightweight version of the view
+        self.view = None if view is None else graph.get_view(view.id)
         self.annotation = annotation
-        # copy some information from the Annotation
+        # copy some information from the Annotation, the properties may already
+        # have been copied (and normalized) by the graph
         self.at_type = annotation.at_type
-        self.identifier = annotation.id
-        self.properties = json.loads(str(annotation.properties))
+        if properties is None:
+            properties = json.loads(str(annotation.properties))
+        self.properties = properties
+        self.identifier = properties['id']
         # get the document from the view or the properties
-        self.document = self._get_document()
+        self.document = self._get_document(view)
         # The targets property contains a list of annotations or documents that
         # the node content points to. This includes the document the annotation
         # points to as well as the alignment from a token or text document to a
@@ -209,7 +648,7 @@ class Node(object):
         # TODO: start/end in time frames now does the wrong thing
         # TODO: should probably be overridden on subtypes
         props = self.properties
-        attype = self.annotation.at_type.shortname
+        attype = self.at_type.shortname
         self.anchors = {}
         if 'start' in props and 'end' in props:
             self.anchors['text-offsets'] = (props['start'], props['end'])
@@ -228,7 +667,8 @@ class Node(object):
                 tp1.properties['timePoint'], tp2.properties['timePoint'])
         if not self.anchors and not attype.endswith('Document'):
             if attype != 'Annotation':
-                print('set_local_anchors', attype, self, self.properties.keys())
+                self.graph.diagnostics.add(
+                    f'{attype} without anchors', self.identifier)
 
     def set_alignment_anchors(self, target: None, debug=False):
         source_attype = self.at_type.shortname
@@ -289,7 +729,9 @@ class Node(object):
         elif source_attype == 'TimePoint' and target_attype == 'TextDocument':
             pass
         else:
-            print('-', source_attype, target_attype)
+            self.graph.diagnostics.add(
+                f'No anchors for alignment from {source_attype} to {target_attype}',
+                f'{self.identifier} -> {target.identifier}')
         if debug:
             print('>>>', self.anchors)
 
@@ -301,25 +743,13 @@ class Node(object):
                                       self.properties.get('text'))
         return "<%s %s%s>" % (self.at_type.shortname, self.identifier, anchor)
 
-    def _get_document(self):
+    def _get_document(self, view):
         """Return the document or annotation node that the annotation/document in
         the node refers to via the document property. This could be a local property
-        or a metadata property if there is no such local property. Return None
-        if neither of those exist."""
-        # try the local property
-        docid = self.properties.get('document')
-        if docid is not None:
-            # print('>>>', docid, self.graph.get_node(docid))
-            return self.graph.get_node(docid)
-        # try the metadata property
-        if self.view is not None:
-            try:
-                metadata = self.view.metadata.contains[self.at_type]
-                docid = metadata['document']
-                return self.graph.get_node(docid)
-            except KeyError:
-                return None
-        return None
+        or a metadata property of the mmif.View if there is no such local property.
+        Return None if neither of those exist."""
+        docid = document_id(view, self.at_type, self.properties)
+        return None if docid is None else self.graph.get_node(docid)
 
     def _get_document_plus_span(self):
         props = self.properties
@@ -396,8 +826,8 @@ class TimeFrameNode(Node):
 
 class EntityNode(Node):
 
-    def __init__(self, graph, view, annotation):
-        super().__init__(graph, view, annotation)
+    def __init__(self, graph, view, annotation, properties: dict = None):
+        super().__init__(graph, view, annotation, properties)
         self.tokens = []
         self._paths = None
         self._anchor = None
@@ -421,13 +851,14 @@ class EntityNode(Node):
         for i, p in enumerate(self.paths_to_docs()):
             print('  %s' % ' '.join([str(n) for n in p[1:]]))
 
-    def summary(self):
+    def summary(self, group: int = None):
         """The summary for entities needs to include where in the video or image
-        the entity occurs, it is not enough to just give the text document."""
+        the entity occurs, it is not enough to just give the text document. The
+        group is determined by the summary, see summary.Bins."""
         anchor = self.anchor()
         return {
             'id': self.identifier,
-            'group': self.properties['group'],
+            'group': group,
             'cat': self.properties['category'],
             'tag': self.properties.get('tag'),
             'document': self._get_document_plus_span(),
@@ -443,8 +874,9 @@ class EntityNode(Node):
         is always a time frame or a bounding box.
         """
         # TODO: deal with the case where the primary document is not a video
-        self.paths = self.paths_to_docs()
-        bbtf = self.find_boundingbox_or_timeframe()
+        # the paths are not stored on the node so that the graph is not changed
+        paths = self.paths_to_docs()
+        bbtf = self.find_boundingbox_or_timeframe(paths)
         # for path in paths:
         #     print('... [')
         #     for n in path: print('     ', n)
@@ -469,7 +901,7 @@ class EntityNode(Node):
         # TODO: deal with the case where the primary document is not a video
         if self._anchor is None:
             self._paths = self.paths_to_docs()
-            bbtf = self.find_boundingbox_or_timeframe()
+            bbtf = self.find_boundingbox_or_timeframe(self._paths)
             # for path in self._paths:
             #    print('... [')
             #    for n in path: print('     ', n)
@@ -482,8 +914,9 @@ class EntityNode(Node):
                                 'video-end': bbtf.properties['end']}
         return self._anchor
 
-    def find_boundingbox_or_timeframe(self):
-        return self.paths[-1][-2]
+    @staticmethod
+    def find_boundingbox_or_timeframe(paths: list):
+        return paths[-1][-2]
 
     @staticmethod
     def _coordinates_as_string(anchor):
@@ -502,10 +935,51 @@ class Nodes(object):
                      config.TIME_FRAME: TimeFrameNode }
 
     @classmethod
-    def new(cls, graph, view, annotation):
+    def new(cls, graph, view, annotation, properties: dict = None):
         node_class = cls.node_classes.get(annotation.at_type.shortname, Node)
-        return node_class(graph, view, annotation)
+        return node_class(graph, view, annotation, properties)
 
+    @classmethod
+    def restore(cls, graph, view, at_type, identifier, properties, anchors):
+        """Create a node from the data in a graph snapshot. This bypasses the
+        initialization of the node since there is no annotation to copy from
+        and since the anchors were already calculated. The document and targets
+        are set later when all nodes are available."""
+        node_class = cls.node_classes.get(at_type.shortname, Node)
+        node = node_class.__new__(node_class)
+        node.graph = graph
+        node.view = view
+        node.annotation = None
+        node.at_type = at_type
+        node.identifier = identifier
+        node.properties = properties
+        node.anchors = anchors
+        node.document = None
+        node.targets = []
+        if issubclass(node_class, EntityNode):
+            node.tokens = []
+            node._paths = None
+            node._anchor = None
+        return node
+
+
+
+def document_id(view, at_type, properties: dict):
+    """Return the identifier of the document that an annotation refers to via the
+    document property, which could be a local property or a metadata property of the
+    mmif.View if there is no such local property. Return None if neither of those
+    exist."""
+    # try the local property
+    docid = properties.get('document')
+    if docid is not None:
+        return docid
+    # try the metadata property
+    if view is not None:
+        try:
+            return view.metadata.contains[at_type]['document']
+        except KeyError:
+            return None
+    return None
 
 
 if __name__ == '__main__':
@@ -0,0 +1,324 @@
+"""Graph views
+
+Selects the part of a graph.Graph that visualize.py draws. Graphs of ASR or OCR
+output easily have tens of thousands of nodes, which graphviz cannot lay out in
+reasonable time, so there are three ways to make the drawing smaller:
+
+- A time window. Only nodes anchored in the window are drawn, plus the nodes
+  without a time anchor that are linked to them, like the documents. The rows of
+  the token tables are selected on their time columns, so Tokens and TimeFrames
+  outside of the window are never created.
+
+- Collapsing. Nodes with the same view, the same type and links to the same types
+  of nodes are drawn as one cluster node, and when two clusters are linked one to
+  one, as the Tokens and TimeFrames of an ASR view are, they become one node with
+  a label like "1,243 Token→TimeFrame pairs". Edges between clusters get the
+  number of edges they stand for. Documents are never collapsed.
+
+- Sampling. When there are more than max_nodes nodes left, a random sample is
+  drawn, where each sampled node comes with the nodes it links to. Documents and
+  cluster nodes are always kept. The seed is fixed so the same graph gives the
+  same drawing.
+
+A view has a list of Item instances, each with a name, a label and the type used
+for the shape and color of the node, and a dictionary from (source, target) name
+pairs to edge counts, which is what a drawing library needs.
+
+"""
+
+import random
+from collections import defaultdict
+
+from summarizer import config
+from summarizer.utils import get_node_label
+
+
+# Minimum number of similar nodes that are collapsed into a cluster
+CLUSTER_SIZE = 10
+
+
+class Item(object):
+
+    """A node in the view, for a graph node or for a cluster of graph nodes.
+
+    name     -  the name of the node in the drawing
+    label    -  text to show in the node
+    at_type  -  short name of the annotation type, for the shape and color
+    view_id  -  identifier of the view, None for top-level documents
+    count    -  number of graph nodes the item stands for
+    node     -  the graph node, None for clusters
+    bold     -  True for top-level documents
+
+    """
+
+    def __init__(self, name: str, label: str, at_type: str, view_id: str = None,
+                 count: int = 1, node=None, bold=False):
+        self.name = name
+        self.label = label
+        self.at_type = at_type
+        self.view_id = view_id
+        self.count = count
+        self.node = node
+        self.bold = bold
+
+    def __str__(self):
+        return f'<Item {self.name} {self.at_type} {self.count}>'
+
+    @property
+    def is_cluster(self) -> bool:
+        return self.node is None
+
+    @classmethod
+    def for_node(cls, node):
+        view_id = None if node.view is None else node.view.id
+        return cls(node_name(node), get_node_label(node), node.at_type.shortname,
+                   view_id, node=node, bold=node.view is None)
+
+
+class GraphView(object):
+
+    """The part of a graph that is drawn.
+
+    graph      -  instance of graph.Graph
+    window     -  pair of start and end time in milliseconds, None for all times
+    collapse   -  when True, similar nodes are collapsed into cluster nodes
+    max_nodes  -  maximum number of items, 0 or None for no maximum
+    items      -  list of Item instances
+    edges      -  dictionary with the number of edges for each (source, target)
+                  pair of item names
+    total      -  number of items before sampling
+
+    """
+
+    def __init__(self, graph, window: tuple = None, collapse=False,
+                 max_nodes: int = 0, seed: int = 0):
+        self.graph = graph
+        self.window = window
+        self.collapse = collapse
+        self.max_nodes = max_nodes
+        nodes, table_rows = self._select()
+        if collapse:
+            self.items, self.edges = self._collapse(nodes, table_rows)
+        else:
+            nodes.extend(self._table_nodes(table_rows))
+            self.items = [Item.for_node(node) for node in nodes]
+            self.edges = node_edges(nodes, dict((n.identifier, node_name(n)) for n in nodes))
+        self.total = len(self.items)
+        if max_nodes and len(self.items) > max_nodes:
+            self._sample(random.Random(seed))
+
+    def __str__(self):
+        return f'<GraphView {len(self.items)} of {self.total} nodes, {len(self.edges)} edges>'
+
+    @property
+    def sampled(self) -> bool:
+        return len(self.items) < self.total
+
+    def in_window(self, span) -> bool:
+        return (self.window is None
+                or (span is not None and span[0] <= self.window[1] and span[1] >= self.window[0]))
+
+    def _select(self):
+        """Return the nodes in the window and, for each token table, the rows in the
+        window. Nodes without a time anchor are selected when they link to or are
+        linked from a node in the window, top-level documents are always selected."""
+        nodes = list(self.graph.nodes.values())
+        table_rows = {}
+        for view_id, table in self.graph.token_tables.items():
+            table_rows[view_id] = [
+                row for row in range(len(table))
+                if self.in_window((table.time_start[row], table.time_end[row]))]
+        if self.window is None:
+            return nodes, table_rows
+        selected = set()
+        unanchored = []
+        for node in nodes:
+            span = time_span(node)
+            if span is None:
+                unanchored.append(node)
+            elif self.in_window(span):
+                selected.add(node.identifier)
+        linked = set()
+        # the documents of selected table rows, which are linked like the documents
+        # of Token and TimeFrame nodes and do not pull in other nodes themselves
+        for view_id, rows in table_rows.items():
+            if rows:
+                table = self.graph.token_tables[view_id]
+                linked.update(d for d in (table.document, table.timeframe_document) if d)
+        for node in nodes:
+            for target in node.targets:
+                if node.identifier in selected:
+                    linked.add(target.identifier)
+                elif target.identifier in selected:
+                    linked.add(node.identifier)
+        for node in unanchored:
+            if node.view is None or node.identifier in linked:
+                selected.add(node.identifier)
+        return [node for node in nodes if node.identifier in selected], table_rows
+
+    def _table_nodes(self, table_rows: dict) -> list:
+        """Return the Token and TimeFrame nodes for the selected table rows."""
+        nodes = []
+        for view_id, rows in table_rows.items():
+            table = self.graph.token_tables[view_id]
+            for row in rows:
+                nodes.append(self.graph.get_node(table.identifiers[row]))
+                nodes.append(self.graph.get_node(table.timeframes[row]))
+        return nodes
+
+    def _collapse(self, nodes: list, table_rows: dict):
+        """Return the items and edges of the view with similar nodes collapsed."""
+        groups = defaultdict(list)
+        for node in nodes:
+            groups[signature(node)].append(node)
+        items = []
+        names = {}
+        for key, members in groups.items():
+            if key is None or len(members) < CLUSTER_SIZE:
+                for node in members:
+                    items.append(Item.for_node(node))
+                    names[node.identifier] = node_name(node)
+            else:
+                view_id, at_type, _ = key
+                item = Item(cluster_name(key), cluster_label(len(members), at_type, view_id),
+                            at_type, view_id, count=len(members))
+                items.append(item)
+                for node in members:
+                    names[node.identifier] = item.name
+        edges = node_edges(nodes, names)
+        items, edges = merge_pairs(items, edges, nodes, names)
+        # the rows of a token table are Token→TimeFrame pairs by definition
+        for view_id, rows in table_rows.items():
+            if not rows:
+                continue
+            table = self.graph.token_tables[view_id]
+            name = f'table {view_id}'
+            label = cluster_label(len(rows), f'{config.TOKEN}→{config.TIME_FRAME}', view_id, 'pairs')
+            items.append(Item(name, label, config.TOKEN, view_id, count=len(rows)))
+            for document in (table.document, table.timeframe_document):
+                if document is not None and document in names:
+                    edges[(name, names[document])] = edges.get((name, names[document]), 0) + len(rows)
+        return items, edges
+
+    def _sample(self, rng: random.Random):
+        """Keep at most max_nodes items, documents and clusters are always kept.
+        Items are taken in random order together with the items they link to, so
+        the sample still shows how nodes are linked."""
+        fixed = [item for item in self.items if item.is_cluster or item.bold]
+        keep = set(item.name for item in fixed)
+        targets = defaultdict(list)
+        for source, target in self.edges:
+            targets[source].append(target)
+        others = [item for item in self.items if item.name not in keep]
+        for item in rng.sample(others, len(others)):
+            if len(keep) >= self.max_nodes:
+                break
+            for name in [item.name] + targets[item.name]:
+                if len(keep) < self.max_nodes:
+                    keep.add(name)
+        self.items = [item for item in self.items if item.name in keep]
+        self.edges = {(s, t): n for (s, t), n in self.edges.items()
+                      if s in keep and t in keep}
+
+
+def time_span(node):
+    """Return the start and end time of the node in milliseconds, or None if the node
+    is not anchored in time. Entities take the span of their tokens."""
+    anchors = node.anchors
+    if 'time-offsets' in anchors:
+        return tuple(anchors['time-offsets'])
+    if 'time-point' in anchors:
+        return anchors['time-point'], anchors['time-point']
+    props = node.properties
+    if node.at_type.shortname == config.TIME_FRAME and 'start' in props and 'end' in props:
+        return props['start'], props['end']
+    spans = [time_span(token) for token in getattr(node, 'tokens', None) or []]
+    spans = [span for span in spans if span is not None]
+    if spans:
+        return min(s[0] for s in spans), max(s[1] for s in spans)
+    return None
+
+
+def signature(node):
+    """Return the key on which nodes are collapsed, which is the view, the type and
+    the types of the nodes it links to. Return None for nodes that should never be
+    collapsed."""
+    if node.view is None or node.at_type.shortname.endswith('Document'):
+        return None
+    targets = frozenset(
+        (t.at_type.shortname, None if t.view is None else t.view.id) for t in node.targets)
+    return node.view.id, node.at_type.shortname, targets
+
+
+def merge_pairs(items: list, edges: dict, nodes: list, names: dict):
+    """Merge two clusters that are linked one to one, so each node of the first is
+    linked to exactly one node of the second and the other way around, into one
+    cluster of pairs. Returns the new items and edges."""
+    by_name = {item.name: item for item in items}
+    members = defaultdict(list)
+    for node in nodes:
+        members[names[node.identifier]].append(node.identifier)
+    # number of links of each node into each item and from each item
+    out_links = defaultdict(int)
+    in_links = defaultdict(int)
+    for node in nodes:
+        for target in node.targets:
+            if target.identifier in names:
+                out_links[(node.identifier, names[target.identifier])] += 1
+                in_links[(target.identifier, names[node.identifier])] += 1
+    merged = {}
+    for (source, target), count in edges.items():
+        s_item, t_item = by_name[source], by_name[target]
+        if (not s_item.is_cluster or not t_item.is_cluster or source == target
+                or source in merged or target in merged
+                or source in merged.values() or target in merged.values()
+                or not count == s_item.count == t_item.count):
+            continue
+        if (all(out_links[(n, target)] == 1 for n in members[source])
+                and all(in_links[(n, source)] == 1 for n in members[target])):
+            merged[target] = source
+            s_item.label = cluster_label(
+                count, f'{s_item.at_type}→{t_item.at_type}', s_item.view_id, 'pairs')
+    if not merged:
+        return items, edges
+    new_edges = {}
+    for (source, target), count in edges.items():
+        source, target = merged.get(source, source), merged.get(target, target)
+        if source != target:
+            new_edges[(source, target)] = new_edges.get((source, target), 0) + count
+    return [item for item in items if item.name not in merged], new_edges
+
+
+def node_edges(nodes: list, names: dict) -> dict:
+    """Return the edge counts between the named items for the targets of the nodes,
+    names maps node identifiers to item names."""
+    edges = {}
+    for node in nodes:
+        source = names[node.identifier]
+        for target in node.targets:
+            target_name = names.get(target.identifier)
+            if target_name is not None:
+                edges[(source, target_name)] = edges.get((source, target_name), 0) + 1
+    return edges
+
+
+def node_name(node) -> str:
+    return node.identifier.replace(':', '_')
+
+
+def cluster_name(key) -> str:
+    view_id, at_type, targets = key
+    target_types = '+'.join(sorted(f'{t}@{v}' for t, v in targets))
+    return f'cluster {view_id} {at_type} {target_types}'
+
+
+def cluster_label(count: int, what: str, view_id: str, unit: str = 'nodes') -> str:
+    view_id = view_id.replace('_', '')
+    return f'{view_id}\n{count:,} {what} {unit}'
+
+
+def parse_window(window: str) -> tuple:
+    """Return the (start, end) pair for a window given as START-END, where the times
+    are in milliseconds."""
+    start, end = window.split('-')
+    return int(start), int(end)
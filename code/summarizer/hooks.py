@@ -0,0 +1,113 @@
+"""Hooks
+
+Callbacks for code that embeds the summarizer, for example a job scheduler that
+wants to show progress or stop a job that goes over its budget. Create a subclass
+of Hooks, override the methods you need and hand an instance to Summary or Graph:
+
+    class SchedulerHooks(Hooks):
+
+        def on_progress(self, n_done, n_total):
+            job.report(n_done, n_total)
+
+        def cancelled(self):
+            return job.over_budget()
+
+    summary = Summary.from_path('input.mmif', hooks=SchedulerHooks())
+
+The long loops of the summarizer report their progress every PROGRESS_INTERVAL
+items and call cancelled() at the same time. When cancelled() returns True a
+CancelledException is raised and the summary or graph is not created. Without
+hooks a Hooks instance that does nothing is used, which costs a counter update for
+each item.
+
+"""
+
+from contextlib import contextmanager
+
+
+# Stages of creating a summary, in the order in which they start
+STAGE_NODES = 'nodes'
+STAGE_EDGES = 'edges'
+STAGE_TOKENS = 'tokens'
+STAGE_SECTIONS = 'sections'
+
+# Number of items between two progress reports in the graph stages
+PROGRESS_INTERVAL = 1000
+
+
+class CancelledException(Exception):
+    pass
+
+
+class Hooks(object):
+
+    """Callbacks for the stages of the summarizer, all of them do nothing here.
+    Callbacks are called from the thread that creates the summary."""
+
+    def on_stage_start(self, stage: str):
+        pass
+
+    def on_stage_end(self, stage: str):
+        pass
+
+    def on_progress(self, n_done: int, n_total: int):
+        """Called during a stage with the number of items done so far, for example
+        annotations, alignments or sections, and the total for the stage."""
+        pass
+
+    def cancelled(self) -> bool:
+        """Return True to stop the work, this is checked with each progress report
+        and at the start and end of each stage."""
+        return False
+
+    def check(self):
+        """Raise a CancelledException if the work should stop."""
+        if self.cancelled():
+            raise CancelledException('Summarizer was cancelled')
+
+    @contextmanager
+    def stage(self, stage: str, total: int = None, interval: int = PROGRESS_INTERVAL):
+        """Context manager for a stage, which yields a Progress for the stage. The
+        end of the stage is also reported when the stage raises an error or is
+        cancelled."""
+        self.check()
+        self.on_stage_start(stage)
+        progress = Progress(self, total, interval)
+        try:
+            yield progress
+            # the last report of a stage always has all items done
+            if progress.reported != progress.done:
+                self.on_progress(progress.done, progress.total)
+        finally:
+            self.on_stage_end(stage)
+        self.check()
+
+
+class Progress(object):
+
+    """Counts the items done in a stage and reports to the hooks every interval
+    items. Reporting also checks whether the work was cancelled.
+
+    hooks     -  instance of Hooks
+    total     -  total number of items in the stage, None if not known
+    interval  -  number of items between reports
+    done      -  number of items done
+    reported  -  number of items done at the last report
+
+    """
+
+    def __init__(self, hooks: Hooks, total: int = None, interval: int = PROGRESS_INTERVAL):
+        self.hooks = hooks
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.reported = 0
+        self._next = interval
+
+    def step(self, n: int = 1):
+        self.done += n
+        if self.done >= self._next:
+            self._next = self.done + self.interval
+            self.reported = self.done
+            self.hooks.on_progress(self.done, self.total)
+            self.hooks.check()
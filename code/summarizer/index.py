@@ -0,0 +1,377 @@
+"""Corpus index
+
+Loads the entities, timeframes, captions and transcript sections of many JSON
+summaries into a SQLite database so you can ask which assets mention something
+and when, without opening all the summary files.
+
+USAGE:
+
+    $ summarize index DATABASE --add PATH [PATH ...]
+
+    Adds the summaries in PATH to the database, where PATH is a summary file or a
+    directory which is searched recursively for summaries (.json, possibly with a
+    .gz, .bz2 or .xz extension, other JSON files are skipped). Loading is
+    incremental, summaries and other JSON files that were seen before are skipped
+    unless they changed since then, and summaries that were loaded from the
+    directory before but are not there anymore are removed. Paths are stored as
+    absolute paths, so it does not matter where the command is run from.
+
+    $ summarize index DATABASE --entity TEXT [--label LABEL]
+    $ summarize index DATABASE --label LABEL
+    $ summarize index DATABASE --timeframe LABEL
+    $ summarize index DATABASE --transcript TEXT
+    $ summarize index DATABASE --captions TEXT
+
+    Query the database and print the asset identifier, start time and end time
+    in milliseconds and the text, separated by tabs. Entity text is matched case
+    insensitively, transcript and captions text is matched case insensitively as a
+    substring, using a full-text index when the text has at least three characters.
+
+From Python:
+
+    >>> from summarizer.index import SummaryIndex
+    >>> idx = SummaryIndex('corpus.db')
+    >>> idx.add_path('summaries/')
+    {'added': 1203, 'removed': 0}
+    >>> idx.find_entities('Jim Lehrer')
+    [{'asset': 'cpb-aacip-507-154dn40c26', 'start-time': 12500, ...}]
+
+The asset identifier is the name of the summary file without extensions.
+
+The database has a schema version, a database created with another version of the
+schema is refused, delete it and add the summaries again.
+
+"""
+
+import sys
+import json
+import sqlite3
+import pathlib
+import argparse
+
+from summarizer.utils import open_file, strip_compression_suffix
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS summaries (
+    id INTEGER PRIMARY KEY,
+    asset TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL,
+    size INTEGER);
+CREATE TABLE IF NOT EXISTS skipped (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER);
+CREATE TABLE IF NOT EXISTS entities (
+    summary INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    label TEXT,
+    start INTEGER,
+    end INTEGER);
+CREATE TABLE IF NOT EXISTS timeframes (
+    summary INTEGER NOT NULL,
+    app TEXT,
+    label TEXT,
+    score REAL,
+    start INTEGER,
+    end INTEGER);
+CREATE TABLE IF NOT EXISTS captions (
+    id INTEGER PRIMARY KEY,
+    summary INTEGER NOT NULL,
+    start INTEGER,
+    text TEXT);
+CREATE TABLE IF NOT EXISTS transcript (
+    id INTEGER PRIMARY KEY,
+    summary INTEGER NOT NULL,
+    start INTEGER,
+    end INTEGER,
+    text TEXT);
+CREATE INDEX IF NOT EXISTS idx_summaries_asset ON summaries (asset);
+CREATE INDEX IF NOT EXISTS idx_entities_text ON entities (text COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_entities_label ON entities (label);
+CREATE INDEX IF NOT EXISTS idx_entities_time ON entities (summary, start);
+CREATE INDEX IF NOT EXISTS idx_timeframes_label ON timeframes (label);
+CREATE INDEX IF NOT EXISTS idx_timeframes_time ON timeframes (summary, start);
+CREATE INDEX IF NOT EXISTS idx_captions_time ON captions (summary, start);
+CREATE INDEX IF NOT EXISTS idx_transcript_time ON transcript (summary, start);
+'''
+
+# Full-text indexes on the text of captions and transcripts, kept up to date by
+# triggers. The trigram tokenizer allows matching any substring of three or more
+# characters.
+FULL_TEXT_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+    text, content='{table}', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {table}_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {table}_fts ({table}_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+'''
+
+# Version of the schema, stored as the user_version of the database
+SCHEMA_VERSION = 2
+
+FULL_TEXT_SECTIONS = ('captions', 'transcript')
+
+SECTIONS = ('entities', 'timeframes', 'captions', 'transcript')
+
+# Summaries are committed in batches, which is much faster than committing each
+# summary while still not losing everything when loading is interrupted.
+COMMIT_SIZE = 500
+
+
+class IndexException(Exception):
+    pass
+
+
+class SummaryIndex(object):
+
+    """Index on the sections of many summaries, stored in a SQLite database.
+
+    connection  -  instance of sqlite3.Connection
+
+    """
+
+    def __init__(self, dbfile: str):
+        self.connection = sqlite3.connect(dbfile)
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        tables = self.connection.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0]
+        if tables and version != SCHEMA_VERSION:
+            self.connection.close()
+            raise IndexException(
+                f'Unsupported schema version {version} in {dbfile} (expected'
+                f' {SCHEMA_VERSION}), delete it and add the summaries again')
+        self.connection.executescript(SCHEMA)
+        for table in FULL_TEXT_SECTIONS:
+            self.connection.executescript(FULL_TEXT_SCHEMA.format(table=table))
+        self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def __str__(self):
+        count = self.connection.execute('SELECT COUNT(*) FROM summaries').fetchone()[0]
+        return f'<SummaryIndex with {count} summaries>'
+
+    def close(self):
+        self.connection.close()
+
+    def add_path(self, path) -> dict:
+        """Add a summary file or all summary files in a directory tree to the index.
+        Summaries that were added from the directory tree before but that are not
+        there anymore are removed. Returns the number of summaries that were added
+        or updated and the number that were removed."""
+        path = pathlib.Path(path).resolve()
+        paths = [path] if path.is_file() else sorted(summary_files(path))
+        added = 0
+        for n, summary_path in enumerate(paths, 1):
+            if self.add_summary(summary_path, commit=False):
+                added += 1
+            if n % COMMIT_SIZE == 0:
+                self.connection.commit()
+        removed = 0 if path.is_file() else self._remove_missing(path, paths)
+        self.connection.commit()
+        return {'added': added, 'removed': removed}
+
+    def add_summary(self, path, commit=True) -> bool:
+        """Add one summary file to the index, replacing what was there if the file
+        was indexed before and changed since. Files that are not summaries are
+        recorded as skipped so they are not read again until they change. Returns
+        False if nothing was added because the file did not change or because it
+        is not a summary."""
+        path = pathlib.Path(path).resolve()
+        stat = path.stat()
+        cursor = self.connection.cursor()
+        row = cursor.execute(
+            'SELECT id, mtime, size FROM summaries WHERE path = ?',
+            (str(path),)).fetchone()
+        if row is not None:
+            if row[1] == stat.st_mtime and row[2] == stat.st_size:
+                return False
+            self._delete_summary(row[0])
+        skipped = cursor.execute(
+            'SELECT mtime, size FROM skipped WHERE path = ?', (str(path),)).fetchone()
+        if skipped == (stat.st_mtime, stat.st_size):
+            return False
+        try:
+            with open_file(path) as fh:
+                summary = json.load(fh)
+        except ValueError:
+            summary = None
+        if not is_summary(summary):
+            # some other JSON file, for example batch metrics
+            cursor.execute('INSERT OR REPLACE INTO skipped VALUES (?, ?, ?)',
+                           (str(path), stat.st_mtime, stat.st_size))
+            if commit:
+                self.connection.commit()
+            return False
+        cursor.execute('DELETE FROM skipped WHERE path = ?', (str(path),))
+        cursor.execute(
+            'INSERT INTO summaries (asset, path, mtime, size) VALUES (?, ?, ?, ?)',
+            (asset_identifier(path), str(path), stat.st_mtime, stat.st_size))
+        self._add_sections(cursor.lastrowid, summary)
+        if commit:
+            self.connection.commit()
+        return True
+
+    def _remove_missing(self, directory: pathlib.Path, paths: list) -> int:
+        """Remove the summaries and skipped files in the directory tree that are not
+        in paths and return how many summaries were removed."""
+        found = set(str(path.resolve()) for path in paths)
+        def is_missing(path):
+            return path not in found and pathlib.Path(path).is_relative_to(directory)
+        missing = [
+            summary_id for summary_id, path
+            in self.connection.execute('SELECT id, path FROM summaries')
+            if is_missing(path)]
+        for summary_id in missing:
+            self._delete_summary(summary_id)
+        self.connection.executemany(
+            'DELETE FROM skipped WHERE path = ?',
+            [(path,) for path, in self.connection.execute('SELECT path FROM skipped')
+             if is_missing(path)])
+        return len(missing)
+
+    def _delete_summary(self, summary_id: int):
+        for section in SECTIONS:
+            self.connection.execute(
+                f'DELETE FROM {section} WHERE summary = ?', (summary_id,))
+        self.connection.execute('DELETE FROM summaries WHERE id = ?', (summary_id,))
+
+    def _add_sections(self, summary_id: int, summary: dict):
+        entities = [
+            (summary_id, entity['text'], instance.get('cat'),
+             instance.get('video-start'), instance.get('video-end'))
+            for entity in summary.get('entities', [])
+            for instance in entity['instances']]
+        timeframes = [
+            (summary_id, app, tf.get('label'), tf.get('score'),
+             tf.get('start-time'), tf.get('end-time'))
+            for app, frames in summary.get('timeframes', {}).items()
+            for tf in frames]
+        captions = [
+            (summary_id, caption.get('time-point'), caption.get('text'))
+            for caption in summary.get('captions', [])]
+        transcript = [
+            (summary_id, element.get('start-time'), element.get('end-time'),
+             element.get('text'))
+            for element in summary.get('transcript', [])]
+        execute = self.connection.executemany
+        execute('INSERT INTO entities VALUES (?, ?, ?, ?, ?)', entities)
+        execute('INSERT INTO timeframes VALUES (?, ?, ?, ?, ?, ?)', timeframes)
+        execute('INSERT INTO captions (summary, start, text) VALUES (?, ?, ?)', captions)
+        execute('INSERT INTO transcript (summary, start, end, text) VALUES (?, ?, ?, ?)',
+                transcript)
+
+    def find_entities(self, text: str = None, label: str = None) -> list:
+        """Return the occurrences of entities with the given text and/or label, the
+        text match is case insensitive."""
+        conditions, values = [], []
+        if text is not None:
+            conditions.append('e.text = ? COLLATE NOCASE')
+            values.append(text)
+        if label is not None:
+            conditions.append('e.label = ?')
+            values.append(label)
+        return self._query('entities', 'e.start, e.end, e.text', conditions, values)
+
+    def find_timeframes(self, label: str) -> list:
+        """Return all time frames with the given label."""
+        return self._query(
+            'timeframes', 'e.start, e.end, e.label', ['e.label = ?'], [label])
+
+    def find_in_transcript(self, text: str) -> list:
+        """Return all transcript elements that contain the text, ignoring case."""
+        return self._query(
+            'transcript', 'e.start, e.end, e.text', *contains_condition('transcript', text))
+
+    def find_in_captions(self, text: str) -> list:
+        """Return all captions that contain the text, ignoring case. Captions are
+        anchored to a time point so the start and end time are the same."""
+        return self._query(
+            'captions', 'e.start, e.start, e.text', *contains_condition('captions', text))
+
+    def _query(self, table: str, fields: str, conditions: list, values: list) -> list:
+        where = ' AND '.join(conditions) if conditions else '1'
+        query = (f'SELECT s.asset, {fields} FROM {table} e'
+                 f' JOIN summaries s ON e.summary = s.id'
+                 f' WHERE {where} ORDER BY s.asset, e.start')
+        return [{'asset': asset, 'start-time': start, 'end-time': end, 'text': text}
+                for asset, start, end, text in self.connection.execute(query, values)]
+
+
+def contains_condition(table: str, text: str) -> tuple:
+    """Return the conditions and values that select the rows of a table with a
+    full-text index where the text occurs. The trigram index needs at least three
+    characters, shorter text is matched with LIKE on the table itself."""
+    if len(text) >= 3:
+        # a quoted string is matched as a substring by the trigram tokenizer
+        phrase = '"' + text.replace('"', '""') + '"'
+        return ([f'e.id IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)'],
+                [phrase])
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return ["e.text LIKE ? ESCAPE '\\'"], [f'%{escaped}%']
+
+
+def summary_files(directory: pathlib.Path):
+    """Yield all files in the directory tree that could be summaries, which are
+    JSON files that may be compressed. Use is_summary() on the content to check."""
+    for path in directory.rglob('*'):
+        if path.is_file() and strip_compression_suffix(path).endswith('.json'):
+            yield path
+
+
+def is_summary(data) -> bool:
+    """Return True if the data loaded from a JSON file has the shape of a summary."""
+    return isinstance(data, dict) and 'views' in data
+
+
+def asset_identifier(path) -> str:
+    """Return the asset identifier for a summary file, which is the file name
+    without the .json and compression extensions."""
+    return pathlib.Path(strip_compression_suffix(path)).stem
+
+
+def argparser():
+    parser = argparse.ArgumentParser(
+        prog='summarize index',
+        description='Create or query an index over a collection of summaries')
+    parser.add_argument('database', help='SQLite database file')
+    parser.add_argument('--add', metavar='PATH', nargs='+', help='add summary files or directories')
+    parser.add_argument('--entity', metavar='TEXT', help='find entities with this text')
+    parser.add_argument('--label', metavar='LABEL', help='find entities with this label')
+    parser.add_argument('--timeframe', metavar='LABEL', help='find time frames with this label')
+    parser.add_argument('--transcript', metavar='TEXT', help='find text in transcripts')
+    parser.add_argument('--captions', metavar='TEXT', help='find text in captions')
+    return parser
+
+
+def main(arguments: list = None):
+    parser = argparser()
+    args = parser.parse_args(arguments)
+    idx = SummaryIndex(args.database)
+    results = None
+    if args.add:
+        for path in args.add:
+            counts = idx.add_path(path)
+            print(f'{path}: added or updated {counts["added"]} summaries,'
+                  f' removed {counts["removed"]}')
+    if args.entity or args.label:
+        results = idx.find_entities(args.entity, args.label)
+    elif args.timeframe:
+        results = idx.find_timeframes(args.timeframe)
+    elif args.transcript:
+        results = idx.find_in_transcript(args.transcript)
+    elif args.captions:
+        results = idx.find_in_captions(args.captions)
+    elif not args.add:
+        parser.print_help()
+    for result in results or []:
+        print('%s\t%s\t%s\t%s' % (result['asset'], result['start-time'],
+                                  result['end-time'], result['text']))
+    idx.close()
+
+
+if __name__ == '__main__':
+
+    main(sys.argv[1:])
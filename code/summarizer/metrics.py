@@ -0,0 +1,221 @@
+"""Batch metrics
+
+Aggregate numbers for a batch run: files per second, input and output megabytes per
+second, latency percentiles and a latency histogram, the ratio of summary size to
+MMIF size, and file counts by status and by pipeline, where the pipeline is the
+sequence of apps that created the views of the MMIF file.
+
+The metrics are written in two formats, in the Prometheus text exposition format,
+so a node-exporter textfile collector can pick them up, and as JSON. Both files are
+written to a temporary file first and then renamed, so a collector never sees a
+half-written file.
+
+"""
+
+import os
+import json
+import math
+import time
+import pathlib
+from datetime import datetime
+
+
+# Prefix for the names of the Prometheus metrics
+PREFIX = 'mmif_summarizer'
+
+# Upper bounds in seconds of the buckets of the latency histogram
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Latency percentiles that are reported
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Minimum number of seconds between two writes of the metrics during a run
+INTERVAL = 15
+
+# Pipeline name used when the file failed before its views were read
+UNKNOWN_PIPELINE = 'unknown'
+
+
+class Metrics(object):
+
+    """Metrics for a batch run.
+
+    path           -  path of the Prometheus file, the JSON file has the same name
+                      with the .json extension, so path should end in .prom
+    started        -  time when the run started
+    written        -  time when the metrics were last written
+    statuses       -  file counts indexed on status
+    pipelines      -  file counts indexed on pipeline and status
+    latencies      -  list with the number of seconds spent on each file
+    input_bytes    -  total size of all MMIF files
+    ok_input_bytes -  total size of the MMIF files that were summarized
+    output_bytes   -  total size of all summaries
+
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.started = time.monotonic()
+        self.written = None
+        self.statuses = {}
+        self.pipelines = {}
+        self.latencies = []
+        self.input_bytes = 0
+        self.ok_input_bytes = 0
+        self.output_bytes = 0
+
+    def __str__(self):
+        return f'<Metrics {len(self.latencies)} files>'
+
+    @property
+    def json_path(self) -> pathlib.Path:
+        if self.path.suffix == '.json':
+            return self.path.with_name(self.path.name + '.json')
+        return self.path.with_suffix('.json')
+
+    def add(self, status: str, seconds: float, pipeline: str = None,
+            input_bytes: int = 0, output_bytes: int = 0):
+        """Add the results for one file. The output size is only used for files that
+        were summarized, that is, when the status is ok."""
+        pipeline = pipeline or UNKNOWN_PIPELINE
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        counts = self.pipelines.setdefault(pipeline, {})
+        counts[status] = counts.get(status, 0) + 1
+        self.latencies.append(seconds)
+        self.input_bytes += input_bytes
+        if status == 'ok':
+            self.ok_input_bytes += input_bytes
+            self.output_bytes += output_bytes
+
+    def as_json(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+        return {
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'elapsed_seconds': round(elapsed, 3),
+            'files': len(latencies),
+            'statuses': dict(self.statuses),
+            'pipelines': {p: dict(c) for p, c in self.pipelines.items()},
+            'files_per_second': rate(len(latencies), elapsed),
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'input_mb_per_second': rate(self.input_bytes / 1e6, elapsed),
+            'output_mb_per_second': rate(self.output_bytes / 1e6, elapsed),
+            'compression_ratio': rate(self.output_bytes, self.ok_input_bytes),
+            'latency_seconds': {
+                **{f'p{round(q * 100)}': percentile(latencies, q) for q in QUANTILES},
+                'mean': rate(sum(latencies), len(latencies)),
+                'max': latencies[-1] if latencies else None },
+            'latency_histogram': {
+                str(bound): count for bound, count in histogram(latencies) } }
+
+    def as_prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        data = self.as_json()
+        latencies = sorted(self.latencies)
+        lines = []
+        def metric(name, kind, text, samples):
+            lines.append(f'# HELP {PREFIX}_{name} {text}')
+            lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+            for suffix, labels, value in samples:
+                label_string = ','.join(f'{k}="{escape(v)}"' for k, v in labels.items())
+                if label_string:
+                    label_string = '{' + label_string + '}'
+                lines.append(f'{PREFIX}_{name}{suffix}{label_string} {number(value)}')
+        metric('files_total', 'counter', 'Files processed, by status.',
+               [('', {'status': s}, c) for s, c in sorted(self.statuses.items())])
+        metric('pipeline_files_total', 'counter', 'Files processed, by pipeline and status.',
+               [('', {'pipeline': p, 'status': s}, c)
+                for p, counts in sorted(self.pipelines.items())
+                for s, c in sorted(counts.items())])
+        metric('input_bytes_total', 'counter', 'Size of the MMIF files processed.',
+               [('', {}, self.input_bytes)])
+        metric('output_bytes_total', 'counter', 'Size of the summaries written.',
+               [('', {}, self.output_bytes)])
+        metric('elapsed_seconds', 'gauge', 'Seconds since the run started.',
+               [('', {}, data['elapsed_seconds'])])
+        metric('files_per_second', 'gauge', 'Files processed per second.',
+               [('', {}, data['files_per_second'])])
+        metric('input_megabytes_per_second', 'gauge', 'MMIF megabytes read per second.',
+               [('', {}, data['input_mb_per_second'])])
+        metric('output_megabytes_per_second', 'gauge', 'Summary megabytes written per second.',
+               [('', {}, data['output_mb_per_second'])])
+        metric('compression_ratio', 'gauge', 'Summary size divided by MMIF size.',
+               [('', {}, data['compression_ratio'])])
+        metric('file_seconds', 'histogram', 'Seconds spent on each file.',
+               [('_bucket', {'le': str(bound)}, count)
+                for bound, count in histogram(latencies)]
+               + [('_bucket', {'le': '+Inf'}, len(latencies)),
+                  ('_sum', {}, sum(latencies)),
+                  ('_count', {}, len(latencies))])
+        metric('file_latency_seconds', 'summary', 'Percentiles of the seconds spent on each file.',
+               [('', {'quantile': str(q)}, percentile(latencies, q)) for q in QUANTILES]
+               + [('_sum', {}, sum(latencies)),
+                  ('_count', {}, len(latencies))])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, force=False):
+        """Write both files, but only if INTERVAL seconds have passed since the last
+        write or if force is True."""
+        now = time.monotonic()
+        if not force and self.written is not None and now - self.written < INTERVAL:
+            return
+        self.written = now
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, self.as_prometheus())
+        write_atomic(self.json_path, json.dumps(self.as_json(), indent=2))
+
+
+def pipeline_name(apps) -> str:
+    """Return the name of the pipeline for a sequence of app URLs, which is the list
+    of app names without their versions, in order and without repetitions."""
+    names = []
+    for app in apps:
+        if not app:
+            continue
+        parts = [p for p in str(app).split('/') if p]
+        # http://apps.clams.ai/whisper-wrapper/v8 ==> whisper-wrapper
+        name = parts[-2] if len(parts) > 2 else parts[-1] if parts else str(app)
+        if name not in names:
+            names.append(name)
+    return '+'.join(names) or UNKNOWN_PIPELINE
+
+
+def histogram(values: list) -> list:
+    """Return (bound, count) pairs with for each bucket the number of sorted values
+    that are less than or equal to the bound."""
+    counts = []
+    i = 0
+    for bound in BUCKETS:
+        while i < len(values) and values[i] <= bound:
+            i += 1
+        counts.append((bound, i))
+    return counts
+
+
+def percentile(values: list, q: float):
+    """Return the q-th percentile of sorted values, using the nearest rank."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def rate(amount: float, total: float):
+    return round(amount / total, 6) if total else None
+
+
+def number(value) -> str:
+    return 'NaN' if value is None else str(value)
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_atomic(path: pathlib.Path, text: str):
+    # the textfile collector reads all *.prom files, so the temporary file should
+    # have another extension
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as fh:
+        fh.write(text)
+    os.replace(tmp_path, path)
@@ -0,0 +1,317 @@
+"""Corpus site
+
+Creates a web site for a collection of summaries, with an index over all assets,
+counts of the apps and time frame labels in the collection and, for each asset,
+the mini-site that summary2html.py creates for a single summary.
+
+USAGE:
+
+    $ summarize site [--static] SUMMARY_DIRECTORY SITE_DIRECTORY
+
+    Searches SUMMARY_DIRECTORY recursively for summaries (.json, possibly with a
+    .gz, .bz2 or .xz extension) and creates or updates the site in SITE_DIRECTORY.
+    With --static all pages share one stylesheet and have precompressed .gz copies,
+    see summary2html.py.
+
+From Python:
+
+    >>> from summarizer.site import Site
+    >>> Site('summaries/', 'site/').update()
+    {'assets': 1203, 'changed': 4, 'removed': 0, 'pages': 9, 'shards': 1}
+
+The site is regenerated incrementally. The state of the site is kept in a manifest
+in the site directory, with for each summary its size, modification time and a
+hash of its content, the counts needed for the index pages and the content hashes
+of its pages. Summaries whose size and modification time did not change are not
+opened, summaries that were touched but have the same content are not rendered,
+and pages are only written when their content changed. Pages of summaries that
+were removed are removed as well. Other JSON files are recorded in the manifest
+with their size and modification time, so they are not opened again until they
+change, and when a summary turns into such a file its pages are removed.
+
+The list of assets is split over index shards, the asset goes to a shard based on
+a hash of its path, so adding or removing an asset only changes its own shard and
+the main index page. The number of shards doubles when shards get larger than
+SHARD_SIZE assets, in which case all shards are written again.
+
+Layout of the site:
+
+    index.html            counts for apps and labels and links to the shards
+    assets-NNNN.html      index shards with links to the pages of the assets
+    assets/PATH/          pages of the asset for summary PATH, which is the path
+                          relative to SUMMARY_DIRECTORY without extensions
+    style-HASH.css        the shared stylesheet of a static site
+    site.json             the manifest
+
+"""
+
+import sys
+import json
+import shutil
+import hashlib
+import pathlib
+import argparse
+
+from summarizer import summary2html
+from summarizer.index import summary_files, is_summary
+from summarizer.summary2html import Output
+from summarizer.utils import open_file, strip_compression_suffix
+
+
+MANIFEST_NAME = 'site.json'
+ASSETS_DIRECTORY = 'assets'
+
+# Maximum average number of assets in a shard before the number of shards doubles
+SHARD_SIZE = 1000
+
+
+class Site(object):
+
+    """The corpus site for the summaries in a directory tree.
+
+    summaries  -  directory with the summaries, searched recursively
+    outdir     -  directory of the site
+    static     -  when True, create a static site with a shared stylesheet
+    manifest   -  dictionary with the state of the site, which has the number of
+                  shards, the name of the stylesheet, the content hashes of the
+                  index pages, an entry for each summary indexed on the path
+                  relative to summaries and the size and modification time of
+                  the rejected JSON files that are not summaries
+
+    """
+
+    def __init__(self, summaries, outdir, static=False):
+        self.summaries = pathlib.Path(summaries)
+        self.outdir = pathlib.Path(outdir)
+        self.static = static
+        self.manifest = self._load_manifest()
+        self.stylesheet = None
+
+    def __str__(self):
+        return f'<Site {self.summaries} ==> {self.outdir}>'
+
+    @property
+    def manifest_path(self) -> pathlib.Path:
+        return self.outdir / MANIFEST_NAME
+
+    def _load_manifest(self) -> dict:
+        if self.manifest_path.exists():
+            return json.loads(self.manifest_path.read_text())
+        return {'shards': 1, 'stylesheet': None, 'pages': {}, 'assets': {},
+                'rejected': {}}
+
+    def update(self) -> dict:
+        """Bring the site up to date with the summaries and return counts of the
+        assets in the site, the assets that were rendered, the assets that were
+        removed, the index pages that were written and the number of shards."""
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        assets = self.manifest['assets']
+        rejected = self.manifest.setdefault('rejected', {})
+        if self.static:
+            self.stylesheet = summary2html.write_stylesheet(self.outdir)
+        # all pages change when switching to or from static or when the style changes
+        force = self.manifest.get('stylesheet') != self.stylesheet
+        self.manifest['stylesheet'] = self.stylesheet
+        found = set()
+        changed = []
+        for path in sorted(summary_files(self.summaries)):
+            relative_path = path.relative_to(self.summaries).as_posix()
+            found.add(relative_path)
+            if self._update_asset(path, relative_path, force):
+                changed.append(relative_path)
+        removed = [relative_path for relative_path in assets
+                   if relative_path not in found or relative_path in rejected]
+        for relative_path in removed:
+            shutil.rmtree(self.asset_directory(relative_path), ignore_errors=True)
+            del assets[relative_path]
+        for relative_path in [p for p in rejected if p not in found]:
+            del rejected[relative_path]
+        shards = self.manifest['shards']
+        while len(assets) > shards * SHARD_SIZE:
+            shards *= 2
+        self.manifest['shards'] = shards
+        pages = self._write_index_pages()
+        self._write_manifest()
+        return {'assets': len(assets), 'changed': len(changed),
+                'removed': len(removed), 'pages': pages, 'shards': shards}
+
+    def _update_asset(self, path: pathlib.Path, relative_path: str, force=False) -> bool:
+        """Render the pages of a summary if it changed since the last update, or
+        always if force is True, and return True if the pages were rendered. Files
+        that are not summaries are added to the rejected files."""
+        stat = path.stat()
+        rejected = self.manifest['rejected']
+        if rejected.get(relative_path) == {'size': stat.st_size, 'mtime': stat.st_mtime_ns}:
+            return False
+        entry = self.manifest['assets'].get(relative_path)
+        if (not force and entry is not None and entry['size'] == stat.st_size
+                and entry['mtime'] == stat.st_mtime_ns):
+            return False
+        with open_file(path, 'rb') as fh:
+            data = fh.read()
+        digest = hashlib.sha1(data).hexdigest()
+        if not force and entry is not None and entry['hash'] == digest:
+            entry['size'] = stat.st_size
+            entry['mtime'] = stat.st_mtime_ns
+            return False
+        try:
+            summary = json.loads(data)
+        except ValueError:
+            summary = None
+        if not is_summary(summary):
+            # some other JSON file, for example batch metrics
+            rejected[relative_path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+            return False
+        rejected.pop(relative_path, None)
+        hashes = {} if entry is None else entry['pages']
+        directory = self.asset_directory(relative_path)
+        stylesheet = None
+        if self.stylesheet is not None:
+            depth = len(directory.relative_to(self.outdir).parts)
+            stylesheet = '../' * depth + self.stylesheet
+        summary2html.write_html(summary, relative_path, directory, hashes,
+                                stylesheet=stylesheet)
+        self.manifest['assets'][relative_path] = {
+            'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest,
+            'apps': summary_apps(summary), 'labels': summary_labels(summary),
+            'pages': hashes }
+        return True
+
+    def asset_directory(self, relative_path: str) -> pathlib.Path:
+        return self.outdir / ASSETS_DIRECTORY / asset_path(relative_path)
+
+    def _write_index_pages(self) -> int:
+        """Write the main index and the shards whose content changed, remove shards
+        that are no longer used and return the number of pages written."""
+        shards = self.manifest['shards']
+        hashes = self.manifest['pages']
+        before = dict(hashes)
+        members = [[] for _ in range(shards)]
+        for relative_path in sorted(self.manifest['assets']):
+            members[shard_number(relative_path, shards)].append(relative_path)
+        output = Output(self.outdir, hashes, self.stylesheet)
+        self._write_index(members, output)
+        for number, shard_members in enumerate(members):
+            if shard_members:
+                self._write_shard(number, shard_members, output)
+        names = set([summary2html.index_page]
+                    + [shard_page(n) for n, m in enumerate(members) if m])
+        for name in list(hashes):
+            if name not in names:
+                (self.outdir / name).unlink(missing_ok=True)
+                summary2html.gzip_path(self.outdir / name).unlink(missing_ok=True)
+                del hashes[name]
+            elif self.stylesheet is None:
+                summary2html.gzip_path(self.outdir / name).unlink(missing_ok=True)
+        return sum(1 for name in hashes if before.get(name) != hashes[name])
+
+    def _write_index(self, members: list, output: Output):
+        assets = self.manifest['assets']
+        apps = {}
+        labels = {}
+        for entry in assets.values():
+            for app in entry['apps']:
+                apps[app] = apps.get(app, 0) + 1
+            for label, count in entry['labels'].items():
+                assets_count, frames_count = labels.get(label, (0, 0))
+                labels[label] = (assets_count + 1, frames_count + count)
+        with output.page(self.summaries.name, summary2html.index_page, 'Collection') as page:
+            page.write(f'<p>{len(assets)} assets</p>\n\n')
+            page.write('<table class=transcript>\n')
+            page.write_tr(('assets', ''))
+            for number, shard_members in enumerate(members):
+                if shard_members:
+                    first = asset_path(shard_members[0])
+                    last = asset_path(shard_members[-1])
+                    link = f'<a href="{shard_page(number)}">{first} ... {last}</a>'
+                    page.write_tr(((len(shard_members), summary2html.a_right), link))
+            page.write('</table>\n\n')
+            page.write('<h4>Apps</h4>\n\n<table class=transcript>\n')
+            page.write_tr(('assets', 'app'))
+            for app in sorted(apps):
+                page.write_tr(((apps[app], summary2html.a_right), app))
+            page.write('</table>\n\n')
+            page.write('<h4>Time frame labels</h4>\n\n<table class=transcript>\n')
+            page.write_tr(('assets', 'time frames', 'label'))
+            for label in sorted(labels):
+                assets_count, frames_count = labels[label]
+                page.write_tr(((assets_count, summary2html.a_right),
+                               (frames_count, summary2html.a_right), label))
+            page.write('</table>\n')
+
+    def _write_shard(self, number: int, shard_members: list, output: Output):
+        with output.page(self.summaries.name, shard_page(number), 'Assets') as page:
+            page.write(f'<p><a href="{summary2html.index_page}">Collection</a></p>\n\n')
+            page.write('<table class=transcript>\n')
+            page.write_tr(('asset', 'apps', 'labels'))
+            for relative_path in shard_members:
+                entry = self.manifest['assets'][relative_path]
+                link = (f'<a href="{ASSETS_DIRECTORY}/{asset_path(relative_path)}/'
+                        f'{summary2html.index_page}">{asset_path(relative_path)}</a>')
+                labels = ', '.join(f'{label} ({count})'
+                                   for label, count in sorted(entry['labels'].items()))
+                page.write_tr(((link, summary2html.a_top), '<br/>'.join(entry['apps']), labels))
+            page.write('</table>\n')
+
+    def _write_manifest(self):
+        # written last and renamed, so an interrupted update is redone next time
+        tmp_path = self.manifest_path.with_name(MANIFEST_NAME + '.tmp')
+        tmp_path.write_text(json.dumps(self.manifest))
+        tmp_path.replace(self.manifest_path)
+
+
+def summary_apps(summary: dict) -> list:
+    """Return the apps of the views of the summary, in order and without repetitions."""
+    apps = []
+    for view in summary.get('views', []):
+        if view.get('app') and view['app'] not in apps:
+            apps.append(view['app'])
+    return apps
+
+
+def summary_labels(summary: dict) -> dict:
+    """Return the number of time frames for each label in the summary."""
+    labels = {}
+    for frames in summary.get('timeframes', {}).values():
+        for tf in frames:
+            label = tf.get('label')
+            if label is not None:
+                labels[label] = labels.get(label, 0) + 1
+    return labels
+
+
+def asset_path(relative_path: str) -> str:
+    """Return the path of the summary without the .json and compression extensions."""
+    return strip_compression_suffix(relative_path)[:-5]
+
+
+def shard_number(relative_path: str, shards: int) -> int:
+    digest = hashlib.sha1(relative_path.encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % shards
+
+
+def shard_page(number: int) -> str:
+    return f'assets-{number:04d}.html'
+
+
+def argparser():
+    parser = argparse.ArgumentParser(
+        prog='summarize site',
+        description='Create or update a web site for a collection of summaries')
+    parser.add_argument('summaries', help='directory with summaries')
+    parser.add_argument('site', help='directory of the site')
+    parser.add_argument('--static', action='store_true', help='shared stylesheet and precompressed pages')
+    return parser
+
+
+def main(arguments: list = None):
+    args = argparser().parse_args(arguments)
+    counts = Site(args.summaries, args.site, args.static).update()
+    print(f'{counts["assets"]} assets, rendered {counts["changed"]}, removed'
+          f' {counts["removed"]}, wrote {counts["pages"]} index pages'
+          f' in {counts["shards"]} shards')
+
+
+if __name__ == '__main__':
+
+    main(sys.argv[1:])
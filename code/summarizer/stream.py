@@ -0,0 +1,77 @@
+"""Stream mode
+
+Summarizes a stream of MMIF documents in one process, so start-up costs are only
+paid once. Input is either newline-delimited MMIF documents or NUL-separated file
+paths, output has one line with a JSON envelope for each input record:
+
+    {"id": 1, "status": "ok", "error": null, "summary": {...}}
+    {"id": 2, "status": "error", "error": "KeyError: 'word'", "summary": null}
+
+"""
+
+import sys
+import json
+import contextlib
+
+from mmif import Mmif
+
+from summarizer import stats
+from summarizer.config import RunConfig
+from summarizer.summary import Summary
+
+
+def summarize_stream(instream, outstream, paths=False, stats_only=False,
+                     run_config: RunConfig = None, **report_options):
+    """Summarize all records from instream and write the envelopes to outstream.
+    With paths=True the records are NUL-separated paths and instream should be
+    opened in binary mode, otherwise the records are lines with MMIF documents.
+    With stats_only=True only the statistics are created (see stats.py), otherwise
+    the report options are handed to Summary.as_json(). Without a run_config the
+    default settings are used, in lean mode and with token tables."""
+    run_config = run_config or RunConfig(lean=True, asr_tables=True)
+    records = read_paths(instream) if paths else read_documents(instream)
+    for identifier, record in records:
+        envelope = {'id': identifier, 'status': 'ok', 'error': None, 'summary': None}
+        try:
+            # the summarizer prints warnings, which should not end up in the output
+            with contextlib.redirect_stdout(sys.stderr):
+                if stats_only and paths:
+                    envelope['summary'] = stats.stats_from_path(record)
+                elif stats_only:
+                    envelope['summary'] = stats.stats(json.loads(record))
+                else:
+                    if paths:
+                        mmif_summary = Summary.from_path(record, run_config)
+                    else:
+                        mmif_summary = Summary(Mmif(json.loads(record)), run_config)
+                    envelope['summary'] = mmif_summary.as_json(**report_options)
+        except Exception as e:
+            envelope['status'] = 'error'
+            envelope['error'] = f'{type(e).__name__}: {e}'
+        outstream.write(json.dumps(envelope, separators=(',', ':')) + '\n')
+        outstream.flush()
+
+
+def read_documents(instream):
+    """Yield pairs of line number and line for all non-empty lines."""
+    for n, line in enumerate(instream, 1):
+        if line.strip():
+            yield n, line
+
+
+def read_paths(instream, chunk_size=65536):
+    """Yield pairs of path and path for all paths in a NUL-separated stream."""
+    buffer = b''
+    while True:
+        chunk = instream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        *paths, buffer = buffer.split(b'\0')
+        for path in paths:
+            if path:
+                path = path.decode('utf8')
+                yield path, path
+    if buffer.strip():
+        path = buffer.decode('utf8').strip()
+        yield path, path
@@ -43,19 +43,142 @@ OPTIONS:
 -i INFILE -o OUTFILE
 
 Run the summarizer over a single MMIF file and write the JSON summary to OUTFILE.
+INFILE can also be a graph snapshot created with the --snapshot option.
+
+INFILE may be compressed with gzip, bzip2 or xz (.mmif.gz, .mmif.bz2 or .mmif.xz)
+and is then decompressed while it is read. If OUTFILE ends in .gz, .bz2 or .xz the
+summary is compressed accordingly.
+
+--snapshot FILE
+
+Save a snapshot of the graph created from INFILE. Loading a snapshot is much faster
+than parsing the MMIF file and building the graph, which helps when running the
+summarizer, visualize.py and cut.py on the same MMIF file. The -o option can be
+left out if you only want the snapshot.
+
+--html DIRECTORY
+
+Create the HTML mini-site for the summary in DIRECTORY, the same site that
+run_html.py creates from a summary file. The pages are created straight from the
+summary in memory, so no summary file is needed, but if -o is also given the JSON
+summary is written as well and both are created from the same sections. In -d mode
+each MMIF file gets its own site in a tree under DIRECTORY that mirrors the input
+tree, named after the MMIF file.
+
+--static
+
+With --html, write the site for serving with a static web server. Pages link to one
+stylesheet with a hash of its content in its name instead of having the style in
+each page, the HTML has no indentation and each file has a precompressed .gz copy.
+In -d mode all sites share the stylesheet at the top of DIRECTORY.
 
 -d DIRECTORY
 
 Run the summarizer over all MMIF files in the directory, input files are assumed to 
 have the .mmif extension and output files will be written in the same directory with
-the .json extension.
+the .json extension. Compressed input files (.mmif.gz, .mmif.bz2 and .mmif.xz) are
+also processed.
+
+-r, --recursive
+
+In -d mode, also process the MMIF files in all subdirectories, for example for the
+nested pipeline/version/hash/*.mmif layout of the MMIF storage.
+
+--outdir DIRECTORY
+
+In -d mode, write the summaries to DIRECTORY instead of next to the MMIF files. The
+directory structure of the input is mirrored in the output directory.
+
+--journal FILE
+
+In -d mode, append the path of each completed file to FILE. If the run is stopped
+and started again all files in the journal are skipped. Defaults to a file named
+summarize.journal in the output directory if --outdir is used, otherwise there is
+no journal unless this option is given.
+
+--timeout SECONDS
+--memory MB
+
+In -d mode, summarize each file in a separate worker process that is stopped when
+it takes more than SECONDS or uses more than MB megabytes of address space. Files
+that fail are written to the failures report and the run continues with a new
+worker.
+
+--failures FILE
+
+In -d mode, the failures report, one JSON object per line with the file, the kind
+of failure, the stage the summarizer was in and the error. Defaults to a file named
+summarize.failures in the output directory if --outdir is used. Files in the report
+are skipped when a run is resumed.
+
+--metrics FILE
+
+In -d mode, write metrics for the run to FILE in the Prometheus text format and as
+JSON to FILE with the .json extension, for example metrics.prom and metrics.json.
+The metrics have files per second, input and output megabytes per second, latency
+percentiles and a histogram, the size of the summaries relative to the MMIF files
+and file counts by status and by pipeline of apps. They are updated at most every
+15 seconds during the run and once more at the end, so a node-exporter textfile
+collector can pick them up while the run is going.
+
+--compress gz|bz2|xz
+
+In -d mode, compress the summaries and add the extension to the file name, for
+example creating .json.gz files.
+
+--diagnostics
+
+Adds a diagnostics section with the problems found while building the graph, for
+example annotations without anchors. Each element has the message, the number of
+times it occurred and a few samples, typically annotation identifiers. The same
+information is always printed as warnings, one line per message.
+
+--stats-only
+
+Only create the MMIF version, the documents and the views with their annotation
+counts. This reads the JSON once and only counts the annotation types, no graph
+is created, so it is much faster than creating a full summary. The input is not
+validated. Other options that add sections are ignored. Works with -i, -d and
+--stream.
 
 -- timeframes
 
 Shows basic information of all timeframes.
 
-This does not group the timeframes according to apps. There used to be settings to
-just get chyrons or segments or bars-and-tone frames, but those have been retired.
+The timeframes are grouped according to the app that created them. There used to
+be settings to just get chyrons or segments or bars-and-tone frames, those have been
+replaced by the filters below.
+
+--ocr
+
+Adds an ocr section with text recognized by apps like DocTR. The text is grouped
+on the time point it was recognized in, each element has the time point, the time
+frames that have the time point as a representative, and the text documents for the
+time point with their paragraphs, sentences and tokens and the coordinates of
+those. Only text documents from views with bounding boxes are included, so captions
+and other text aligned to time points are left out.
+
+--timeline
+
+Adds a timeline section, a list with all transcript elements, timeframes, captions
+and entities ordered on start time. Each element has the start time, the end time
+and the type (transcript, timeframe, caption or entity), the other properties depend
+on the type. The timeline is written to the output file while it is created.
+
+--granularity MILLISECONDS
+
+Instances of the same entity that start within this many milliseconds of the
+previous instance are put in the same group. The default is 1000.
+
+--min-score SCORE
+--labels LABEL[,LABEL...]
+--min-duration MILLISECONDS
+
+Only include timeframes whose label has at least the given score, whose label is
+one of the given labels, or which last at least the given time. This applies to
+the timeframes section as well as to the timeline. Timeframes without
+a score are left out when --min-score is used. Filtering is done on a columnar
+table of the timeframes, which uses NumPy if it is installed.
 
 --transcript
 
@@ -65,32 +188,69 @@ The transcript is taken from the last non-warning ASR view, so only the last add
 transcript will be summarized. It is assumed that Tokens in the view are ordered on
 text occurrence.
 
+--all-transcripts
+
+Adds a transcripts section with a transcript for each non-warning ASR view, for
+example when the MMIF file has both Kaldi and Whisper output. Each element has the
+view identifier, the app and the transcript.
+
 --captions
 
 Shows captions from the Llava captioner app.
 
 
+--stream
+
+Read MMIF documents from the standard input, one per line, and write a summary for
+each of them to the standard output, also one per line. Each output line is a JSON
+object with an id (the line number), a status ("ok" or "error"), an error message
+and the summary. Errors on one document do not stop processing of later documents.
+Anything the summarizer would normally print goes to the standard error.
+
+--stream -0
+
+As above, but the standard input has file paths separated by NUL characters, as
+produced by "find -print0". The id in the output is the path.
+
+
+INDEXING:
+
+    $ summarize index DATABASE --add DIRECTORY
+    $ summarize index DATABASE --entity TEXT
+
+Loads the entities, timeframes, captions and transcript of summaries into a SQLite
+database and queries it. See summarizer/index.py for details.
+
+    $ summarize site SUMMARY_DIRECTORY SITE_DIRECTORY
+
+Creates or updates a web site for all summaries in a directory tree, with an index
+over all assets, app and label counts and the pages of each asset. Updates only
+render the summaries that changed. See summarizer/site.py for details.
+
+
 TODO:
 
 - For the time unit we should really update get_start(), get_end() and other methods.
 - Add parameters and appConfiguration to the views. Maybe use an option for this.
 - Keep all the view metadata (including parameters and appConfiguration), or add an
   option to do that.
-- Print warnings in the summary.
 
 """
 
-import sys, io, json, argparse, pathlib
-from collections import defaultdict
+import sys, io, json, heapq, argparse, pathlib, textwrap
+from operator import itemgetter
 
 from mmif.serialize import Mmif
 from mmif.vocabulary import DocumentTypes
 
-from summarizer.utils import CharacterList
+from summarizer.utils import CharacterList, open_file
 from summarizer.utils import get_aligned_tokens
 from summarizer.utils import get_transcript_view, get_last_segmenter_view, get_captions_view
+from summarizer.utils import get_transcript_views
 from summarizer.graph import Graph
-from summarizer import config
+from summarizer.hooks import Hooks, STAGE_SECTIONS
+from summarizer.tables import TimeFrameTable
+from summarizer import config, summary2html
 
 
 VERSION = '0.2.0'
@@ -109,30 +269,131 @@ class Summary(object):
 
     """Implements the summary of a MMIF file.
 
-    mmif            -  instance of mmif.serialize.Mmif
+    mmif            -  instance of mmif.serialize.Mmif, None if the summary was
+                       created from a graph snapshot or in lean mode
     graph           -  instance of graph.Graph
     documents       -  instance of Documents
     views           -  instance of Views
-    transcript      -  instance of Transcript
+    transcript      -  instance of Transcript, for the last ASR view
+    transcripts     -  list of Transcript instances for all ASR views, this is
+                       only filled in by all_transcripts()
     timeframes      -  instance of TimeFrames
     entities        -  instance of Entities
     captions        -  instance of Captions
+    ocr             -  instance of Ocr
+    run_config      -  instance of config.RunConfig with the settings
+    warnings        -  list of warnings
+
+    Progress of creating the graph and the sections is reported to hooks, an instance
+    of hooks.Hooks, which can also stop the work by raising hooks.CancelledException.
+
+    When views are added to the graph with Graph.add_view(), refresh() brings the
+    summary up to date, which only redoes the parts that the new views affect.
+
+    Summaries are thread safe in the sense that creating a summary does not change
+    the Mmif object, the RunConfig or any global state, everything that is derived
+    lives in the summary and its graph. Many summaries can be created at the same
+    time in a thread pool, including summaries with different settings and summaries
+    that share a graph. See also summarize(), which is the simplest way to do this.
 
     """
 
-    def __init__(self, mmif):
-        self.mmif = mmif if type(mmif) is Mmif else Mmif(mmif)
+    def __init__(self, mmif, run_config: config.RunConfig = None, hooks: Hooks = None):
+        """The mmif argument is a MMIF string, an instance of Mmif or an instance
+        of Graph, the latter typically loaded with Graph.load(). With the lean
+        setting in run_config the summary does not hold on to the Mmif object and
+        the graph is created in lean mode, which lets the mmif-python object model
+        be garbage collected as soon as the graph is built. This is what you want
+        for long-lived summaries."""
         self.warnings = []
-        self.graph = Graph(self.mmif)
-        self.documents = Documents(self)
-        self.views = Views(self)
-        self.timeframes = TimeFrames(self)
-        self.transcript = Transcript(self)
-        self.captions = Captions(self)
-        self.entities = Entities(self)
+        self.run_config = run_config or config.RunConfig()
+        hooks = hooks or Hooks()
+        if isinstance(mmif, Graph):
+            self.graph = mmif
+            self.mmif = mmif.mmif
+        else:
+            mmif = mmif if type(mmif) is Mmif else Mmif(mmif)
+            self.graph = Graph(mmif, self.run_config, hooks)
+            self.mmif = None if self.run_config.lean else mmif
+            # the local name would keep the Mmif alive while creating the sections
+            del mmif
+        self.transcripts = None
+        sections = (('documents', Documents), ('views', Views),
+                    ('timeframes', TimeFrames), ('transcript', Transcript),
+                    ('captions', Captions), ('ocr', Ocr), ('entities', Entities))
+        with hooks.stage(STAGE_SECTIONS, len(sections), interval=1) as progress:
+            for name, section_class in sections:
+                setattr(self, name, section_class(self))
+                progress.step()
+        # one warning for each kind of problem found while building the graph
+        self.graph_warnings = self.graph.diagnostics.warnings()
+        self.warnings.extend(self.graph_warnings)
+        # number of graph updates that are included in the summary
+        self.updates = len(self.graph.updates)
         self.validate()
         self.print_warnings()
 
+    def refresh(self):
+        """Update the summary for the views that were added to the graph with
+        Graph.add_view() since the summary was created or last refreshed. The views
+        section gets the new views, time frames and OCR are updated with just the
+        new nodes and edges, and only the entity texts of new entities and of
+        entities that new edges may anchor differently are regrouped. The transcript
+        and captions are created again if there is a new view for them."""
+        updates = self.graph.updates[self.updates:]
+        self.updates = len(self.graph.updates)
+        if not updates:
+            return
+        views = [view for view, _, _ in updates]
+        nodes = [node for _, view_nodes, _ in updates for node in view_nodes]
+        edges = [edge for _, _, view_edges in updates for edge in view_edges]
+        shortnames = set(name for view in views for name in view.annotation_types)
+        self.views.update(views)
+        if config.TIME_FRAME in shortnames:
+            self.timeframes.update(nodes)
+        if get_transcript_views(views):
+            self.transcript = Transcript(self)
+            self.transcripts = None
+        if get_captions_view(views) is not None:
+            self.captions = Captions(self)
+        self.ocr.update(nodes, edges)
+        self.entities.update(nodes, edges)
+        # diagnostics are for the whole graph, so replace the earlier ones
+        self.warnings = [w for w in self.warnings if w not in self.graph_warnings]
+        self.graph_warnings = self.graph.diagnostics.warnings()
+        self.warnings.extend(self.graph_warnings)
+
+    @classmethod
+    def from_path(cls, path, run_config: config.RunConfig = None, hooks: Hooks = None):
+        """Create a summary from the file at path, which is either a MMIF file or a
+        graph snapshot. Use this instead of reading the file and handing the text to
+        Summary() because it does not keep the text around while summarizing. MMIF
+        files compressed with gzip, bzip2 or xz are decompressed while reading."""
+        if Graph.is_snapshot(path):
+            return cls(Graph.load(path), run_config, hooks)
+        with open_file(path, 'rb') as fh:
+            return cls.from_stream(fh, run_config, hooks)
+
+    @classmethod
+    def from_stream(cls, stream, run_config: config.RunConfig = None, hooks: Hooks = None):
+        """Create a summary from a file object with MMIF, opened in binary or text
+        mode. The JSON is parsed straight from the stream and only the dictionary is
+        handed to Mmif, which also saves the second parse that Mmif does when it
+        validates a string. The raw buffer can be garbage collected as soon as the
+        JSON is parsed."""
+        return cls(Mmif(json.load(stream)), run_config, hooks)
+
+    def all_transcripts(self) -> list:
+        """Return a list with a Transcript for each ASR view. Building a transcript
+        only needs the Tokens and Sentences of its own view, which are taken from
+        the graph's index. The result is cached and the transcript of the last ASR
+        view is reused."""
+        if self.transcripts is None:
+            self.transcripts = [
+                self.transcript if view is self.transcript.view else Transcript(self, view)
+                for view in get_transcript_views(self.graph.views.values())]
+        return self.transcripts
+
     def add_warning(self, warning: str):
         self.warnings.append(warning)
 
@@ -143,28 +404,86 @@ class Summary(object):
             raise SummaryException("More than one video document in MMIF file")
 
     def video_documents(self):
-        return self.mmif.get_documents_by_type(DocumentTypes.VideoDocument)
+        return self.graph.get_nodes(config.VIDEO_DOCUMENT)
 
     def report(self, outfile=None, full=False, timeframes=False,
-               transcript=False, captions=False, entities=False):
+               transcript=False, captions=False, entities=False,
+               all_transcripts=False, diagnostics=False, min_score=None,
+               labels=None, min_duration=None, timeline=False, ocr=False):
+        """Return the summary as a JSON string or write it to outfile. The timeline
+        is written event by event while it is generated."""
+        json_obj = self.as_json(
+            full=full, timeframes=timeframes, transcript=transcript,
+            captions=captions, entities=entities, all_transcripts=all_transcripts,
+            diagnostics=diagnostics, min_score=min_score, labels=labels,
+            min_duration=min_duration, ocr=ocr)
+        events = None
+        if timeline:
+            events = Timeline(self, min_score=min_score, labels=labels,
+                              min_duration=min_duration)
+        if outfile is None:
+            fh = io.StringIO()
+            write_report(fh, json_obj, events)
+            return fh.getvalue()
+        else:
+            with open_file(outfile, 'w') as fh:
+                write_report(fh, json_obj, events)
+
+    def to_html(self, directory, outfile=None, name=None, timeline=False,
+                static=False, stylesheet=None, **report_options):
+        """Create the HTML mini-site for the summary in directory and, if outfile is
+        given, also write the JSON summary to it. The sections are computed once and
+        both outputs are created from the same dictionary, so there is no JSON round
+        trip. The name is used for the page headers and defaults to outfile. With
+        static or a stylesheet URL the site is written for a static web server, see
+        summary2html.write_html(). The other options are the same as for report()."""
+        json_obj = self.as_json(**report_options)
+        events = None
+        if timeline:
+            events = list(Timeline(self, min_score=report_options.get('min_score'),
+                                   labels=report_options.get('labels'),
+                                   min_duration=report_options.get('min_duration')))
+        if outfile is not None:
+            with open_file(outfile, 'w') as fh:
+                write_report(fh, json_obj, events)
+        if events is not None:
+            json_obj['timeline'] = events
+        name = name or outfile or 'summary.json'
+        summary2html.write_html(json_obj, str(name), directory, static=static,
+                                stylesheet=stylesheet)
+
+    def as_json(self, full=False, timeframes=False, transcript=False,
+                captions=False, entities=False, all_transcripts=False,
+                diagnostics=False, min_score=None, labels=None, min_duration=None,
+                timeline=False, ocr=False):
+        """Return the summary as a dictionary, the options determine what sections
+        are added to the always present version, documents and views. The min_score,
+        labels and min_duration options filter the time frames."""
         json_obj = {
-            'mmif_version': self.mmif.metadata.mmif,
+            'mmif_version': self.graph.mmif_version,
             'documents': self.documents.data,
             'views': self.views.data}
         if transcript or full:
             json_obj['transcript'] = self.transcript.data
+        if all_transcripts:
+            json_obj['transcripts'] = [
+                { 'view': t.view.id, 'app': t.view.app, 'transcript': t.data }
+                for t in self.all_transcripts()]
         if captions or full:
             json_obj['captions'] = self.captions.as_json()
         if timeframes or full:
-            json_obj['timeframes'] = self.timeframes.as_json()
+            json_obj['timeframes'] = self.timeframes.as_json(
+                min_score=min_score, labels=labels, min_duration=min_duration)
         if entities or full:
             json_obj['entities'] = self.entities.as_json()
-        report = json.dumps(json_obj, indent=2)
-        if outfile is None:
-            return report
-        else:
-            with open(outfile, 'w') as fh:
-                fh.write(report)
+        if ocr:
+            json_obj['ocr'] = self.ocr.as_json()
+        if diagnostics:
+            json_obj['diagnostics'] = self.graph.diagnostics.as_json()
+        if timeline:
+            json_obj['timeline'] = list(Timeline(
+                self, min_score=min_score, labels=labels, min_duration=min_duration))
+        return json_obj
 
     def print_warnings(self):
         for warning in self.warnings:
@@ -192,9 +511,9 @@ class Documents(object):
 
     @staticmethod
     def summary(doc):
-        return { 'id': doc.id,
+        return { 'id': doc.identifier,
                  'type': doc.at_type.shortname,
-                 'location': doc.location }
+                 'location': doc.properties.get('location') }
 
     def pp(self):
         print('\nDocuments -> ')
@@ -208,18 +527,19 @@ class Views(object):
     the id, app and timestamp properties."""
 
     def __init__(self, summary):
-        self.data = [self.summary(view) for view in summary.mmif.views]
+        self.data = [self.summary(view) for view in summary.graph.views.values()]
+
+    def update(self, views: list):
+        """Add the summaries of views that were added to the graph."""
+        self.data.extend(self.summary(view) for view in views)
 
     @staticmethod
     def summary(view):
-        annotation_types = defaultdict(int)
-        for annotation in view.annotations:
-            annotation_types[annotation.at_type.shortname] += 1
         return { 'id': view.id,
-                 'app': view.metadata.app,
-                 'timestamp': view.metadata.timestamp,
-                 'annotations': len(view.annotations),
-                 'annotation_types': dict(annotation_types) }
+                 'app': view.app,
+                 'timestamp': view.timestamp,
+                 'annotations': view.annotation_count(),
+                 'annotation_types': dict(view.annotation_types) }
 
     def pp(self):
         print('\nViews -> ')
@@ -229,18 +549,25 @@ class Views(object):
 
 class Transcript(object):
 
-    """The transcript contains the string value from the first text document in the
-    last ASR view. It issues a warning if there is more than one text document in
-    the view."""
+    """The transcript contains the string value from the first text document in an
+    ASR view, by default the last ASR view. It issues a warning if there is more
+    than one text document in the view. When the graph has a token table for the
+    view, the transcript is created from the table and not from token nodes."""
 
-    def __init__(self, summary):
+    def __init__(self, summary, view=None):
         self.summary = summary
         self.data = []
-        view = get_transcript_view(summary.mmif.views)
+        if view is None:
+            view = get_transcript_view(summary.graph.views.values())
+        self.view = view
         if view is not None:
-            documents = view.get_documents()
+            documents = summary.graph.get_nodes(config.TEXT_DOCUMENT, view_id=view.id)
             if len(documents) > 1:
                 summary.add_warning(f'More than one TextDocument in ASR view {view.id}')
+            table = summary.graph.token_tables.get(view.id)
+            if table is not None:
+                self._init_from_table(table)
+                return
             t_nodes = summary.graph.get_nodes(config.TOKEN, view_id=view.id)
             s_nodes = summary.graph.get_nodes(config.SENTENCE, view_id=view.id)
             if not t_nodes:
@@ -251,7 +578,8 @@ class Transcript(object):
                 sentence_ids = [n.identifier for n in s_nodes]
             else:
                 # But Kaldi does not
-                sentences = self.create_sentences(t_nodes)
+                sentences = self.create_sentences(
+                    t_nodes, summary.run_config.sentence_size)
                 sentence_ids = [None] * len(sentences)
             # initialize the transcripts with all blanks, most blanks will be
             # overwrite with characters from the tokens
@@ -260,6 +588,20 @@ class Transcript(object):
                 transcript_element = TranscriptElement(s_id, s, transcript)
                 self.data.append(transcript_element.as_json())
 
+    def _init_from_table(self, table):
+        if table.sentences:
+            sentences = table.sentence_rows()
+            sentence_ids = [table.sentences[table.sentence[rows[0]]] for rows in sentences]
+        else:
+            size = self.summary.run_config.sentence_size
+            sentences = [range(i, min(i + size, len(table)))
+                         for i in range(0, len(table), size)]
+            sentence_ids = [None] * len(sentences)
+        transcript = CharacterList(table.end[sentences[-1][-1]] if sentences else 0)
+        for s_id, rows in zip(sentence_ids, sentences):
+            transcript_element = TranscriptElement.from_rows(s_id, table, rows, transcript)
+            self.data.append(transcript_element.as_json())
+
     def __str__(self):
         return str(self.data)
 
@@ -281,11 +623,9 @@ class Transcript(object):
             targets.append(node_targets)
         return targets
 
-    def create_sentences(self, t_nodes, sentence_size=12):
+    def create_sentences(self, t_nodes, sentence_size=config.SENTENCE_SIZE):
         """If there is no sentence structure then we create it just by chopping th
         input into slices of some pre-determined length."""
-        # TODO: perhaps the size paramater should be set in the config file or via a
-        # command line option.
         return [t_nodes[i:i + sentence_size]
                 for i in range(0, len(t_nodes), sentence_size)]
 
@@ -311,6 +651,22 @@ class TranscriptElement:
         self.end_offset = sentence[-1].properties['end']
         self.text = transcript.getvalue(self.start_offset, self.end_offset)
 
+    @classmethod
+    def from_rows(cls, identifier: str, table, rows, transcript: CharacterList):
+        """Create an element from rows of a tables.TokenTable instead of from a list
+        of Token nodes."""
+        element = cls.__new__(cls)
+        for i in rows:
+            transcript.set_chars(table.words[i], table.start[i], table.end[i])
+        first, last = rows[0], rows[-1]
+        element.id = identifier
+        element.start = table.time_start[first]
+        element.end = table.time_end[last]
+        element.start_offset = table.start[first]
+        element.end_offset = table.end[last]
+        element.text = transcript.getvalue(element.start_offset, element.end_offset)
+        return element
+
     def __str__(self):
         text = self.text if len(self.text) <= 50 else self.text[:50] + '...'
         return f'<TranscriptElement {self.id} {self.start} {self.end}  "{text}">'
@@ -360,7 +716,7 @@ class Nodes(object):
         def prop_check(p, v, props_given):
             return v == props_given.get(p) if p in props_given else False
         return [n for n in self
-                if all([prop_check(p, v, n.annotation.properties)
+                if all([prop_check(p, v, n.properties)
                         for p, v in props.items()])]
 
 
@@ -374,29 +730,31 @@ class TimeFrames(Nodes):
 
     def __init__(self, summary):
         super().__init__(summary)
-        for timeframe in self.graph.get_nodes(config.TIME_FRAME):
-            if timeframe.has_label():
-                self.add(timeframe)
-
-    def as_json(self):
-        timeframes = defaultdict(list)
-        for tf in self.nodes:
-            label = tf.frame_type()
-            try:
-                start, end = tf.anchors['time-offsets']
-            except KeyError:
-                # TODO: this defies the notion of using the anchors for this,
-                # but maybe in this case we should go straight to the start/end
-                start = tf.properties['start']
-                end = tf.properties['end']
-            representatives = tf.representatives()
-            rep_tps = [rep.properties['timePoint'] for rep in representatives]
-            score = tf.properties.get('classification', {}).get(label)
-            app = tf.view.metadata.app
-            timeframes[app].append(
-                { 'identifier': tf.identifier, 'label': label, 'score': score,
-                  'start-time': start, 'end-time': end, 'representatives': rep_tps })
-        return timeframes
+        self._table = None
+        self.update(self.graph.get_nodes(config.TIME_FRAME))
+
+    def update(self, nodes: list):
+        """Add the time frames with a frame type from the nodes."""
+        for node in nodes:
+            if node.at_type.shortname == config.TIME_FRAME and node.has_label():
+                self.add(node)
+        self._table = None
+
+    @property
+    def table(self) -> TimeFrameTable:
+        """The time frames as a columnar table, created when first needed."""
+        if self._table is None:
+            self._table = TimeFrameTable(self.nodes)
+        return self._table
+
+    def as_json(self, min_score=None, labels=None, min_duration=None):
+        """Return the time frames indexed on app, optionally only those with at
+        least the minimum score, one of the labels and at least the minimum
+        duration."""
+        mask = None
+        if min_score is not None or labels is not None or min_duration is not None:
+            mask = self.table.mask(min_score, labels, min_duration)
+        return self.table.as_json(mask)
 
     def pp(self):
         print('\nTimeframes -> ')
@@ -420,11 +778,56 @@ class Entities(Nodes):
         super().__init__(summary)
         self.nodes_idx = {}
         self.bins = None
+        # entities for each text in the order of the graph, before sorting
+        self._text_nodes = {}
         for ent in self.graph.get_nodes(config.NAMED_ENTITY):
             self.add(ent)
         self._create_node_index()
         self._group()
 
+    def update(self, nodes: list, edges: list):
+        """Add the new entities among the nodes and regroup the texts of the new
+        entities and of the entities whose anchor may have changed because one of the
+        edges, given as (source, target) pairs, added a target to a node that they
+        link to. Other texts keep their order and groups."""
+        new_ids = set(node.identifier for node in nodes)
+        changed = set(source.identifier for source, _ in edges
+                      if source.identifier not in new_ids)
+        texts = []
+        for entity in self._linked_entities(changed):
+            texts.append(entity.properties['text'])
+        for node in nodes:
+            if node.at_type.shortname == config.NAMED_ENTITY:
+                self.add(node)
+                self._text_nodes.setdefault(node.properties['text'], []).append(node)
+                texts.append(node.properties['text'])
+        for text in dict.fromkeys(texts):
+            self._sort_text(text)
+            self.bins.regroup(text, self.nodes_idx[text])
+
+    def _linked_entities(self, changed: set) -> list:
+        """Return the entities that reach one of the changed nodes by following
+        targets. Only the nodes above the targets of entities are visited."""
+        if not changed:
+            return []
+        reaches = {}
+        def reaches_changed(node, visiting=()):
+            if node.identifier not in reaches:
+                reaches[node.identifier] = node.identifier in changed or any(
+                    reaches_changed(t, visiting + (node.identifier,))
+                    for t in node.targets if t.identifier not in visiting)
+            return reaches[node.identifier]
+        entities = []
+        for target_id, target_entities in self.graph.entity_idx.items():
+            target = self.graph.get_node(target_id)
+            if target is not None and reaches_changed(target):
+                entities.extend(target_entities)
+        for node_id in changed:
+            node = self.graph.get_node(node_id)
+            if node is not None and node.at_type.shortname == config.NAMED_ENTITY:
+                entities.append(node)
+        return entities
+
     def __str__(self):
         return f'<Entities with {len(self.nodes_idx)} nodes and {len(self.bins)} bins>'
 
@@ -433,10 +836,13 @@ class Entities(Nodes):
         the nodes into the dictionary indexed on text string and then sorts the
         list of nodes for each string on video position."""
         for ent in self:
-            self.nodes_idx.setdefault(ent.properties['text'], []).append(ent)
-        for text, entities in self.nodes_idx.items():
-            self.nodes_idx[text] = sorted(entities,
-                                          key=(lambda e: e.start_in_video()))
+            self._text_nodes.setdefault(ent.properties['text'], []).append(ent)
+        for text in self._text_nodes:
+            self._sort_text(text)
+
+    def _sort_text(self, text: str):
+        self.nodes_idx[text] = sorted(self._text_nodes[text],
+                                      key=(lambda e: e.start_in_video()))
 
     def _group(self):
         """Groups all the nodes on the text and sorts them on position in the video,
@@ -470,7 +876,7 @@ class Entities(Nodes):
             entity = {"text": text, "instances": []}
             json_obj.append(entity)
             for e in self.nodes_idx[text]:
-                entity["instances"].append(e.summary()) # e.summary(), E_PROPS)
+                entity["instances"].append(e.summary(self.bins.group(e)))
         return json_obj
 
     def pp(self):
@@ -478,7 +884,8 @@ class Entities(Nodes):
         for e in self.nodes_idx:
             print('    %s' % e)
             for d in self.nodes_idx[e]:
-                props = ["%s=%s" % (p, v) for p, v in d.summary().items()]
+                summary = d.summary(self.bins.group(d))
+                props = ["%s=%s" % (p, v) for p, v in summary.items()]
                 print('        %s' % ' '.join(props))
 
     def print_groups(self):
@@ -493,7 +900,7 @@ class Captions(Nodes):
     def __init__(self, summary):
         super().__init__(summary)
         self.captions = []
-        view = get_captions_view(summary.mmif.views)
+        view = get_captions_view(summary.graph.views.values())
         if view is not None:
             for doc in self.graph.get_nodes(config.TEXT_DOCUMENT, view_id=view.id):
                 text = doc.properties['text']['@value'].split('[/INST]')[-1]
@@ -511,11 +918,367 @@ class Captions(Nodes):
         #return [(ident, p1, p2, text) for ident, p1, p2, text in self.captions]
 
 
+class Ocr(object):
+
+    """Text recognized by OCR apps like DocTR, grouped on the time point that the
+    text was taken from and on the time frames that time point represents. Each
+    element has the time point, the time frames and the TextDocuments for that
+    time point, the documents have their paragraphs, the paragraphs have their
+    sentences and the sentences have their tokens, all with the coordinates of
+    their bounding boxes.
+
+    Only TextDocuments from views with BoundingBoxes are included, which leaves out
+    text from other apps that is aligned to time points, like captions. The time
+    point of a TextDocument is found through its alignment to a TimePoint or, if
+    there is none, through the alignments of its paragraphs or sentences to
+    BoundingBoxes that are aligned to TimePoints. Documents without a time point
+    are not included.
+
+    All indexes are created in one pass over the nodes and their edges, which avoids
+    the path search that entities use for anchoring:
+
+    document_points  -  TextDocument identifier ==> TimePoint node
+    box_points       -  BoundingBox identifier ==> TimePoint node
+    element_boxes    -  Paragraph, Sentence or Token identifier ==> BoundingBox node
+    point_frames     -  TimePoint identifier ==> list of TimeFrame nodes that have
+                        the time point as a representative
+    elements         -  TextDocument identifier ==> list of Paragraph nodes, or of
+                        Sentence nodes if the document has no paragraphs
+
+    """
+
+    def __init__(self, summary):
+        self.summary = summary
+        self.graph = summary.graph
+        self.document_points = {}
+        self.box_points = {}
+        self.element_boxes = {}
+        self.point_frames = {}
+        self.elements = {}
+        self.data = []
+        self._paragraphs = {}
+        self._sentences = {}
+        # TextDocument nodes and their position in the graph
+        self._documents = {}
+        self._document_order = {}
+        self._element_documents = {}
+        self._box_elements = {}
+        # TimePoint identifier ==> { TextDocument identifier ==> document json }
+        self._groups = {}
+        self._group_data = {}
+        self._group_keys = {}
+        self._document_groups = {}
+        documents = self._add_documents(self.graph.get_nodes(config.TEXT_DOCUMENT))
+        documents.update(self._create_indexes(self.graph.nodes.values()))
+        self._group(documents, set())
+
+    def __len__(self):
+        return len(self.data)
+
+    def update(self, nodes: list, edges: list):
+        """Add new nodes and the new edges, given as (source, target) pairs, to the
+        indexes and group again the documents and time points that they touch."""
+        documents = self._add_documents(
+            n for n in nodes if n.at_type.shortname == config.TEXT_DOCUMENT)
+        documents.update(self._create_indexes(nodes, edges))
+        points = set(rep_id for n in nodes if n.at_type.shortname == config.TIME_FRAME
+                     for rep_id in n.properties.get('representatives', []))
+        self._group(documents, points)
+
+    def _add_documents(self, documents) -> set:
+        identifiers = set()
+        for doc in documents:
+            if not self.is_ocr_document(doc):
+                continue
+            self._documents[doc.identifier] = doc
+            self._document_order.setdefault(doc.identifier, len(self._document_order))
+            identifiers.add(doc.identifier)
+        return identifiers
+
+    @staticmethod
+    def is_ocr_document(doc) -> bool:
+        return doc.view is not None and config.BOUNDING_BOX in doc.view.annotation_types
+
+    def _create_indexes(self, nodes, edges: list = None) -> set:
+        """Add the nodes to the indexes, with the edges or, if there are no edges,
+        with the edges from the nodes to their targets. Returns the identifiers of
+        the documents that may have a different time point or different elements."""
+        documents = set()
+        boxes = set()
+        for node in nodes:
+            node_type = node.at_type.shortname
+            if node_type == config.TIME_FRAME:
+                for rep_id in node.properties.get('representatives', []):
+                    self.point_frames.setdefault(rep_id, []).append(node)
+            elif node_type in (config.PARAGRAPH, config.SENTENCE):
+                elements = self._paragraphs if node_type == config.PARAGRAPH else self._sentences
+                # the document may be given in the view metadata, which the node has
+                if node.document is not None:
+                    doc_id = node.document.identifier
+                else:
+                    doc_id = node.properties.get('document')
+                elements.setdefault(doc_id, []).append(node)
+                self._element_documents[node.identifier] = doc_id
+                documents.add(doc_id)
+            if edges is None:
+                for target in node.targets:
+                    self._add_edges(node, target, documents, boxes)
+        for source, target in edges or []:
+            self._add_edges(source, target, documents, boxes)
+        for doc_id in documents:
+            if doc_id in self._paragraphs or doc_id in self._sentences:
+                self.elements[doc_id] = self._paragraphs.get(doc_id) or self._sentences.get(doc_id)
+        for box_id in boxes:
+            documents.update(self._element_documents.get(e.identifier)
+                             for e in self._box_elements.get(box_id, []))
+        return documents
+
+    def _add_edges(self, source, target, documents: set, boxes: set):
+        # edges go both ways, so look at both ends of each alignment
+        self._add_edge(source, target, documents, boxes)
+        self._add_edge(target, source, documents, boxes)
+
+    def _add_edge(self, source, target, documents: set, boxes: set):
+        source_type = source.at_type.shortname
+        target_type = target.at_type.shortname
+        if target_type == config.TIME_POINT:
+            if source_type == config.TEXT_DOCUMENT:
+                self.document_points[source.identifier] = target
+                documents.add(source.identifier)
+            elif source_type == config.BOUNDING_BOX:
+                self.box_points[source.identifier] = target
+                boxes.add(source.identifier)
+        elif target_type == config.BOUNDING_BOX:
+            if source_type in (config.PARAGRAPH, config.SENTENCE, config.TOKEN):
+                self.element_boxes[source.identifier] = target
+                self._box_elements.setdefault(target.identifier, []).append(source)
+                boxes.add(target.identifier)
+
+    def _group(self, documents: set, points: set):
+        """Move the documents to the group of their time point and create the groups
+        of the time points that changed again, points are the time points that got
+        new time frames."""
+        points = set(points)
+        for doc_id in documents:
+            old_point = self._document_groups.pop(doc_id, None)
+            if old_point is not None:
+                del self._groups[old_point][doc_id]
+                points.add(old_point)
+            doc = self._documents.get(doc_id)
+            point = None if doc is None else self.time_point(doc)
+            if point is None:
+                continue
+            self._document_groups[doc_id] = point.identifier
+            self._groups.setdefault(point.identifier, {})[doc_id] = self.document_as_json(doc)
+            points.add(point.identifier)
+        order = self._document_order
+        for point_id in points:
+            docs = self._groups.get(point_id)
+            if not docs:
+                for index in (self._groups, self._group_data, self._group_keys):
+                    index.pop(point_id, None)
+                continue
+            time_point = self.graph.get_node(point_id).properties.get('timePoint')
+            doc_ids = sorted(docs, key=order.get)
+            self._group_data[point_id] = {
+                'time-point': time_point,
+                'timeframes': [self.timeframe_as_json(tf)
+                               for tf in self.point_frames.get(point_id, [])],
+                'documents': [docs[d] for d in doc_ids] }
+            # groups with the same time point are in the order of their first document
+            self._group_keys[point_id] = (time_point is None, time_point or 0, order[doc_ids[0]])
+        self.data = [self._group_data[p]
+                     for p in sorted(self._group_data, key=self._group_keys.get)]
+
+    def time_point(self, doc):
+        """Return the TimePoint node for a TextDocument or None if there is none."""
+        point = self.document_points.get(doc.identifier)
+        if point is None:
+            for element in self.elements.get(doc.identifier, []):
+                box = self.element_boxes.get(element.identifier)
+                if box is not None and box.identifier in self.box_points:
+                    return self.box_points[box.identifier]
+        return point
+
+    def document_as_json(self, doc) -> dict:
+        text = doc.properties.get('text', {}).get('@value', '')
+        elements = self.elements.get(doc.identifier, [])
+        return { 'identifier': doc.identifier,
+                 'text': text,
+                 'paragraphs': [self.element_as_json(e, text) for e in elements
+                                if e.at_type.shortname == config.PARAGRAPH],
+                 'sentences': [self.element_as_json(e, text) for e in elements
+                               if e.at_type.shortname == config.SENTENCE] }
+
+    def element_as_json(self, element, doc_text: str) -> dict:
+        box = self.element_boxes.get(element.identifier)
+        json_obj = {
+            'identifier': element.identifier,
+            'coordinates': None if box is None else box.properties.get('coordinates'),
+            'text': self.element_text(element, doc_text) }
+        for element_type, child_type, key in (
+                (config.PARAGRAPH, config.SENTENCE, 'sentences'),
+                (config.SENTENCE, config.TOKEN, 'tokens')):
+            if element.at_type.shortname == element_type:
+                json_obj[key] = [self.element_as_json(child, doc_text)
+                                 for child in self.children(element)
+                                 if child.at_type.shortname == child_type]
+        return json_obj
+
+    def element_text(self, element, doc_text: str) -> str:
+        """Return the text of a paragraph, sentence or token, taken from the document
+        if there are offsets and else from the elements that it targets."""
+        props = element.properties
+        if 'start' in props and 'end' in props:
+            return doc_text[props['start']:props['end']]
+        if 'word' in props:
+            return props['word']
+        return ' '.join(self.element_text(child, doc_text)
+                        for child in self.children(element))
+
+    def children(self, element) -> list:
+        children = (self.graph.get_node(t) for t in element.properties.get('targets', []))
+        return [child for child in children if child is not None]
+
+    @staticmethod
+    def timeframe_as_json(tf) -> dict:
+        try:
+            start, end = tf.anchors['time-offsets']
+        except KeyError:
+            start, end = tf.start(), tf.end()
+        return { 'identifier': tf.identifier,
+                 'label': tf.frame_type(),
+                 'start-time': start,
+                 'end-time': end }
+
+    def as_json(self):
+        return self.data
+
+
+def summarize(path, run_config: config.RunConfig = None, hooks: Hooks = None,
+              **report_options) -> dict:
+    """Summarize the MMIF file or graph snapshot at path and return the summary as a
+    dictionary, the report options are handed to Summary.as_json(). This is safe to
+    call from many threads at the same time, for example:
+
+    >>> with ThreadPoolExecutor() as executor:
+    ...     summaries = list(executor.map(summarize, paths))
+
+    """
+    return Summary.from_path(path, run_config, hooks).as_json(**report_options)
+
+
+class Timeline(object):
+
+    """The transcript, time frames, captions and entities as one sequence of events
+    ordered on start time. Each section is turned into one or more iterators that
+    are sorted on start time and those are merged lazily with a heap-based k-way
+    merge, so events can be written while the merge is running. The time frame
+    filters are the same as for TimeFrames.as_json(). Events without a start time
+    are left out.
+
+    Each event has a start-time, an end-time and a type, which is one of transcript,
+    timeframe, caption or entity, other keys depend on the type."""
+
+    def __init__(self, summary, min_score=None, labels=None, min_duration=None):
+        self.summary = summary
+        self.min_score = min_score
+        self.labels = labels
+        self.min_duration = min_duration
+
+    def __iter__(self):
+        return heapq.merge(*self.sources(), key=itemgetter('start-time'))
+
+    def sources(self) -> list:
+        """Return a list of iterators over events, each sorted on start time."""
+        sources = [self.transcript_events(), self.caption_events()]
+        timeframes = self.summary.timeframes.as_json(
+            min_score=self.min_score, labels=self.labels,
+            min_duration=self.min_duration)
+        for app, frames in timeframes.items():
+            sources.append(self.timeframe_events(app, frames))
+        # the entities for each text are already sorted on position in the video
+        for text, entities in self.summary.entities.nodes_idx.items():
+            sources.append(self.entity_events(text, entities))
+        return sources
+
+    def transcript_events(self):
+        # transcript elements follow the order of the tokens, which is time order
+        for element in self.summary.transcript.data:
+            if element['start-time'] is None:
+                continue
+            yield { 'start-time': element['start-time'],
+                    'end-time': element['end-time'],
+                    'type': 'transcript',
+                    'text': element['text'] }
+
+    def caption_events(self):
+        captions = [caption for caption in self.summary.captions.captions
+                    if caption['time-point'] is not None]
+        for caption in sorted(captions, key=itemgetter('time-point')):
+            yield { 'start-time': caption['time-point'],
+                    'end-time': caption['time-point'],
+                    'type': 'caption',
+                    'text': caption['text'] }
+
+    @staticmethod
+    def timeframe_events(app, frames):
+        frames = [tf for tf in frames if tf['start-time'] is not None]
+        for tf in sorted(frames, key=itemgetter('start-time')):
+            yield { 'start-time': tf['start-time'],
+                    'end-time': tf['end-time'],
+                    'type': 'timeframe',
+                    'label': tf['label'],
+                    'score': tf['score'],
+                    'app': app }
+
+    @staticmethod
+    def entity_events(text, entities):
+        for entity in entities:
+            start = entity.start_in_video()
+            if start is None:
+                continue
+            yield { 'start-time': start,
+                    'end-time': entity.end_in_video(),
+                    'type': 'entity',
+                    'text': text,
+                    'category': entity.properties.get('category') }
+
+
+def write_report(fh, json_obj: dict, timeline=None):
+    """Write the summary as indented JSON to a file object. The timeline is an
+    iterable of events, it is written one event at a time after all other sections
+    and the result is the same as when the events were part of json_obj."""
+    report = json.dumps(json_obj, indent=2)
+    if timeline is None:
+        fh.write(report)
+        return
+    # drop the closing brace and add the timeline as the last element
+    fh.write(report[:-2])
+    fh.write(',\n  "timeline": [')
+    separator = '\n'
+    for event in timeline:
+        fh.write(separator)
+        fh.write(textwrap.indent(json.dumps(event, indent=2), '    '))
+        separator = ',\n'
+    fh.write('\n  ]\n}' if separator == ',\n' else ']\n}')
+
+
 class Bins(object):
 
+    """Groups the instances of each entity text into bins of instances that are
+    close to each other in the video, as governed by the granularity setting.
+
+    bins    -  lists of instances of Bin, indexed on entity text
+    groups  -  the index of the bin of each entity, indexed on entity identifier,
+               this is filled in by mark_entities()
+
+    """
+
     def __init__(self, summary):
         self.summary = summary
         self.bins = {}
+        self.groups = {}
         self.current_bin = None
         self.current_text = None
 
@@ -539,7 +1302,7 @@ class Bins(object):
             p1 = self.current_bin[-1].start_in_video()
             p2 = entity.start_in_video()
             # p3 = entity.end_in_video()
-            if p2 - p1 < config.GRANULARITY:
+            if p2 - p1 < self.summary.run_config.granularity:
                 # TODO: should add p3 here
                 self.current_bin.add(entity)
             else:
@@ -547,14 +1310,31 @@ class Bins(object):
                 self.bins[self.current_text].append(self.current_bin)
 
     def mark_entities(self):
-        """Marks all entities with the bin that they occur in. This is done to export
-        the grouping done with the bins to the entities and this way the bins never need
-        to be touched again."""
-        # TODO: maybe use the bins when we create the output
-        for entity_bins in self.bins.values():
-            for i, e_bin in enumerate(entity_bins):
-                for entity in e_bin:
-                    entity.properties['group'] = i
+        """Marks all entities with the bin that they occur in. The marks are kept in
+        the groups dictionary and not on the entity nodes, so that the graph is not
+        changed and can be shared by summaries with different granularities."""
+        for text in self.bins:
+            self.mark_text(text)
+
+    def mark_text(self, text: str):
+        for i, e_bin in enumerate(self.bins[text]):
+            for entity in e_bin:
+                self.groups[entity.identifier] = i
+
+    def regroup(self, text: str, entities: list):
+        """Create the bins for one text again from its entities, which are sorted on
+        position in the video."""
+        for e_bin in self.bins.get(text, []):
+            for entity in e_bin:
+                self.groups.pop(entity.identifier, None)
+        self.current_bin = None
+        for entity in entities:
+            self.add_entity(text, entity)
+        self.mark_text(text)
+
+    def group(self, entity) -> int:
+        """Return the index of the bin of the entity within the bins for its text."""
+        return self.groups.get(entity.identifier)
 
     def print_bins(self):
         for text in self.bins:
@@ -587,38 +1367,9 @@ class Bin(object):
             print(' ', i, node)
 
 
-def parse_arguments():
-    parser = argparse.ArgumentParser(description='Create a JSON Summary for a MMIF file')
-    parser.add_argument('-d', metavar='DIRECTORY', help='directory with input files')
-    parser.add_argument('-i', metavar='MMIF_FILE', help='input MMIF file')
-    parser.add_argument('-o', metavar='JSON_FILE', help='output summary file')
-    parser.add_argument('--full', action='store_true', help='print full report, overrule other options')
-    parser.add_argument('--views', action='store_true', help='include view metadata')
-    parser.add_argument('--transcript', action='store_true', help='include transcript')
-    parser.add_argument('--captions', action='store_true', help='include Llava captions')
-    parser.add_argument('--timeframes', action='store_true', help='include all time frames')
-    parser.add_argument('--entities', action='store_true', help='include entities from transcript')
-    return parser.parse_args()
-
-
 if __name__ == '__main__':
 
-    args = parse_arguments()
-    if args.d:
-        for mmif_file in pathlib.Path(args.d).iterdir():
-            if mmif_file.is_file() and mmif_file.name.endswith('.mmif'):
-                print(mmif_file)
-                json_file = str(mmif_file)[:-4] + 'json'
-                mmif_summary = Summary(mmif_file.read_text())
-                mmif_summary.report(
-                    outfile=json_file, full=args.full,
-                    timeframes=args.timeframes, transcript=args.transcript,
-                    captions=args.captions, entities=args.entities)
-    elif args.i and args.o:
-        with open(args.i) as fh:
-            mmif_text = fh.read()
-            mmif_summary = Summary(mmif_text)
-            mmif_summary.report(
-                outfile=args.o, full=args.full,
-                timeframes=args.timeframes, transcript=args.transcript,
-                captions=args.captions, entities=args.entities)
+    # the command line interface lives in the package, this is just so that
+    # running this module directly still works
+    from summarizer import create_summary
+    create_summary()
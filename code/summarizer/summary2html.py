@@ -1,13 +1,32 @@
 """
 
-python create_html.py SUMMARY DIRECTORY
+python create_html.py [--static] SUMMARY DIRECTORY
+
+The SUMMARY file may be compressed with gzip, bzip2 or xz.
+
+With --static the pages are written for serving with a static web server. They
+link to a shared stylesheet whose name has a hash of its content, so it can be
+cached forever, the HTML has no indentation and each file gets a precompressed .gz
+copy that the server can send as is (for example with gzip_static in nginx).
+
+The pages are created from the summary dictionary by write_html(), which can also
+be called directly with the result of Summary.as_json(), see Summary.to_html(),
+so there is no need to write and read back the JSON summary.
+
+When write_html() is given the content hashes of the pages from an earlier run,
+pages are only written when their content changed, see site.py.
 
 """
 
-import io
+import os
+import re
 import sys
+import gzip
 import json
 import pathlib
+import hashlib
+
+from concurrent.futures import ThreadPoolExecutor
 
 from summarizer import utils
 
@@ -18,6 +37,7 @@ views_page = 'views.html'
 timeframes_page = 'timeframes.html'
 transcript_page = 'transcripts.html'
 captions_page = 'captions.html'
+timeline_page = 'timeline.html'
 
 
 # Some XML tag attributes
@@ -26,11 +46,8 @@ a_topleft = 'align=right valign=top'
 a_top = 'valign=top'
 
 
-# style sheet
-style = '''
-<style>
-
-body {
+# style sheet, inlined in each page or written to a shared file
+stylesheet = '''body {
     margin: 15px;
 }
 
@@ -93,37 +110,104 @@ td {
     border: 0px;
     padding: 4px;
 }
-
-</style>
 '''
 
+style = f'\n<style>\n\n{stylesheet}\n</style>\n'
 
+# whitespace between tags, which is removed from static pages
+whitespace_between_tags = re.compile(r'>\s+<')
 
-def main():
-    infile, outdir = sys.argv[1:3]
-    create_html(infile, outdir)
+# size of the write buffer of a page
+BUFFER_SIZE = 1 << 16
 
 
-def create_html(infile: str, outdir: str):
+
+def main():
+    arguments = sys.argv[1:]
+    static = '--static' in arguments
+    infile, outdir = [arg for arg in arguments if arg != '--static'][:2]
+    create_html(infile, outdir, static)
+
+
+def create_html(infile: str, outdir: str, static=False):
+    """Create the mini-site in outdir from the summary file infile."""
+    with utils.open_file(infile) as fh:
+        summary = json.load(fh)
+    write_html(summary, infile, outdir, static=static)
+
+
+def write_html(summary: dict, infile: str, outdir: str, hashes: dict = None,
+               static=False, stylesheet: str = None):
+    """Create the mini-site in outdir from a summary dictionary, infile is the name
+    of the summary or MMIF file, which is used for the page headers. Without hashes
+    all HTML files in outdir are removed first. With hashes, a dictionary with the
+    content hash of each page indexed on page name, only pages that changed are
+    written, pages the summary no longer has are removed and hashes is updated.
+
+    With static, or when the URL of a shared stylesheet created by write_stylesheet()
+    is given, the pages are written for a static web server, see the module
+    documentation. Without the URL the stylesheet is written to outdir."""
     outpath = pathlib.Path(outdir)
-    outpath.mkdir(exist_ok=True)
+    outpath.mkdir(parents=True, exist_ok=True)
+    if static and stylesheet is None:
+        stylesheet = write_stylesheet(outpath)
+    static = stylesheet is not None
+    pages = page_names(summary)
     for f in outpath.glob("*"):
-        if f.is_file() and f.name.endswith('.html'):
-            f.unlink()
-    summary = json.loads(pathlib.Path(infile).open().read())
-    page = Html(infile, outpath / index_page)
-    page.write(f'<a href="{views_page}">Views</a>\n')
-    create_html_views(infile, outpath, summary)
-    if 'timeframes' in summary:
-        add_index_link(page, summary, 'timeframes', timeframes_page)
-        create_html_timeframes(infile, outpath, summary)        
-    if 'transcript' in summary:
-        add_index_link(page, summary, 'transcript', transcript_page)
-        create_html_transcript(infile, outpath, summary)
-    if 'captions' in summary:
-        add_index_link(page, summary, 'captions', captions_page)
-        create_html_captions(infile, outpath, summary)
-    page.write_to_file()
+        name = f.name[:-3] if f.name.endswith('.html.gz') else f.name
+        if f.is_file() and name.endswith('.html'):
+            # also remove .gz copies left by an earlier static site
+            if hashes is None or name not in pages or (name != f.name and not static):
+                f.unlink()
+    if hashes is not None:
+        for name in list(hashes):
+            if name not in pages:
+                del hashes[name]
+    output = Output(outpath, hashes, stylesheet)
+    # the pages do not depend on each other, so they are created concurrently
+    renderers = [create_html_views]
+    for section, renderer in (('timeframes', create_html_timeframes),
+                              ('transcript', create_html_transcript),
+                              ('captions', create_html_captions),
+                              ('timeline', create_html_timeline)):
+        if section in summary:
+            renderers.append(renderer)
+    with ThreadPoolExecutor(max_workers=len(renderers)) as executor:
+        futures = [executor.submit(renderer, infile, output, summary)
+                   for renderer in renderers]
+        with output.page(infile, index_page) as page:
+            page.write(f'<a href="{views_page}">Views</a>\n')
+            for section, section_page in (('timeframes', timeframes_page),
+                                          ('transcript', transcript_page),
+                                          ('captions', captions_page),
+                                          ('timeline', timeline_page)):
+                if section in summary:
+                    add_index_link(page, summary, section, section_page)
+        for future in futures:
+            future.result()
+
+
+def write_stylesheet(outdir) -> str:
+    """Write the stylesheet and its .gz copy to outdir, unless they are there, and
+    return the name of the stylesheet, which has a hash of the content."""
+    name = f'style-{content_hash(stylesheet)[:10]}.css'
+    path = pathlib.Path(outdir) / name
+    if not path.exists() or not gzip_path(path).exists():
+        pathlib.Path(outdir).mkdir(parents=True, exist_ok=True)
+        write_static_file(path, stylesheet.encode('utf-8'))
+    return name
+
+
+def page_names(summary: dict) -> set:
+    """Return the names of the pages that write_html() creates for a summary."""
+    pages = {index_page, views_page}
+    for section, section_page in (('timeframes', timeframes_page),
+                                  ('transcript', transcript_page),
+                                  ('captions', captions_page),
+                                  ('timeline', timeline_page)):
+        if section in summary:
+            pages.add(section_page)
+    return pages
 
 
 def add_index_link(page, summary, summary_part, part_page):
@@ -131,92 +215,222 @@ def add_index_link(page, summary, summary_part, part_page):
         page.write(f'<p><a href="{part_page}">{summary_part.capitalize()}</a></p>\n')
 
 
-def create_html_views(infile: str, outpath: pathlib.Path, summary: dict):
-    page = Html(infile, outpath / views_page, 'Views')
-    for view in summary['views']:
-        page.write('<div>\n<p class=view>\n<table>\n')
-        page.write_tr(
-            ('id', view['id']),
-            ('app', view['app']),
-            ('timestamp', view['timestamp']))
-        page.write('<tr>\n')
-        page.write(f'  <td valign=top>contains</td>\n')
-        page.write(f'  <td>\n')
-        page.write(f'  <table class=noborder>\n')
-        #page.write(f'  <table class=noborder border=0 cellspacing=4 cellpadding=0>\n')
-        for attype in sorted(view['annotation_types']):
-            count = view['annotation_types'][attype]
-            page.write_tr((attype, '&nbsp;', (count, a_right)), indent=2)
-        page.write_tr(('TOTAL', '&nbsp;', (view["annotations"], a_right)), indent=2)
-        page.write(f'  </table>\n')
-        page.write(f'  </td>\n')
-        page.write('</tr>\n')
-        page.write('</table>\n</p>\n</div>\n\n')
-    page.write_to_file()
-
-
-def create_html_timeframes(infile: str, outpath: pathlib.Path, summary: dict):
-    page = Html(infile, outpath / timeframes_page, 'Timeframes')
-    for app in summary['timeframes']:
-        page.write(f'<h4>{app}</h4>\n\n')
-        page.write('<table class=transcript>\n')
-        page.write_tr(('start', 'end', 'reps', 'label', 'score'))
-        for tf in summary['timeframes'][app]:
-            t1 = utils.timestamp(tf['start-time'])
-            t2 = utils.timestamp(tf['end-time'])
-            reps = [utils.timestamp(rep) for rep in tf['representatives']]
-            score = '' if tf['score'] is None else f'{tf["score"]:06.4f}'
+def create_html_views(infile: str, output, summary: dict):
+    with output.page(infile, views_page, 'Views') as page:
+        for view in summary['views']:
+            page.write('<div>\n<p class=view>\n<table>\n')
             page.write_tr(
-                (t1, t2, ' '.join(reps), tf['label'], score))
+                ('id', view['id']),
+                ('app', view['app']),
+                ('timestamp', view['timestamp']))
+            page.write('<tr>\n')
+            page.write(f'  <td valign=top>contains</td>\n')
+            page.write(f'  <td>\n')
+            page.write(f'  <table class=noborder>\n')
+            #page.write(f'  <table class=noborder border=0 cellspacing=4 cellpadding=0>\n')
+            for attype in sorted(view['annotation_types']):
+                count = view['annotation_types'][attype]
+                page.write_tr((attype, '&nbsp;', (count, a_right)), indent=2)
+            page.write_tr(('TOTAL', '&nbsp;', (view["annotations"], a_right)), indent=2)
+            page.write(f'  </table>\n')
+            page.write(f'  </td>\n')
+            page.write('</tr>\n')
+            page.write('</table>\n</p>\n</div>\n\n')
+
+
+def create_html_timeframes(infile: str, output, summary: dict):
+    with output.page(infile, timeframes_page, 'Timeframes') as page:
+        for app in summary['timeframes']:
+            page.write(f'<h4>{app}</h4>\n\n')
+            page.write('<table class=transcript>\n')
+            page.write_tr(('start', 'end', 'reps', 'label', 'score'))
+            for tf in summary['timeframes'][app]:
+                t1 = utils.timestamp(tf['start-time'])
+                t2 = utils.timestamp(tf['end-time'])
+                reps = [utils.timestamp(rep) for rep in tf['representatives']]
+                score = '' if tf['score'] is None else f'{tf["score"]:06.4f}'
+                page.write_tr(
+                    (t1, t2, ' '.join(reps), tf['label'], score))
+            page.write('</table>\n')
+
+
+def create_html_transcript(infile: str, output, summary: dict):
+    with output.page(infile, transcript_page, 'Transcript') as page:
+        page.write('<table class=transcript>\n')
+        for sentence in summary['transcript']:
+            t1 = utils.timestamp(sentence['start-time'])
+            t2 = utils.timestamp(sentence['end-time'])
+            page.write_tr(((t1, a_topleft), (t2, a_topleft), sentence['text']))
+        page.write('</table>\n')
+
+def create_html_captions(infile: str, output, summary: dict):
+    with output.page(infile, captions_page, 'Captions') as page:
+        page.write('<table class=transcript>\n')
+        for caption in summary['captions']:
+            text = caption['text'].replace('\n', '<br/>')
+            tp = utils.timestamp(caption['time-point'])
+            page.write_tr(((tp, a_topleft), (caption['identifier'], a_top), text))
+        page.write('</table>\n')
+
+
+def create_html_timeline(infile: str, output, summary: dict):
+    with output.page(infile, timeline_page, 'Timeline') as page:
+        page.write('<table class=transcript>\n')
+        page.write_tr(('start', 'end', 'type', ''))
+        for event in summary['timeline']:
+            t1 = utils.timestamp(event['start-time'])
+            t2 = '' if event['end-time'] is None else utils.timestamp(event['end-time'])
+            if event['type'] == 'timeframe':
+                score = '' if event['score'] is None else f' ({event["score"]:06.4f})'
+                text = f'{event["label"]}{score}'
+            elif event['type'] == 'entity':
+                text = f'{event["text"]} ({event["category"]})'
+            else:
+                text = event['text'].replace('\n', '<br/>')
+            page.write_tr(((t1, a_topleft), (t2, a_topleft), (event['type'], a_top), text))
         page.write('</table>\n')
-        page.write_to_file()
-
-
-def create_html_transcript(infile: str, outpath: pathlib.Path, summary: dict):
-    page = Html(infile, outpath / transcript_page, 'Transcript')
-    page.write('<table class=transcript>\n')
-    for sentence in summary['transcript']:
-        t1 = utils.timestamp(sentence['start-time'])
-        t2 = utils.timestamp(sentence['end-time'])
-        page.write_tr(((t1, a_topleft), (t2, a_topleft), sentence['text']))
-    page.write('</table>\n')
-    page.write_to_file()
-
-def create_html_captions(infile: str, outpath: pathlib.Path, summary: dict):
-    page = Html(infile, outpath / captions_page, 'Captions')
-    page.write('<table class=transcript>\n')
-    for caption in summary['captions']:
-        text = caption['text'].replace('\n', '<br/>')
-        tp = utils.timestamp(caption['time-point'])
-        page.write_tr(((tp, a_topleft), (caption['identifier'], a_top), text))
-    page.write('</table>\n')
-    page.write_to_file()
+
+
+class Output:
+
+    """Where and how the pages of a mini-site are written.
+
+    directory   -  pathlib.Path of the directory for the pages
+    hashes      -  dictionary with the content hashes of the pages indexed on page
+                   name, None if pages are always written
+    stylesheet  -  URL of the shared stylesheet for static pages, None if the style
+                   is included in each page
+
+    """
+
+    def __init__(self, directory: pathlib.Path, hashes: dict = None,
+                 stylesheet: str = None):
+        self.directory = directory
+        self.hashes = hashes
+        self.stylesheet = stylesheet
+
+    @property
+    def static(self) -> bool:
+        return self.stylesheet is not None
+
+    def page(self, infile: str, name: str, header: str = None):
+        return Html(infile, self.directory / name, header, self)
 
 
 class Html:
 
-    def __init__(self, infile: str, outpath: pathlib.Path, header: str = None):
+    """A page of the mini-site. The page is streamed to a temporary file while it
+    is created and write_to_file() moves it to outpath, so a page is never seen
+    half-written. The content hash is computed while writing, if the output has
+    content hashes and the page did not change the temporary file is dropped and
+    the existing page is kept. Static pages have no indentation and a .gz copy is
+    streamed at the same time. Use the page as a context manager to remove the
+    temporary files when creating the page fails."""
+
+    def __init__(self, infile: str, outpath: pathlib.Path, header: str = None,
+                 output: Output = None):
         self.path = outpath
-        self.stream = io.StringIO()
-        self.stream.write(f'<head>{style}</head>\n<body>\n\n')
-        self.stream.write(f'<h2>{pathlib.Path(infile).stem}</h2>\n\n')
+        self.output = output or Output(outpath.parent)
+        self.tmp_path = outpath.with_name(f'.tmp-{outpath.name}')
+        self.stream = open(self.tmp_path, 'wb', buffering=BUFFER_SIZE)
+        self.gzip_file = None
+        self.gzip_stream = None
+        if self.output.static:
+            self.gzip_file = open(gzip_path(self.tmp_path), 'wb', buffering=BUFFER_SIZE)
+            # no file name or time stamp in the header, so the same content always
+            # gives the same .gz file
+            self.gzip_stream = gzip.GzipFile(
+                filename='', mode='wb', compresslevel=9, mtime=0, fileobj=self.gzip_file)
+        self.digest = hashlib.sha1()
+        if self.output.static:
+            self.write(f'<head><link rel=stylesheet href="{self.output.stylesheet}"></head><body>')
+        else:
+            self.write(f'<head>{style}</head>\n<body>\n\n')
+        name = pathlib.Path(utils.strip_compression_suffix(infile)).stem
+        self.write(f'<h2>{name}</h2>\n\n')
         if header is not None:
-            self.stream.write(f'<h3>{header}</h3>\n\n')
+            self.write(f'<h3>{header}</h3>\n\n')
         self.views = []
         self.captions = []
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.write_to_file()
+        else:
+            self._close()
+            for path in (self.tmp_path, gzip_path(self.tmp_path)):
+                path.unlink(missing_ok=True)
+
     def write(self, text: str):
-        self.stream.write(text)
+        if self.output.static:
+            text = whitespace_between_tags.sub('><', text.strip())
+        self._write(text)
 
     def write_tr(self, *table_cells, indent=0):
+        if self.output.static:
+            indent = None
         for cells in table_cells:
-            self.stream.write(f'{" " * indent}<tr>\n')
-            for cell in cells:
-                if isinstance(cell, tuple):
-                    self.stream.write(f'{" " * indent}  <td {cell[1]}>{cell[0]}</td>\n')
-                else:
-                    self.stream.write(f'{" " * indent}  <td>{cell}</td>\n')
-            self.stream.write(f'{" " * indent}</tr>\n')
+            self._write(tr(cells, indent))
+
+    def _write(self, text: str):
+        data = text.encode('utf-8')
+        self.digest.update(data)
+        self.stream.write(data)
+        if self.gzip_stream is not None:
+            self.gzip_stream.write(data)
+
+    def _close(self):
+        self.stream.close()
+        if self.gzip_stream is not None:
+            self.gzip_stream.close()
+            self.gzip_file.close()
 
     def write_to_file(self):
-        self.path.write_text(self.stream.getvalue())
+        self._close()
+        paths = [(self.tmp_path, self.path)]
+        if self.output.static:
+            paths.append((gzip_path(self.tmp_path), gzip_path(self.path)))
+        hashes = self.output.hashes
+        if hashes is not None:
+            digest = self.digest.hexdigest()
+            exists = all(path.exists() for _, path in paths)
+            if hashes.get(self.path.name) == digest and exists:
+                for tmp_path, _ in paths:
+                    tmp_path.unlink()
+                return
+            hashes[self.path.name] = digest
+        for tmp_path, path in paths:
+            os.replace(tmp_path, path)
+
+
+def tr(cells, indent: int = 0) -> str:
+    """Return a table row, without any whitespace if indent is None."""
+    tds = []
+    for cell in cells:
+        if isinstance(cell, tuple):
+            tds.append(f'<td {cell[1]}>{cell[0]}</td>')
+        else:
+            tds.append(f'<td>{cell}</td>')
+    if indent is None:
+        return f'<tr>{"".join(tds)}</tr>'
+    spaces = ' ' * indent
+    lines = [f'{spaces}<tr>'] + [f'{spaces}  {td}' for td in tds] + [f'{spaces}</tr>']
+    return '\n'.join(lines) + '\n'
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def gzip_path(path: pathlib.Path) -> pathlib.Path:
+    return path.with_name(path.name + '.gz')
+
+
+def write_static_file(path: pathlib.Path, data: bytes):
+    """Write the data and a gzip copy with a fixed time stamp, so the same content
+    always gives the same .gz file."""
+    path.write_bytes(data)
+    gzip_path(path).write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
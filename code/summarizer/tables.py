@@ -0,0 +1,372 @@
+"""Columnar tables
+
+Stores annotations of one type as a set of columns instead of as a list of nodes,
+which makes filtering cheap. Columns are NumPy arrays when NumPy is installed and
+plain lists otherwise, the results are the same either way.
+
+The TokenTable is the exception, it is created while the graph is built and its
+values go straight into the transcript, so it uses arrays from the standard
+library, which hand out the same Python values that were put in.
+
+"""
+
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TimeFrameTable(object):
+
+    """Columnar table of time frames, one row for each TimeFrameNode.
+
+    identifiers   -  list of time frame identifiers
+    start         -  column with start times
+    end           -  column with end times
+    label         -  column with indices into labels
+    score         -  column with the score of the label, NaN if there is none
+    app           -  column with indices into apps
+    rep_offsets   -  column with offsets into rep_points, the representatives of
+                     row i are rep_points[rep_offsets[i]:rep_offsets[i+1]]
+    rep_points    -  list with the time points of all representatives
+    labels        -  list of labels
+    apps          -  list of app names
+
+    """
+
+    def __init__(self, nodes: list):
+        self.identifiers = []
+        self.labels = []
+        self.apps = []
+        self.rep_points = []
+        label_ids = {}
+        app_ids = {}
+        start, end, label, score, app, rep_offsets = [], [], [], [], [], [0]
+        for tf in nodes:
+            frame_label = tf.frame_type()
+            try:
+                p1, p2 = tf.anchors['time-offsets']
+            except KeyError:
+                # TODO: this defies the notion of using the anchors for this,
+                # but maybe in this case we should go straight to the start/end
+                p1 = tf.properties['start']
+                p2 = tf.properties['end']
+            frame_score = tf.properties.get('classification', {}).get(frame_label)
+            self.identifiers.append(tf.identifier)
+            start.append(p1)
+            end.append(p2)
+            label.append(label_ids.setdefault(frame_label, len(label_ids)))
+            score.append(math.nan if frame_score is None else frame_score)
+            app.append(app_ids.setdefault(tf.view.app, len(app_ids)))
+            self.rep_points.extend(
+                rep.properties['timePoint'] for rep in tf.representatives())
+            rep_offsets.append(len(self.rep_points))
+        self.labels = list(label_ids)
+        self.apps = list(app_ids)
+        self.start = column(start)
+        self.end = column(end)
+        self.label = column(label)
+        self.score = column(score, float)
+        self.app = column(app)
+        self.rep_offsets = column(rep_offsets)
+
+    def __str__(self):
+        return f'<TimeFrameTable {len(self)} rows>'
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    def mask(self, min_score: float = None, labels: list = None,
+             min_duration: float = None):
+        """Return a boolean column that is True for the rows that pass all filters.
+        Rows without a score do not pass the min_score filter."""
+        label_ids = None
+        if labels is not None:
+            label_ids = [i for i, label in enumerate(self.labels) if label in labels]
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+            if min_score is not None:
+                mask &= self.score >= min_score
+            if label_ids is not None:
+                mask &= np.isin(self.label, label_ids)
+            if min_duration is not None:
+                mask &= (self.end - self.start) >= min_duration
+            return mask
+        mask = [True] * len(self)
+        if min_score is not None:
+            mask = [m and s >= min_score for m, s in zip(mask, self.score)]
+        if label_ids is not None:
+            label_ids = set(label_ids)
+            mask = [m and l in label_ids for m, l in zip(mask, self.label)]
+        if min_duration is not None:
+            mask = [m and e - s >= min_duration
+                    for m, s, e in zip(mask, self.start, self.end)]
+        return mask
+
+    def rows(self, mask=None) -> list:
+        """Return the indices of the rows that are True in the mask, or of all
+        rows if there is no mask."""
+        if mask is None:
+            return list(range(len(self)))
+        if np is not None:
+            return np.flatnonzero(mask).tolist()
+        return [i for i, m in enumerate(mask) if m]
+
+    def as_json(self, mask=None) -> dict:
+        """Return the rows selected by the mask as lists of dictionaries indexed
+        on app name. Only selected rows are turned into Python objects."""
+        rows = self.rows(mask)
+        start = take(self.start, rows)
+        end = take(self.end, rows)
+        label = take(self.label, rows)
+        score = take(self.score, rows)
+        app = take(self.app, rows)
+        rep_start = take(self.rep_offsets, rows)
+        rep_end = take(self.rep_offsets, [i + 1 for i in rows])
+        timeframes = {}
+        for n, i in enumerate(rows):
+            timeframes.setdefault(self.apps[app[n]], []).append(
+                { 'identifier': self.identifiers[i],
+                  'label': self.labels[label[n]],
+                  'score': None if math.isnan(score[n]) else score[n],
+                  'start-time': start[n],
+                  'end-time': end[n],
+                  'representatives': self.rep_points[rep_start[n]:rep_end[n]] })
+        return timeframes
+
+
+def column(values: list, dtype=None):
+    """Return the values as a NumPy array if NumPy is available, otherwise return
+    the list itself."""
+    if np is None:
+        return values
+    return np.array(values, dtype=dtype)
+
+
+def take(values, rows: list) -> list:
+    """Return a list with the values of a column for the given rows, NumPy values
+    are turned into the Python values that json expects."""
+    if np is None:
+        return [values[i] for i in rows]
+    return values[rows].tolist()
+
+
+# Properties that each Token or TimeFrame in a TokenTable has its own value for,
+# all other properties must have the same value for all Tokens or TimeFrames
+TOKEN_KEYS = ('id', 'start', 'end', 'word')
+TIMEFRAME_KEYS = ('id', 'start', 'end')
+
+# TimeFrames with one of these properties are not simple word time frames
+TIMEFRAME_EXCLUDED_KEYS = ('label', 'frameType', 'targets', 'representatives')
+
+
+class TokenTable(object):
+
+    """Columnar table with the tokens of an ASR view where each Token is aligned to
+    exactly one TimeFrame, which is what Whisper and Kaldi create. There is one row
+    for each token, with the token, its time frame and the sentence it is in. This
+    replaces two nodes, an edge and a few dictionaries for each word in the graph.
+
+    view_id              -  identifier of the view
+    token_type           -  the type of the tokens, as a string
+    timeframe_type       -  the type of the time frames, as a string
+    token_constants      -  properties shared by all tokens
+    timeframe_constants  -  properties shared by all time frames
+    document             -  identifier of the document of the tokens
+    timeframe_document   -  identifier of the document of the time frames, or None
+    identifiers          -  list of token identifiers
+    start                -  column with character start offsets
+    end                  -  column with character end offsets
+    words                -  list of words
+    timeframes           -  list of time frame identifiers
+    time_start           -  column with start times
+    time_end             -  column with end times
+    sentence             -  column with indices into sentences, -1 if the token
+                            is not in a sentence
+    sentences            -  list of sentence identifiers
+
+    The documents are set by the graph, which knows about the view metadata.
+
+    """
+
+    def __init__(self, view_id: str, token_type: str, timeframe_type: str):
+        self.view_id = view_id
+        self.token_type = token_type
+        self.timeframe_type = timeframe_type
+        self.token_constants = {}
+        self.timeframe_constants = {}
+        self.document = None
+        self.timeframe_document = None
+        self.identifiers = []
+        self.start = []
+        self.end = []
+        self.words = []
+        self.timeframes = []
+        self.time_start = []
+        self.time_end = []
+        self.sentence = array('q')
+        self.sentences = []
+        self._rows = None
+
+    def __str__(self):
+        return f'<TokenTable {self.view_id} {len(self)} rows>'
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    @classmethod
+    def from_properties(cls, view_id: str, token_type: str, timeframe_type: str,
+                        tokens: list, timeframes: list, alignments: list,
+                        sentences: list):
+        """Create a table from the normalized properties of the Tokens, TimeFrames,
+        Alignments and Sentences of a view. Return None if the view does not follow
+        the pattern, that is, if not every token is aligned to its own time frame,
+        if tokens or time frames are aligned to anything else, if a token is in more
+        than one sentence or if the properties vary in unexpected ways."""
+        if not tokens or len(tokens) != len(timeframes):
+            return None
+        token_constants = constants(tokens, TOKEN_KEYS)
+        timeframe_constants = constants(timeframes, TIMEFRAME_KEYS)
+        if token_constants is None or timeframe_constants is None:
+            return None
+        if any(key in timeframe_constants for key in TIMEFRAME_EXCLUDED_KEYS):
+            return None
+        token_rows = {t['id']: i for i, t in enumerate(tokens)}
+        timeframe_rows = {tf['id']: i for i, tf in enumerate(timeframes)}
+        aligned = [None] * len(tokens)
+        used = [False] * len(timeframes)
+        for alignment in alignments:
+            source, target = alignment['source'], alignment['target']
+            if source in timeframe_rows and target in token_rows:
+                source, target = target, source
+            if source in token_rows and target in timeframe_rows:
+                i, j = token_rows[source], timeframe_rows[target]
+                if aligned[i] is not None or used[j]:
+                    return None
+                aligned[i] = j
+                used[j] = True
+            elif (source in token_rows or source in timeframe_rows
+                  or target in token_rows or target in timeframe_rows):
+                return None
+        if None in aligned:
+            return None
+        sentence = array('q', [-1]) * len(tokens)
+        for n, s in enumerate(sentences):
+            previous = -1
+            for token_id in s.get('targets', []):
+                row = token_rows.get(token_id)
+                # tokens must be in order and in at most one sentence
+                if row is None or row <= previous or sentence[row] != -1:
+                    return None
+                sentence[row] = n
+                previous = row
+        table = cls(view_id, token_type, timeframe_type)
+        table.token_constants = token_constants
+        table.timeframe_constants = timeframe_constants
+        table.identifiers = [t['id'] for t in tokens]
+        table.start = int_column([t['start'] for t in tokens])
+        table.end = int_column([t['end'] for t in tokens])
+        table.words = [t['word'] for t in tokens]
+        table.timeframes = [timeframes[j]['id'] for j in aligned]
+        table.time_start = int_column([timeframes[j]['start'] for j in aligned])
+        table.time_end = int_column([timeframes[j]['end'] for j in aligned])
+        table.sentence = sentence
+        table.sentences = [s['id'] for s in sentences]
+        return table
+
+    def find(self, identifier: str):
+        """Return a pair with a boolean that is True for tokens and False for time
+        frames and the row of the identifier, or None if the identifier is not in
+        the table. The index on identifiers is created when first needed."""
+        if self._rows is None:
+            rows = {t: (True, i) for i, t in enumerate(self.identifiers)}
+            rows.update((tf, (False, i)) for i, tf in enumerate(self.timeframes))
+            self._rows = rows
+        return self._rows.get(identifier)
+
+    def token_properties(self, row: int) -> dict:
+        properties = { 'id': self.identifiers[row],
+                       'start': self.start[row],
+                       'end': self.end[row],
+                       'word': self.words[row] }
+        properties.update(self.token_constants)
+        return properties
+
+    def timeframe_properties(self, row: int) -> dict:
+        properties = { 'id': self.timeframes[row],
+                       'start': self.time_start[row],
+                       'end': self.time_end[row] }
+        properties.update(self.timeframe_constants)
+        return properties
+
+    def sentence_rows(self) -> list:
+        """Return a list with the rows of each sentence, sentences without rows are
+        left out."""
+        rows = [[] for _ in self.sentences]
+        for row, n in enumerate(self.sentence):
+            if n >= 0:
+                rows[n].append(row)
+        return [r for r in rows if r]
+
+    def select(self, rows: list):
+        """Return a new table with only the given rows."""
+        table = TokenTable(self.view_id, self.token_type, self.timeframe_type)
+        table.token_constants = self.token_constants
+        table.timeframe_constants = self.timeframe_constants
+        table.document = self.document
+        table.timeframe_document = self.timeframe_document
+        table.identifiers = [self.identifiers[i] for i in rows]
+        table.start = int_column([self.start[i] for i in rows])
+        table.end = int_column([self.end[i] for i in rows])
+        table.words = [self.words[i] for i in rows]
+        table.timeframes = [self.timeframes[i] for i in rows]
+        table.time_start = int_column([self.time_start[i] for i in rows])
+        table.time_end = int_column([self.time_end[i] for i in rows])
+        table.sentence = array('q', [self.sentence[i] for i in rows])
+        table.sentences = self.sentences
+        return table
+
+    def as_data(self) -> dict:
+        """Return the table as a dictionary with plain Python data, for snapshots."""
+        return {name: list(value) if isinstance(value, array) else value
+                for name, value in vars(self).items() if name != '_rows'}
+
+    @classmethod
+    def from_data(cls, data: dict):
+        """Create a table from the output of as_data()."""
+        table = cls(data['view_id'], data['token_type'], data['timeframe_type'])
+        for name, value in data.items():
+            setattr(table, name, value)
+        for name in ('start', 'end', 'time_start', 'time_end'):
+            setattr(table, name, int_column(data[name]))
+        table.sentence = array('q', data['sentence'])
+        return table
+
+
+def constants(rows: list, keys: tuple):
+    """Return the properties other than the keys that all rows share, or None if a
+    row is missing one of the keys or if the other properties are not the same for
+    all rows."""
+    first = rows[0]
+    if not all(key in first for key in keys):
+        return None
+    shared = {key: value for key, value in first.items() if key not in keys}
+    size = len(keys) + len(shared)
+    for row in rows:
+        if len(row) != size or not all(key in row for key in keys):
+            return None
+        for key, value in shared.items():
+            if row.get(key) != value:
+                return None
+    return shared
+
+
+def int_column(values: list):
+    """Return the values as an array of integers if they are all integers and as
+    the list itself otherwise."""
+    if all(type(value) is int for value in values):
+        return array('q', values)
+    return values
@@ -3,6 +3,10 @@
 """
 
 import io
+import bz2
+import json
+import gzip
+import lzma
 from pathlib import Path
 from xml.sax.saxutils import quoteattr, escape
 from collections import UserList
@@ -12,6 +16,31 @@ from summarizer.config import TOKEN, ALIGNMENT, TIME_FRAME
 from summarizer.config import GRAPH_FORMATTING
 
 
+# Openers for compressed files, indexed on file extension
+
+COMPRESSED_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+
+def open_file(path, mode: str = 'r'):
+    """Open a file for reading or writing, with streaming (de)compression if the file
+    name ends in .gz, .bz2 or .xz. Files are opened in text mode with UTF-8 unless
+    the mode includes 'b'."""
+    opener = COMPRESSED_OPENERS.get(Path(path).suffix)
+    if 'b' not in mode:
+        mode = mode if 't' in mode else mode + 't'
+        if opener is None:
+            return open(path, mode, encoding='utf8')
+        return opener(path, mode, encoding='utf8')
+    return open(path, mode) if opener is None else opener(path, mode)
+
+
+def strip_compression_suffix(path) -> str:
+    """Return the file name without the compression extension, if there is one."""
+    path = str(path)
+    suffix = Path(path).suffix
+    return path[:-len(suffix)] if suffix in COMPRESSED_OPENERS else path
+
+
 def compose_id(view_id, anno_id):
     """Composes the view identifier with the annotation identifier."""
     return anno_id if ':' in anno_id else view_id + ':' + anno_id
@@ -23,32 +52,40 @@ def type_name(annotation):
 
 
 def get_transcript_view(views):
-    """Return the last Whisper or Kaldi view that is not a warnings view."""
+    """Return the last Whisper or Kaldi view that is not a warnings view. The views
+    are instances of graph.ViewInfo."""
     # TODO: this now has a simplified idea of how to find a view, should at least
     # move towards doing some regular expression matching on the WHISPER config
     # setting. The same holds for other functions to get views.
-    for view in reversed(views):
-        if view.metadata.app in KALDI + WHISPER:
-            if view.metadata.warnings:
+    for view in reversed(list(views)):
+        if view.app in KALDI + WHISPER:
+            if view.warnings:
                 continue
             return view
     return None
 
 
+def get_transcript_views(views):
+    """Return all Whisper and Kaldi views that are not warnings views, in the order
+    in which they occur."""
+    return [view for view in views
+            if view.app in KALDI + WHISPER and not view.warnings]
+
+
 def get_captions_view(views):
     """Return the last view created by the Llava captioner."""
-    for view in reversed(views):
-        if view.metadata.app in CAPTIONER:
-            if view.metadata.warnings:
+    for view in reversed(list(views)):
+        if view.app in CAPTIONER:
+            if view.warnings:
                 continue
             return view
     return None
 
 
 def get_last_segmenter_view(views):
-    for view in reversed(views):
-        # print(f'>>> {view.metadata.app}')
-        if view.metadata.app.startswith(SEGMENTER):
+    for view in reversed(list(views)):
+        # print(f'>>> {view.app}')
+        if view.app.startswith(SEGMENTER):
             return view
     return None
 
@@ -215,19 +252,19 @@ def print_path(p):
         print(p, end=' ')
 
 
-def normalize_id(doc_ids: list, view: 'View', annotation: 'Annotation'):
-    """Change identifiers to include the view identifier if it wasn't included,
-    do nothing otherwise. This applies to the Annotation id, target, source,
-    document, targets and representatives properties. Note that timePoint is
-    not included because the value is an integer and not an identifier."""
+def normalized_properties(doc_ids: set, view: 'View', annotation: 'Annotation') -> dict:
+    """Return a copy of the properties of the annotation where identifiers include
+    the view identifier if it wasn't included. This applies to the id, target,
+    source, document, targets and representatives properties. Note that timePoint
+    is not included because the value is an integer and not an identifier. The
+    annotation itself is not changed."""
     # TODO: this seems somewhat fragile
     debug = False
     attype = annotation.at_type.shortname
-    props = annotation.properties
-    if ':' not in annotation.id and view is not None:
-        if annotation.id not in doc_ids:
-            newid = f'{view.id}:{annotation.id}'
-            annotation.properties['id'] = newid
+    props = json.loads(str(annotation.properties))
+    if ':' not in props['id'] and view is not None:
+        if props['id'] not in doc_ids:
+            props['id'] = f'{view.id}:{props["id"]}'
     if 'document' in props:
         doc_id = props['document']
         if ':' not in doc_id and view is not None:
@@ -258,7 +295,8 @@ def normalize_id(doc_ids: list, view: 'View', annotation: 'Annotation'):
             if props['target'] not in doc_ids:
                 props['target'] = f'{view.id}:{props["target"]}'
     if debug:
-        print('===', annotation)
+        print('===', props)
+    return props
 
 
 def get_annotations_from_view(view, annotation_type):
@@ -298,9 +336,25 @@ def get_view_label(view):
 def get_label(view: 'mmif.View', annotation: 'mmif.Annotation'):
     at_type = annotation.at_type.shortname
     props = annotation.properties
+    text = props.text.value if at_type == 'TextDocument' else None
+    location = props.location if at_type == 'VideoDocument' else None
+    return _get_label(view, annotation.id, at_type, props, text, location)
+
+
+def get_node_label(node: 'graph.Node'):
+    """Like get_label(), but using the information copied into the node instead
+    of the annotation, which may not be available on graphs loaded from a snapshot."""
+    at_type = node.at_type.shortname
+    props = node.properties
+    text = props.get('text', {}).get('@value', '') if at_type == 'TextDocument' else None
+    location = props.get('location') if at_type == 'VideoDocument' else None
+    return _get_label(node.view, node.identifier, at_type, props, text, location)
+
+
+def _get_label(view, identifier: str, at_type: str, props, text: str, location: str):
     if at_type == 'VideoDocument':
-        identifier = annotation.id.replace('_', '')
-        location = Path(props.location).name
+        identifier = identifier.replace('_', '')
+        location = Path(location).name
         return f'{identifier} {at_type}\n{location}'
     view_id = view.id.replace('_', '')
     if at_type == 'TimeFrame':
@@ -321,12 +375,11 @@ def get_label(view: 'mmif.View', annotation: 'mmif.Annotation'):
     elif at_type == 'NamedEntity':
         return f'{view_id} NE\n{props.get("text")}'
     elif at_type == 'TextDocument':
-        text = props.text.value
         if len(text) > 100:
             text = f'{text[:100]}...'
         return f'{view_id} {at_type}\n{text}'
     elif at_type in ('NounChunk', 'Sentence'):
-        text = props.get('text')
+        text = props.get('text') or ''
         if len(text) > 15:
             text = f'{text[:15]}...'
         cat = 'NC' if at_type == 'NounChunk' else 'S'
@@ -335,8 +388,7 @@ def get_label(view: 'mmif.View', annotation: 'mmif.Annotation'):
         return f'{view_id} BB\n{str(props.get("timePoint"))}'
     elif at_type == 'SemanticTag':
         return f'{view_id} Tag\n{props.get("tagName")}'
-    print(annotation, props)
-    return f'{view_id}\n{annotation.id.replace(":", "_")}'
+    return f'{view_id}\n{identifier.replace(":", "_")}'
 
 
 def anchor(annotation: 'mmif.Annotation'):
@@ -349,9 +401,12 @@ def anchor(annotation: 'mmif.Annotation'):
         return None
     
 
-def get_shape_and_color(annotation_type: str):
+def get_shape_and_color(annotation_type: str, diagnostics: 'Diagnostics' = None):
+    """Return the shape and color for the annotation type, falling back to the
+    default for unknown types, which is noted in diagnostics if it is given."""
     node_format = GRAPH_FORMATTING.get(annotation_type)
     if node_format is None:
-        print(f'Warning: no defined shape and color for {annotation_type}, using default')
+        if diagnostics is not None:
+            diagnostics.add(f'No defined shape and color for {annotation_type}, using default')
         node_format = GRAPH_FORMATTING.get(None)
     return node_format
@@ -0,0 +1,91 @@
+"""Tests for batch mode failures, in the batch process and in a worker process.
+
+Failed files go to the failures report and never leave a temporary file behind,
+also not when the worker is killed after a timeout.
+
+"""
+
+import json
+import shutil
+import pathlib
+
+from summarizer.batch import Batch, temporary_file
+
+
+EXAMPLE = pathlib.Path(__file__).parent.parent / 'examples' / 'swt-doctr-ocr.mmif'
+
+
+def make_input(tmp_path, broken=False):
+    indir = tmp_path / 'in'
+    indir.mkdir()
+    shutil.copy(EXAMPLE, indir / 'good.mmif')
+    if broken:
+        (indir / 'broken.mmif').write_text('{"metadata": ')
+    return indir
+
+
+def read_failures(batch):
+    with open(batch.failures) as fh:
+        return [json.loads(line) for line in fh]
+
+
+def temporary_files(outdir):
+    return sorted(p.name for p in outdir.glob('.tmp-*'))
+
+
+def test_in_process(tmp_path):
+    indir = make_input(tmp_path, broken=True)
+    outdir = tmp_path / 'out'
+    batch = Batch(indir, outdir)
+    batch.run()
+    assert (outdir / 'good.json').exists()
+    assert not (outdir / 'broken.json').exists()
+    failures = read_failures(batch)
+    assert [f['file'] for f in failures] == ['broken.mmif']
+    assert failures[0]['status'] == 'error'
+    assert failures[0]['stage'] == 'read'
+    assert temporary_files(outdir) == []
+
+
+def test_worker_error(tmp_path):
+    indir = make_input(tmp_path, broken=True)
+    outdir = tmp_path / 'out'
+    batch = Batch(indir, outdir, timeout=60)
+    batch.run()
+    assert (outdir / 'good.json').exists()
+    failures = read_failures(batch)
+    assert [(f['file'], f['status']) for f in failures] == [('broken.mmif', 'error')]
+    assert temporary_files(outdir) == []
+
+
+def test_worker_timeout(tmp_path):
+    indir = make_input(tmp_path)
+    outdir = tmp_path / 'out'
+    # the temporary file of a worker that is killed is removed by the batch
+    outdir.mkdir()
+    temporary_file(outdir / 'good.json').write_text('{')
+    batch = Batch(indir, outdir, timeout=0)
+    batch.run()
+    assert not (outdir / 'good.json').exists()
+    failures = read_failures(batch)
+    assert [(f['file'], f['status']) for f in failures] == [('good.mmif', 'timeout')]
+    assert temporary_files(outdir) == []
+    # a resumed run skips the failed file
+    Batch(indir, outdir, timeout=0).run()
+    assert len(read_failures(batch)) == 1
+
+
+def test_worker_memory_limit(tmp_path):
+    indir = make_input(tmp_path)
+    outdir = tmp_path / 'out'
+    # a file that is too big to read with a limit below what the worker already uses
+    mmif_obj = json.loads(EXAMPLE.read_text())
+    mmif_obj['documents'][0]['properties']['padding'] = 'x' * 4_000_000
+    (indir / 'good.mmif').write_text(json.dumps(mmif_obj))
+    batch = Batch(indir, outdir, memory=1)
+    batch.run()
+    assert not (outdir / 'good.json').exists()
+    failures = read_failures(batch)
+    assert [f['file'] for f in failures] == ['good.mmif']
+    assert failures[0]['status'] in ('error', 'crashed')
+    assert temporary_files(outdir) == []
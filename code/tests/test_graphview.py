@@ -0,0 +1,78 @@
+"""Tests for the graph views that visualize.py draws: the time window, collapsing
+and sampling. These do not need graphviz."""
+
+import pathlib
+
+import pytest
+from mmif import Mmif
+
+from summarizer.config import RunConfig
+from summarizer.graph import Graph
+from summarizer.graphview import GraphView, time_span
+
+
+EXAMPLE = pathlib.Path(__file__).parent.parent / 'examples' / 'whisper-kaldi-doctr.mmif'
+
+WINDOW = (0, 5000)
+
+
+@pytest.fixture(scope='module', params=[False, True], ids=['nodes', 'tables'])
+def graph(request):
+    return Graph(Mmif(EXAMPLE.read_text()), RunConfig(asr_tables=request.param))
+
+
+def names(view):
+    return set(item.name for item in view.items)
+
+
+def test_whole_graph(graph):
+    view = GraphView(graph)
+    assert not view.sampled
+    assert len(view.items) == len(graph.nodes) + sum(
+        2 * len(table) for table in graph.token_tables.values())
+    assert all(source in names(view) and target in names(view)
+               for source, target in view.edges)
+
+
+def test_window(graph):
+    view = GraphView(graph, window=WINDOW)
+    assert 0 < len(view.items) < GraphView(graph).total
+    for item in view.items:
+        span = time_span(item.node)
+        assert span is None or (span[0] <= WINDOW[1] and span[1] >= WINDOW[0])
+    # top-level documents are always there
+    assert all(item.name in names(view) for item in GraphView(graph).items if item.bold)
+
+
+def test_window_does_not_depend_on_tables():
+    views = [GraphView(Graph(Mmif(EXAMPLE.read_text()), RunConfig(asr_tables=tables)),
+                       window=WINDOW) for tables in (False, True)]
+    assert names(views[0]) == names(views[1])
+    assert views[0].edges == views[1].edges
+
+
+def test_collapse(graph):
+    full = GraphView(graph)
+    view = GraphView(graph, collapse=True)
+    clusters = [item for item in view.items if item.is_cluster]
+    assert clusters and len(view.items) < len(full.items)
+    # every graph node is in exactly one item, the count of a pair item is the
+    # number of Token→TimeFrame pairs
+    pairs = [item for item in clusters if item.label.endswith('pairs')]
+    assert pairs
+    assert sum(item.count for item in view.items) + sum(p.count for p in pairs) \
+        == len(full.items)
+    assert sum(view.edges.values()) <= sum(full.edges.values())
+    assert all(not item.bold for item in clusters)
+
+
+def test_sample(graph):
+    view = GraphView(graph, max_nodes=20)
+    assert view.sampled and len(view.items) == 20
+    assert view.total == GraphView(graph).total
+    assert all(source in names(view) and target in names(view)
+               for source, target in view.edges)
+    assert all(item.name in names(view) for item in GraphView(graph).items if item.bold)
+    # the same seed gives the same sample
+    assert names(GraphView(graph, max_nodes=20)) == names(view)
+    assert not GraphView(graph, max_nodes=0).sampled
@@ -0,0 +1,75 @@
+"""Tests for the HTML mini-site, in particular the static output mode with its
+hashed stylesheet and precompressed pages."""
+
+import os
+import gzip
+import pathlib
+
+import pytest
+
+from summarizer import summary2html
+from summarizer.summary import Summary
+
+
+EXAMPLE = pathlib.Path(__file__).parent.parent / 'examples' / 'whisper-kaldi-doctr.mmif'
+
+
+@pytest.fixture(scope='module')
+def summary_json():
+    return Summary(EXAMPLE.read_text()).as_json(full=True, timeline=True)
+
+
+def html_files(directory):
+    return sorted(p.name for p in directory.glob('*.html'))
+
+
+def test_static_site(tmp_path, summary_json):
+    outdir = tmp_path / 'site'
+    summary2html.write_html(summary_json, 'example.json', outdir, static=True)
+    pages = html_files(outdir)
+    assert pages == sorted(summary2html.page_names(summary_json))
+    stylesheets = list(outdir.glob('style-*.css'))
+    assert len(stylesheets) == 1
+    stylesheet = stylesheets[0]
+    assert stylesheet.name == summary2html.write_stylesheet(outdir)
+    assert stylesheet.name[6:16] == summary2html.content_hash(stylesheet.read_text())[:10]
+    for name in pages + [stylesheet.name]:
+        path = outdir / name
+        assert gzip.decompress(summary2html.gzip_path(path).read_bytes()) == path.read_bytes()
+    index = (outdir / summary2html.index_page).read_text()
+    assert stylesheet.name in index
+    assert '\n  ' not in index
+
+
+def test_static_gzip_is_stable(tmp_path, summary_json):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    for outdir in (first, second):
+        summary2html.write_html(summary_json, 'example.json', outdir, static=True)
+    for path in first.glob('*.gz'):
+        assert path.read_bytes() == (second / path.name).read_bytes()
+
+
+def test_switch_to_dynamic(tmp_path, summary_json):
+    outdir = tmp_path / 'site'
+    summary2html.write_html(summary_json, 'example.json', outdir, static=True)
+    summary2html.write_html(summary_json, 'example.json', outdir)
+    assert list(outdir.glob('*.html.gz')) == []
+    assert html_files(outdir) == sorted(summary2html.page_names(summary_json))
+
+
+def test_unchanged_pages_are_not_written(tmp_path, summary_json):
+    outdir = tmp_path / 'site'
+    hashes = {}
+    summary2html.write_html(summary_json, 'example.json', outdir, hashes, static=True)
+    assert set(hashes) == summary2html.page_names(summary_json)
+    # rewriting a page would show up in the time stamp
+    for path in outdir.iterdir():
+        os.utime(path, ns=(1, 1))
+    summary2html.write_html(summary_json, 'example.json', outdir, hashes, static=True)
+    assert all(path.stat().st_mtime_ns == 1 for path in outdir.iterdir())
+    # pages that the summary no longer has are removed
+    smaller = {k: v for k, v in summary_json.items() if k != 'timeline'}
+    summary2html.write_html(smaller, 'example.json', outdir, hashes, static=True)
+    assert summary2html.timeline_page not in hashes
+    assert not (outdir / summary2html.timeline_page).exists()
+    assert not summary2html.gzip_path(outdir / summary2html.timeline_page).exists()
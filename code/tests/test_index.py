@@ -0,0 +1,103 @@
+"""Tests for the corpus index: incremental loading, skipped files, pruning and
+searching the text of transcripts."""
+
+import os
+import json
+import pathlib
+
+import pytest
+
+from summarizer import index
+from summarizer.index import SummaryIndex, IndexException
+from summarizer.summary import Summary
+
+
+EXAMPLE = pathlib.Path(__file__).parent.parent / 'examples' / 'whisper-kaldi-doctr.mmif'
+
+
+@pytest.fixture(scope='module')
+def summary_json():
+    return Summary(EXAMPLE.read_text()).as_json(full=True)
+
+
+@pytest.fixture
+def corpus(tmp_path, summary_json):
+    directory = tmp_path / 'summaries'
+    (directory / 'sub').mkdir(parents=True)
+    for name in ('one.json', 'sub/two.json'):
+        (directory / name).write_text(json.dumps(summary_json))
+    (directory / 'metrics.json').write_text(json.dumps({'files': 2}))
+    return directory
+
+
+def count(idx, table):
+    return idx.connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_incremental_add(tmp_path, corpus, monkeypatch):
+    idx = SummaryIndex(tmp_path / 'corpus.db')
+    assert idx.add_path(corpus) == {'added': 2, 'removed': 0}
+    assert count(idx, 'skipped') == 1
+    # nothing is read again, including the file that is not a summary
+    opened = []
+    monkeypatch.setattr(index, 'open_file', lambda path: opened.append(path))
+    assert idx.add_path(corpus) == {'added': 0, 'removed': 0}
+    assert opened == []
+    idx.close()
+
+
+def test_paths_are_resolved(tmp_path, corpus, monkeypatch):
+    idx = SummaryIndex(tmp_path / 'corpus.db')
+    idx.add_path(corpus)
+    monkeypatch.chdir(corpus)
+    assert idx.add_path('.') == {'added': 0, 'removed': 0}
+    assert idx.add_path('sub/two.json') == {'added': 0, 'removed': 0}
+    paths = [p for p, in idx.connection.execute('SELECT path FROM summaries')]
+    assert all(pathlib.Path(p).is_absolute() for p in paths)
+    assert count(idx, 'summaries') == 2
+    idx.close()
+
+
+def test_changed_and_removed(tmp_path, corpus, summary_json):
+    idx = SummaryIndex(tmp_path / 'corpus.db')
+    idx.add_path(corpus)
+    transcript = count(idx, 'transcript')
+    # a file that turns into a summary is added
+    metrics = corpus / 'metrics.json'
+    metrics.write_text(json.dumps(summary_json))
+    os.utime(metrics, (1, 1))
+    assert idx.add_path(corpus) == {'added': 1, 'removed': 0}
+    assert count(idx, 'skipped') == 0
+    (corpus / 'sub' / 'two.json').unlink()
+    metrics.unlink()
+    assert idx.add_path(corpus) == {'added': 0, 'removed': 2}
+    assert count(idx, 'summaries') == 1
+    assert count(idx, 'transcript') == transcript // 2
+    # the full-text index follows the table
+    text = summary_json['transcript'][0]['text']
+    assert set(r['asset'] for r in idx.find_in_transcript(text)) == {'one'}
+    idx.close()
+
+
+def test_find_in_transcript(tmp_path, corpus, summary_json):
+    idx = SummaryIndex(tmp_path / 'corpus.db')
+    idx.add_path(corpus)
+    text = summary_json['transcript'][0]['text']
+    word = max(text.split(), key=len)
+    found = idx.find_in_transcript(word.upper())
+    assert found and all(word.lower() in r['text'].lower() for r in found)
+    assert set(r['asset'] for r in found) == {'one', 'two'}
+    # short text and LIKE wildcards
+    assert idx.find_in_transcript('%%') == []
+    assert len(idx.find_in_transcript(word[:2])) >= len(found)
+    idx.close()
+
+
+def test_schema_version(tmp_path):
+    dbfile = tmp_path / 'corpus.db'
+    SummaryIndex(dbfile).close()
+    idx = SummaryIndex(dbfile)
+    idx.connection.execute('PRAGMA user_version = 1')
+    idx.close()
+    with pytest.raises(IndexException):
+        SummaryIndex(dbfile)
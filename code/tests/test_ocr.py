@@ -0,0 +1,37 @@
+"""Tests for the OCR section."""
+
+import pathlib
+
+from summarizer import config
+from summarizer.summary import Summary
+
+
+EXAMPLE = pathlib.Path(__file__).parent.parent / 'examples' / 'swt-doctr-ocr.mmif'
+
+
+def test_ocr_section():
+    summary = Summary(EXAMPLE.read_text())
+    ocr = summary.as_json(ocr=True)['ocr']
+    assert [group['time-point'] for group in ocr] == sorted(g['time-point'] for g in ocr)
+    documents = [doc for group in ocr for doc in group['documents']]
+    assert documents
+    # only documents from views with bounding boxes, so not the captions
+    for doc in documents:
+        view = summary.graph.get_node(doc['identifier']).view
+        assert config.BOUNDING_BOX in view.annotation_types
+    caption_ids = [c['identifier'] for c in summary.captions.as_json()]
+    assert caption_ids
+    assert not set(caption_ids) & set(doc['identifier'] for doc in documents)
+
+
+def test_ocr_levels():
+    summary = Summary(EXAMPLE.read_text())
+    ocr = summary.as_json(ocr=True)['ocr']
+    paragraphs = [p for group in ocr for doc in group['documents'] for p in doc['paragraphs']]
+    sentences = [s for p in paragraphs for s in p['sentences']]
+    tokens = [t for s in sentences for t in s['tokens']]
+    assert paragraphs and sentences and tokens
+    for element in paragraphs + sentences + tokens:
+        assert element['coordinates'] is not None
+    for sentence in sentences:
+        assert sentence['text'].split() == [t['text'] for t in sentence['tokens']]
@@ -0,0 +1,67 @@
+"""Tests for refreshing a summary after views were added to its graph.
+
+A summary is created from an example MMIF file with only its first views, the
+other views are added one at a time with Graph.add_view() and then the refreshed
+summary has to be the same as a summary created from the whole MMIF file.
+
+"""
+
+import json
+import pathlib
+
+import pytest
+from mmif import Mmif
+
+from summarizer.config import RunConfig
+from summarizer.summary import Summary
+
+
+EXAMPLES = pathlib.Path(__file__).parent.parent / 'examples'
+MMIF_FILES = sorted(EXAMPLES.glob('*.mmif'))
+
+
+def as_json(summary):
+    return summary.as_json(full=True, timeline=True, ocr=True)
+
+
+def partial_mmif(path, views):
+    """Return the Mmif for the file with only the first views and the views that
+    were left out."""
+    full = Mmif(path.read_text())
+    mmif_obj = json.loads(path.read_text())
+    mmif_obj['views'] = mmif_obj['views'][:views]
+    return Mmif(json.dumps(mmif_obj)), list(full.views)[views:]
+
+
+@pytest.mark.parametrize('path', MMIF_FILES, ids=lambda p: p.name)
+@pytest.mark.parametrize('granularity', (1000, 60000))
+def test_refresh_after_each_view(path, granularity):
+    run_config = RunConfig(granularity=granularity)
+    expected = as_json(Summary(path.read_text(), run_config))
+    for first in range(len(Mmif(path.read_text()).views)):
+        mmif, views = partial_mmif(path, first)
+        summary = Summary(mmif, run_config)
+        for view in views:
+            mmif.add_view(view)
+            summary.graph.add_view(view)
+            summary.refresh()
+        assert as_json(summary) == expected, f'difference after starting with {first} views'
+
+
+@pytest.mark.parametrize('path', MMIF_FILES, ids=lambda p: p.name)
+def test_refresh_after_all_views(path):
+    expected = as_json(Summary(path.read_text()))
+    mmif, views = partial_mmif(path, 1)
+    summary = Summary(mmif)
+    for view in views:
+        mmif.add_view(view)
+        summary.graph.add_view(view)
+    summary.refresh()
+    assert as_json(summary) == expected
+
+
+def test_refresh_without_updates():
+    summary = Summary(MMIF_FILES[0].read_text())
+    before = as_json(summary)
+    summary.refresh()
+    assert as_json(summary) == before
@@ -0,0 +1,89 @@
+"""Tests for updating the corpus site incrementally."""
+
+import os
+import json
+import pathlib
+
+import pytest
+
+from summarizer import site
+from summarizer.site import Site
+from summarizer.summary import Summary
+
+
+EXAMPLES = pathlib.Path(__file__).parent.parent / 'examples'
+
+
+@pytest.fixture(scope='module')
+def summary_jsons():
+    return [Summary(path.read_text()).as_json(full=True)
+            for path in sorted(EXAMPLES.glob('*.mmif'))]
+
+
+@pytest.fixture
+def summaries(tmp_path, summary_jsons):
+    directory = tmp_path / 'summaries'
+    (directory / 'sub').mkdir(parents=True)
+    (directory / 'one.json').write_text(json.dumps(summary_jsons[0]))
+    (directory / 'sub' / 'two.json').write_text(json.dumps(summary_jsons[1]))
+    (directory / 'metrics.json').write_text(json.dumps({'files': 2}))
+    return directory
+
+
+def update(summaries, outdir, static=False):
+    return Site(summaries, outdir, static).update()
+
+
+def test_incremental_update(tmp_path, summaries, summary_jsons):
+    outdir = tmp_path / 'site'
+    counts = update(summaries, outdir)
+    assert counts['assets'] == 2 and counts['changed'] == 2
+    assert (outdir / 'assets' / 'one' / 'index.html').exists()
+    assert (outdir / 'assets' / 'sub' / 'two' / 'index.html').exists()
+    # nothing changed
+    counts = update(summaries, outdir)
+    assert (counts['changed'], counts['removed'], counts['pages']) == (0, 0, 0)
+    # touched but the same content
+    os.utime(summaries / 'one.json', (1, 1))
+    assert update(summaries, outdir)['changed'] == 0
+    # a changed summary is rendered again, the other one is not
+    (summaries / 'one.json').write_text(json.dumps(summary_jsons[1]))
+    counts = update(summaries, outdir)
+    assert counts['changed'] == 1
+    # a removed summary loses its pages
+    (summaries / 'sub' / 'two.json').unlink()
+    counts = update(summaries, outdir)
+    assert (counts['assets'], counts['removed']) == (1, 1)
+    assert not (outdir / 'assets' / 'sub' / 'two').exists()
+
+
+def test_rejected_files(tmp_path, summaries, monkeypatch):
+    outdir = tmp_path / 'site'
+    update(summaries, outdir)
+    manifest = json.loads((outdir / 'site.json').read_text())
+    assert list(manifest['rejected']) == ['metrics.json']
+    # rejected files are not opened again
+    opened = []
+    monkeypatch.setattr(site, 'open_file', lambda path, mode: opened.append(path))
+    update(summaries, outdir)
+    assert opened == []
+    monkeypatch.undo()
+    # and are dropped from the manifest when they are removed
+    (summaries / 'metrics.json').unlink()
+    update(summaries, outdir)
+    manifest = json.loads((outdir / 'site.json').read_text())
+    assert manifest['rejected'] == {}
+
+
+def test_summary_becomes_invalid(tmp_path, summaries):
+    outdir = tmp_path / 'site'
+    update(summaries, outdir)
+    assert 'assets/one/index.html' in (outdir / 'assets-0000.html').read_text()
+    (summaries / 'one.json').write_text('{"truncated": ')
+    counts = update(summaries, outdir)
+    assert (counts['assets'], counts['removed']) == (1, 1)
+    assert not (outdir / 'assets' / 'one').exists()
+    manifest = json.loads((outdir / 'site.json').read_text())
+    assert 'one.json' not in manifest['assets']
+    assert 'one.json' in manifest['rejected']
+    assert 'assets/one/index.html' not in (outdir / 'assets-0000.html').read_text()
@@ -0,0 +1,66 @@
+"""Tests for graph snapshots and for cutting a graph loaded from a snapshot."""
+
+import pathlib
+
+import pytest
+from mmif import Mmif
+
+import cut
+from summarizer.config import RunConfig
+from summarizer.graph import Graph, GraphException
+from summarizer.summary import Summary
+
+
+EXAMPLE = pathlib.Path(__file__).parent.parent / 'examples' / 'whisper-kaldi-doctr.mmif'
+
+
+def create_graph():
+    return Graph(Mmif(EXAMPLE.read_text()), RunConfig(lean=True, asr_tables=True))
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / 'example.snapshot'
+    create_graph().save(path)
+    return path
+
+
+def test_is_snapshot(snapshot):
+    assert Graph.is_snapshot(snapshot)
+    assert not Graph.is_snapshot(EXAMPLE)
+
+
+def test_round_trip(snapshot):
+    graph = create_graph()
+    loaded = Graph.load(snapshot)
+    assert loaded.mmif is None
+    assert sorted(loaded.nodes) == sorted(graph.nodes)
+    assert sorted(loaded.token_tables) == sorted(graph.token_tables)
+    for identifier, node in graph.nodes.items():
+        assert ([t.identifier for t in loaded.nodes[identifier].targets]
+                == [t.identifier for t in node.targets])
+    expected = Summary(graph).as_json(full=True)
+    assert Summary(loaded).as_json(full=True) == expected
+
+
+def test_old_version_is_refused(snapshot, tmp_path):
+    data = snapshot.read_bytes()
+    old = tmp_path / 'old.snapshot'
+    old.write_bytes(data[:9] + bytes([1]) + data[10:])
+    with pytest.raises(GraphException, match='Unsupported snapshot version 1'):
+        Graph.load(old)
+
+
+def test_cut_snapshot(snapshot):
+    graph = cut.cut(str(snapshot), 0, 5000)
+    assert 0 < len(graph.nodes) < len(Graph.load(snapshot).nodes)
+    for node in graph.nodes.values():
+        if 'time-offsets' in node.anchors:
+            assert 0 <= node.anchors['time-offsets'][0] <= 5000
+    for table in graph.token_tables.values():
+        assert all(p2 <= 5000 for p2 in table.time_end)
+
+
+def test_cut_mmif_refuses_snapshot(snapshot):
+    with pytest.raises(GraphException, match='snapshot'):
+        cut.cut_mmif(str(snapshot), 0, 5000)
@@ -0,0 +1,128 @@
+"""Tests for the columnar tables of time frames and ASR tokens.
+
+The TimeFrameTable filters are run with plain lists and, when NumPy is installed,
+with NumPy arrays, and both have to give the same result.
+
+"""
+
+import pathlib
+from types import SimpleNamespace
+
+import pytest
+
+from summarizer import tables
+from summarizer.config import RunConfig
+from summarizer.summary import Summary
+from summarizer.tables import TimeFrameTable, TokenTable
+
+
+EXAMPLES = pathlib.Path(__file__).parent.parent / 'examples'
+MMIF_FILES = sorted(EXAMPLES.glob('*.mmif'))
+
+
+def timeframe(identifier, label, start, end, score=None, app='swt'):
+    classification = {} if score is None else {label: score}
+    return SimpleNamespace(
+        identifier=identifier, anchors={'time-offsets': (start, end)},
+        properties={'classification': classification},
+        view=SimpleNamespace(app=app),
+        frame_type=lambda: label, representatives=lambda: [])
+
+
+FRAMES = [timeframe('tf1', 'slate', 0, 1000, 0.9),
+          timeframe('tf2', 'chyron', 2000, 2500, 0.4),
+          timeframe('tf3', 'chyron', 3000, 6000, 0.8, app='other'),
+          timeframe('tf4', 'bars', 7000, 9000)]
+
+
+@pytest.fixture(params=['lists', 'numpy'])
+def columns(request, monkeypatch):
+    if request.param == 'lists':
+        monkeypatch.setattr(tables, 'np', None)
+    else:
+        monkeypatch.setattr(tables, 'np', pytest.importorskip('numpy'))
+
+
+def selected(table, **filters):
+    timeframes = table.as_json(table.mask(**filters))
+    return sorted(tf['identifier'] for frames in timeframes.values() for tf in frames)
+
+
+def test_timeframe_filters(columns):
+    table = TimeFrameTable(FRAMES)
+    assert len(table) == 4
+    assert selected(table) == ['tf1', 'tf2', 'tf3', 'tf4']
+    assert selected(table, min_score=0.5) == ['tf1', 'tf3']
+    assert selected(table, labels=['chyron']) == ['tf2', 'tf3']
+    assert selected(table, labels=['unknown']) == []
+    assert selected(table, min_duration=1000) == ['tf1', 'tf3', 'tf4']
+    assert selected(table, min_score=0.5, labels=['chyron'], min_duration=1000) == ['tf3']
+
+
+def test_timeframe_json(columns):
+    timeframes = TimeFrameTable(FRAMES).as_json()
+    assert list(timeframes) == ['swt', 'other']
+    tf1, tf2, tf4 = timeframes['swt']
+    assert tf1 == {'identifier': 'tf1', 'label': 'slate', 'score': 0.9,
+                   'start-time': 0, 'end-time': 1000, 'representatives': []}
+    assert tf4['score'] is None
+    # plain Python values, also with NumPy columns
+    assert type(tf2['start-time']) is int and type(tf2['score']) is float
+
+
+def token_table(sentences=None, alignments=None):
+    tokens = [{'id': f't{i}', 'start': i * 5, 'end': i * 5 + 4, 'word': f'w{i}',
+               'document': 'td1'} for i in range(4)]
+    timeframes = [{'id': f'f{i}', 'start': i * 100, 'end': i * 100 + 90,
+                   'timeUnit': 'milliseconds'} for i in range(4)]
+    if alignments is None:
+        alignments = [{'source': f'f{i}', 'target': f't{i}'} for i in range(4)]
+    if sentences is None:
+        sentences = [{'id': 's1', 'targets': ['t0', 't1']}, {'id': 's2', 'targets': ['t3']}]
+    return TokenTable.from_properties('v1', 'Token', 'TimeFrame', tokens, timeframes,
+                                      alignments, sentences)
+
+
+def test_token_table():
+    table = token_table()
+    assert len(table) == 4
+    assert table.token_constants == {'document': 'td1'}
+    assert table.timeframe_constants == {'timeUnit': 'milliseconds'}
+    assert table.find('t2') == (True, 2)
+    assert table.find('f3') == (False, 3)
+    assert table.find('x') is None
+    assert table.token_properties(1) == {'id': 't1', 'start': 5, 'end': 9,
+                                         'word': 'w1', 'document': 'td1'}
+    assert table.timeframe_properties(1)['start'] == 100
+    assert table.sentence_rows() == [[0, 1], [3]]
+    selection = table.select([1, 3])
+    assert selection.identifiers == ['t1', 't3']
+    assert list(selection.time_end) == [190, 390]
+    restored = TokenTable.from_data(table.as_data())
+    assert restored.as_data() == table.as_data()
+
+
+@pytest.mark.parametrize('sentences, alignments', [
+    # a token that is not aligned
+    (None, [{'source': f'f{i}', 'target': f't{i}'} for i in range(3)]),
+    # a time frame aligned to two tokens
+    (None, [{'source': 'f0', 'target': f't{i}'} for i in range(4)]),
+    # a token aligned to something else
+    (None, [{'source': f'f{i}', 'target': f't{i}'} for i in range(4)]
+           + [{'source': 't0', 'target': 'bb1'}]),
+    # a token in two sentences
+    ([{'id': 's1', 'targets': ['t0', 't1']}, {'id': 's2', 'targets': ['t1']}], None),
+    # tokens out of order
+    ([{'id': 's1', 'targets': ['t1', 't0']}], None)])
+def test_token_table_refused(sentences, alignments):
+    assert token_table(sentences, alignments) is None
+
+
+@pytest.mark.parametrize('path', MMIF_FILES, ids=lambda p: p.name)
+def test_summary_with_token_tables(path):
+    options = dict(full=True, timeline=True, ocr=True, all_transcripts=True)
+    with_tables = Summary(path.read_text(), RunConfig(asr_tables=True))
+    without_tables = Summary(path.read_text(), RunConfig(asr_tables=False))
+    assert with_tables.graph.token_tables
+    assert not without_tables.graph.token_tables
+    assert with_tables.as_json(**options) == without_tables.as_json(**options)
@@ -0,0 +1,72 @@
+"""Stress test for summarizing MMIF files concurrently in one process.
+
+Creates summaries for the example MMIF files sequentially and then creates them
+again many times in a thread pool, using two different granularities at the same
+time and letting some summaries share a graph. All concurrent summaries have to
+be the same as the sequential ones and summarizing should not change the Mmif
+objects. The tasks are shuffled with a fixed seed so a failure can be repeated.
+Run it on a free-threaded Python to get real parallelism.
+
+"""
+
+import random
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from mmif import Mmif
+
+from summarizer.config import RunConfig
+from summarizer.graph import Graph
+from summarizer.summary import Summary
+
+
+EXAMPLES = pathlib.Path(__file__).parent.parent / 'examples'
+MMIF_FILES = sorted(EXAMPLES.glob('*.mmif'))
+
+GRANULARITIES = (1000, 60000)
+THREADS = 16
+ROUNDS = 10
+SEED = 0
+
+
+def summarize(task):
+    """Summarize one (mmif, graph, granularity) task, using the shared graph if
+    there is one."""
+    mmif, graph, granularity = task
+    run_config = RunConfig(granularity=granularity)
+    summary = Summary(graph if graph is not None else mmif, run_config)
+    return summary.as_json(full=True, timeline=True, ocr=True)
+
+
+@pytest.fixture(scope='module')
+def mmifs():
+    return [Mmif(path.read_text()) for path in MMIF_FILES]
+
+
+def test_examples_exist():
+    assert MMIF_FILES
+
+
+def test_concurrent_summaries(mmifs):
+    serialized = [mmif.serialize() for mmif in mmifs]
+    graphs = [Graph(mmif) for mmif in mmifs]
+    expected = {}
+    for i, mmif in enumerate(mmifs):
+        for granularity in GRANULARITIES:
+            expected[(i, granularity)] = summarize((mmif, None, granularity))
+    rng = random.Random(SEED)
+    tasks = []
+    for _ in range(ROUNDS):
+        for i in range(len(mmifs)):
+            for granularity in GRANULARITIES:
+                graph = rng.choice([None, graphs[i]])
+                tasks.append((i, (mmifs[i], graph, granularity)))
+    rng.shuffle(tasks)
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(summarize, [task for _, task in tasks]))
+    for (i, (_, _, granularity)), result in zip(tasks, results):
+        assert result == expected[(i, granularity)], \
+            f'difference for {MMIF_FILES[i].name} with granularity {granularity}'
+    for path, mmif, before in zip(MMIF_FILES, mmifs, serialized):
+        assert mmif.serialize() == before, f'the Mmif object for {path.name} was changed'
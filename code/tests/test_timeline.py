@@ -0,0 +1,34 @@
+"""Tests for the timeline, which merges the sections on start time."""
+
+import pathlib
+from types import SimpleNamespace
+
+from summarizer.summary import Summary, Timeline
+
+
+EXAMPLE = pathlib.Path(__file__).parent.parent / 'examples' / 'whisper-kaldi-doctr.mmif'
+
+
+def test_timeline_is_sorted():
+    summary = Summary(EXAMPLE.read_text())
+    events = list(Timeline(summary))
+    assert events
+    starts = [event['start-time'] for event in events]
+    assert starts == sorted(starts)
+
+
+def test_events_without_start_time():
+    frames = [{'start-time': None, 'end-time': None, 'label': 'slate', 'score': 1.0},
+              {'start-time': 500, 'end-time': 900, 'label': 'slate', 'score': 1.0}]
+    summary = SimpleNamespace(
+        transcript=SimpleNamespace(data=[
+            {'start-time': None, 'end-time': None, 'text': 'no time'},
+            {'start-time': 100, 'end-time': 200, 'text': 'hello'}]),
+        captions=SimpleNamespace(captions=[
+            {'identifier': 'c1', 'time-point': None, 'text': 'no time'},
+            {'identifier': 'c2', 'time-point': 300, 'text': 'a caption'}]),
+        timeframes=SimpleNamespace(as_json=lambda **filters: {'swt': frames}),
+        entities=SimpleNamespace(nodes_idx={}))
+    events = list(Timeline(summary))
+    assert [(e['type'], e['start-time']) for e in events] == [
+        ('transcript', 100), ('caption', 300), ('timeframe', 500)]
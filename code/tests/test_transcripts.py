@@ -0,0 +1,22 @@
+"""Tests for the transcripts of all ASR views."""
+
+import pathlib
+
+from summarizer.summary import Summary
+from summarizer.utils import get_transcript_views
+
+
+EXAMPLE = pathlib.Path(__file__).parent.parent / 'examples' / 'whisper-kaldi-doctr.mmif'
+
+
+def test_all_transcripts():
+    summary = Summary(EXAMPLE.read_text())
+    views = get_transcript_views(summary.graph.views.values())
+    transcripts = summary.all_transcripts()
+    assert len(views) > 1
+    assert [t.view for t in transcripts] == views
+    assert transcripts[-1] is summary.transcript
+    assert summary.all_transcripts() is transcripts
+    transcripts_json = summary.as_json(all_transcripts=True)['transcripts']
+    assert [t['view'] for t in transcripts_json] == [v.id for v in views]
+    assert all(t['transcript'] for t in transcripts_json)
@@ -19,6 +19,24 @@ Visualize MMIF:
         examples/dot-v9.mmif.pdf
         examples/dot-v9.mmif.png
 
+Visualize the graph from a snapshot created with "summarize --snapshot":
+
+    $ python visualize.py --graph -i examples/input-v9.snapshot -o examples/dot-v9
+
+Large graphs, for example from Kaldi, Whisper or DocTR, are too big for graphviz,
+use these options to draw part of the graph (see summarizer/graphview.py):
+
+    --window START-END  only draw nodes anchored between START and END, which are
+                        in milliseconds, and the nodes linked to them
+    --collapse          draw similar nodes as one node with a count, for example
+                        "20,000 Token→TimeFrame pairs"
+    --max-nodes N       draw a sample of at most N nodes, this also applies to
+                        --mmif (default 0, which draws all nodes)
+    --seed N            seed for the sample
+
+    $ python visualize.py --graph --collapse --window 60000-120000 -i big.mmif -o dot
+    $ python visualize.py --mmif --max-nodes 1000 -i big.mmif -o dot
+
 Visualize summary:
 
     $ python visualize.py --summary -i examples/output-v9.json -o examples/dot-v9
@@ -41,6 +59,19 @@ Visualize summary:
         examples/dot-v9.summary.views.pdf
         examples/dot-v9.summary.views.png
 
+    (and examples/dot-v9.summary.caps with its PDF and PNG files)
+
+Visualize all summaries in a directory tree, for a summary at PATH.json the files
+start with dot/PATH:
+
+    $ python visualize.py --summary -i summaries/ -o dot
+
+Each graph is rendered to PDF and PNG by a separate graphviz process, these run in
+parallel, by default with one process per CPU up to 8, or as many as set with
+--jobs N. A graph is not rendered again when the graphviz source is the same as in
+the last run and the images are still there, so on a second run only the images of
+sections of the summary that changed are recreated.
+
 If you use the commands as above you can load the file "examples/dot-v9.html" in
 your browser to view the PNG images.
 
@@ -48,87 +79,216 @@ TODO: the file "examples/dot-v9.html" should be created from a template
 
 """
 
+import os
 import sys
 import json
+import random
 import pathlib
 import collections
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 import graphviz
 
 from mmif import Mmif
-from graph import Graph
-from utils import get_shape_and_color, get_view_label, get_label
+from summarizer.config import RunConfig
+from summarizer.graph import Graph
+from summarizer.diagnostics import Diagnostics
+from summarizer.graphview import GraphView, parse_window
+from summarizer.utils import get_shape_and_color, get_view_label, get_label, get_node_label
+from summarizer.utils import normalized_properties, open_file, strip_compression_suffix
+from summarizer.index import summary_files
 
 
 FRAME_TYPES = ['bars-and-tone', 'slate', 'segments']
 
+# Formats that each graph is rendered to
+FORMATS = ['pdf', 'png']
+
+# Default number of graphviz processes that run at the same time
+JOBS = min(8, os.cpu_count() or 1)
+
+
+# Rendering
+
+class Renderer(object):
+
+    """Renders graphs to all formats, with at most jobs graphviz processes running
+    at the same time. Rendering a graph only waits for the graphviz source to be
+    written, call close() or use the renderer as a context manager to wait for the
+    images. A graph is not rendered again when its source did not change since the
+    last run and the images are there, so visualizing a summary again only renders
+    the sections that changed.
+
+    jobs     -  maximum number of graphviz processes
+    pool     -  the thread pool that runs graphviz
+    futures  -  list of futures for submitted renders
+    skipped  -  number of graphs that were not rendered because they did not change
+
+    """
+
+    def __init__(self, jobs: int = JOBS):
+        self.jobs = jobs
+        self.pool = ThreadPoolExecutor(max_workers=jobs)
+        self.futures = []
+        self.skipped = 0
+
+    def __str__(self):
+        return f'<Renderer jobs={self.jobs} pending={len(self.futures)} skipped={self.skipped}>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def render(self, dot: graphviz.Digraph, fname: str):
+        if is_unchanged(dot, fname):
+            print(f'Skipping {fname}, unchanged')
+            self.skipped += 1
+            return
+        print(f'Writing {fname}')
+        # saved once here so renders of the formats do not each write the source
+        dot.save(fname)
+        for image_format in FORMATS:
+            self.futures.append(self.pool.submit(graphviz.render, 'dot', image_format, fname))
+
+    def close(self):
+        """Wait for all renders and raise the first error of any of them."""
+        self.pool.shutdown(wait=True)
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+
+def render(dot: graphviz.Digraph, fname: str, renderer: Renderer = None):
+    """Render the graph with the renderer, or right away if there is no renderer."""
+    if renderer is None:
+        with Renderer() as renderer:
+            renderer.render(dot, fname)
+    else:
+        renderer.render(dot, fname)
+
+
+def is_unchanged(dot: graphviz.Digraph, fname: str) -> bool:
+    """Return True if the source of the graph is the same as the one written to
+    fname before and the images are not older than that source."""
+    source = pathlib.Path(fname)
+    if not source.exists() or source.read_text(encoding='utf8') != dot.source:
+        return False
+    images = [pathlib.Path(f'{fname}.{image_format}') for image_format in FORMATS]
+    return all(image.exists() and image.stat().st_mtime >= source.stat().st_mtime
+               for image in images)
+
 
 # Visualizing the MMIF file and the Graph created from it
 
-def visualize_mmif(mmif: Mmif, out: str):
-    """Visualize the explicit links in the MMIF file."""
+def visualize_mmif(mmif: Mmif, out: str, max_nodes: int = 0, seed: int = 0,
+                   renderer: 'Renderer' = None):
+    """Visualize the explicit links in the MMIF file. With more than max_nodes
+    annotations a random sample is drawn, with the alignments between them."""
     # TODO: this is not working as it should probably due to lack of
     # standardization in the identifiers, will fix this after taking
     # a good look at the graph and summarizer code.
     dot = graphviz.Digraph(comment=out)
+    diagnostics = Diagnostics()
+    annotations = []
     alignments = []
+    doc_ids = set(doc.id for doc in mmif.documents)
     for view in mmif.views:
         for anno in view.annotations:
-            identifier = anno.id.replace(':', ' ')
+            # identifiers with the view identifier, the MMIF file is not changed
+            props = normalized_properties(doc_ids, view, anno)
             if anno.at_type.shortname == 'Alignment':
-                alignments.append((view.id, anno))
+                alignments.append((view.id, props))
             else:
-                shape, color = get_shape_and_color(anno.at_type.shortname)
-                label = get_label(view, anno)
-                dot.node(identifier, shape=shape, color=color, label=label)
-    for view_id, alignment in alignments:
-        identifier = alignment.id.replace(':', ' ')
-        source = alignment.properties['source'].replace(':', ' ')
-        target = alignment.properties['target'].replace(':', ' ')
+                annotations.append((view, anno, props))
+    if max_nodes and len(annotations) > max_nodes:
+        dot.attr(label=f'sample of {max_nodes} of {len(annotations)} annotations')
+        rows = sorted(random.Random(seed).sample(range(len(annotations)), max_nodes))
+        annotations = [annotations[row] for row in rows]
+    drawn = set()
+    for view, anno, props in annotations:
+        identifier = props['id'].replace(':', ' ')
+        drawn.add(identifier)
+        shape, color = get_shape_and_color(anno.at_type.shortname, diagnostics)
+        label = get_label(view, anno)
+        dot.node(identifier, shape=shape, color=color, label=label)
+    for view_id, props in alignments:
+        identifier = props['id'].replace(':', ' ')
+        source = props['source'].replace(':', ' ')
+        target = props['target'].replace(':', ' ')
+        if max_nodes and (source not in drawn or target not in drawn):
+            continue
         dot.node(identifier, shape='diamond')
         dot.edge(identifier, source)
         dot.edge(identifier, target)
-    dot.render(out, format='pdf')
-    dot.render(out, format='png')
+    diagnostics.print_warnings()
+    render(dot, out, renderer)
 
 
-def visualize_graph(graph: Graph, out: str):
+def visualize_graph(graph: Graph, out: str, window: tuple = None, collapse=False,
+                    max_nodes: int = 0, seed: int = 0, renderer: 'Renderer' = None):
+    """Visualize the graph, or the part of it selected by the time window, with
+    similar nodes collapsed and with at most max_nodes nodes, see GraphView."""
+    view = GraphView(graph, window=window, collapse=collapse, max_nodes=max_nodes,
+                     seed=seed)
+    print(view)
     dot = graphviz.Digraph(comment=out)
-    nodes = list(graph.nodes.values())
-    for node in nodes:
-        node_name = node.identifier.replace(':', '_')
-        label = get_label(node.view, node.annotation)
-        shape, color = get_shape_and_color(node.at_type.shortname)
-        style = 'bold' if node.view is None else None
-        dot.node(node_name, label=label, shape=shape, color=color, style=style)
-    for node in nodes:
-        node_name = node.identifier.replace(':', '_')
-        for t in node.targets:
-            target_name = t.identifier.replace(':', '_')
-            # TODO: this should not depend on a specific identifier
-            if (target_name != 'm1'):
-                dot.edge(node_name, target_name)
-    dot.render(out, format='pdf')
-    dot.render(out, format='png')
+    if view.sampled:
+        dot.attr(label=f'sample of {len(view.items)} of {view.total} nodes')
+    for item in view.items:
+        shape, color = get_shape_and_color(item.at_type, graph.diagnostics)
+        style = 'bold' if item.bold else None
+        if item.is_cluster:
+            shape, style = 'box3d', 'bold'
+        dot.node(item.name, label=item.label, shape=shape, color=color, style=style)
+    for (source, target), count in view.edges.items():
+        # TODO: this should not depend on a specific identifier
+        if (target != 'm1'):
+            dot.edge(source, target, label=str(count) if count > 1 else None)
+    graph.diagnostics.print_warnings()
+    render(dot, out, renderer)
 
 
 # Visualizing the summary
 
-def visualize_summary(fname: str, out: str):
+def visualize_summary(fname: str, out: str, renderer: 'Renderer' = None):
     """Visualize the summary in file 'fname' by creating a set of graphs all
-    starting with 'out'."""
-    summary = json.load(open(fname))
+    starting with 'out'. The graphs are rendered concurrently by the renderer."""
+    if renderer is None:
+        with Renderer() as renderer:
+            return visualize_summary(fname, out, renderer)
+    with open_file(fname) as fh:
+        summary = json.load(fh)
     print(summary.keys())
-    _visualize_views(summary.get('views', []), out + '.summary.views')
-    _visualize_transcript(summary.get('transcript', []), out + '.summary.trans')
-    _visualize_timeframes(summary, out + '.summary.tfs')
-    _visualize_tags(summary.get('tags', []), out + '.summary.tags')
-    _visualize_entities(summary.get('entities', []), out + '.summary.ents')
-    _visualize_caption(summary.get('captions', []), out + '.summary.caps')
-
-
-def _visualize_views(views: list, fname: str):
+    _visualize_views(summary.get('views', []), out + '.summary.views', renderer)
+    _visualize_transcript(summary.get('transcript', []), out + '.summary.trans', renderer)
+    _visualize_timeframes(summary, out + '.summary.tfs', renderer)
+    _visualize_tags(summary.get('tags', []), out + '.summary.tags', renderer)
+    _visualize_entities(summary.get('entities', []), out + '.summary.ents', renderer)
+    _visualize_caption(summary.get('captions', []), out + '.summary.caps', renderer)
+
+
+def visualize_summaries(directory: str, outdir: str, renderer: 'Renderer' = None):
+    """Visualize all summaries in the directory tree, the graphs for a summary
+    at PATH.json are written to outdir/PATH.summary.*."""
+    if renderer is None:
+        with Renderer() as renderer:
+            return visualize_summaries(directory, outdir, renderer)
+    directory = pathlib.Path(directory)
+    for path in sorted(summary_files(directory)):
+        with open_file(path) as fh:
+            summary = json.load(fh)
+        if not isinstance(summary, dict) or 'views' not in summary:
+            # some other JSON file, for example batch metrics
+            continue
+        out = pathlib.Path(outdir) / strip_compression_suffix(path.relative_to(directory))[:-5]
+        out.parent.mkdir(parents=True, exist_ok=True)
+        visualize_summary(path, str(out), renderer)
+
+
+def _visualize_views(views: list, fname: str, renderer: 'Renderer'):
     dot = graphviz.Digraph(comment=fname)
     dot.node('views', shape='cylinder')
     for view in views:
@@ -140,16 +300,14 @@ def _visualize_views(views: list, fname: str):
         print('>>>', app, view_label)
         dot.node(view_label, shape='box')
         dot.edge('views', view_label)
-    print(f'Writing {fname}')
-    dot.render(fname, format='pdf')
-    dot.render(fname, format='png')
+    renderer.render(dot, fname)
 
 
-def _visualize_transcript(transcript: list, fname):
+def _visualize_transcript(transcript: list, fname, renderer: 'Renderer'):
     dot = graphviz.Digraph(comment=fname)
     dot.node('transcript', shape='cylinder')
     # TODO: this is a total hack just for the demo, delete afterwards
-    dot.node(f'transcript-text', label=table, shape="box", color='darkblue')
+    dot.node(f'transcript-text', label=t, shape="box", color='darkblue')
     dot.edge('transcript', 'transcript-text')
     if False:
         # TODO: this should replace the above, but only once we have set up the input
@@ -159,27 +317,23 @@ def _visualize_transcript(transcript: list, fname):
             dot.node(f'pos-s{n}', label=f'{p1}-{p2}', color='darkred')
             dot.edge('transcript', f'line-s{n}')
             dot.edge(f'line-s{n}', f'pos-s{n}')
-    print(f'Writing {fname}')
-    dot.render(fname, format='pdf')
-    dot.render(fname, format='png')
+    renderer.render(dot, fname)
 
 
-def _visualize_timeframes(summary: dict, fname: str):
+def _visualize_timeframes(summary: dict, fname: str, renderer: 'Renderer'):
     dot = graphviz.Digraph(comment=fname)
     for frame_type in FRAME_TYPES:
         dot.node(frame_type, shape='cylinder')
         #print(summary)
-        for tf in summary[frame_type]:
+        for tf in summary.get(frame_type, []):
             identifier = tf['id'].replace(':', '|')
             label = f'{tf["frameType"]}\n{tf["start"]}-{tf["end"]} '
             dot.node(identifier, label=f'{label}', color="darkred")
             dot.edge(frame_type, identifier)
-    print(f'Writing {fname}')
-    dot.render(fname, format='pdf')
-    dot.render(fname, format='png')
+    renderer.render(dot, fname)
 
 
-def _visualize_tags(tags: list, fname: str):
+def _visualize_tags(tags: list, fname: str, renderer: 'Renderer'):
     # TODO: totally in progress, it is now a bit of a hack that may only work for
     # the example bundled with the code (input-v9.mmif)
     dot = graphviz.Digraph(comment=fname)
@@ -193,12 +347,10 @@ def _visualize_tags(tags: list, fname: str):
         dot.edge(tag_name, tag_text)
         dot.node(tag_name + 'bb', label='3500', color='darkgreen', shape='box')
         dot.edge(tag_text, tag_name + 'bb')
-    print(f'Writing {fname}')
-    dot.render(fname, format='pdf')
-    dot.render(fname, format='png')
+    renderer.render(dot, fname)
 
 
-def _visualize_entities(entities: list, fname: str):
+def _visualize_entities(entities: list, fname: str, renderer: 'Renderer'):
     # TODO: totally in progress, it is now a total hack that only works for one of 
     # the examples bundled with the code (input-v7.mmif)
     dot = graphviz.Digraph(comment=fname)
@@ -220,9 +372,7 @@ def _visualize_entities(entities: list, fname: str):
                 label = f'{tps[0]}-{tps[-1]}'
             dot.node(group_id, label=label, color='darkred')
             dot.edge(etext, group_id)
-    print(f'Writing {fname}')
-    dot.render(fname, format='pdf')
-    dot.render(fname, format='png')
+    renderer.render(dot, fname)
 
 
 
@@ -246,11 +396,14 @@ t = '''<<table cellspacing="0" cellpadding="5" border="0">
 </table>>
 '''
 
-def _visualize_caption(captions: list, fname: str):
+def _visualize_caption(captions: list, fname: str, renderer: 'Renderer'):
     dot = graphviz.Digraph(comment=fname)
     dot.node('Captions', shape='cylinder')
     tab = '''<<table cellspacing="0" cellpadding="5" border="0">\n'''
-    for _, p1, p2, text in captions:
+    for caption in captions:
+        # captions are anchored to a time point
+        p1 = p2 = caption['time-point']
+        text = caption['text']
         h, m, s, ms = convert_milliseconds(p1)
         timestamp = f'{m:02d}:{s:02d}.{ms:04d}'
         timestamp = f'{m:02d}:{s:02d}'
@@ -263,9 +416,7 @@ def _visualize_caption(captions: list, fname: str):
         dot.edge('Captions', f'text-{p1}-{p2}')
         dot.edge(f'text-{p1}-{p2}', f'tf-{p1}-{p2}')
     tab = tab + '\n</table>>'
-    print(f'Writing {fname}')
-    dot.render(fname, format='pdf')
-    dot.render(fname, format='png')
+    renderer.render(dot, fname)
 
 
 # Utilities
@@ -289,14 +440,24 @@ def create_argument_parser():
     h_mmif = "visualize a MMIF file, both the raw file and the underlying graph"
     h_graph = "visualize the underlying graph of a MMIF file"
     h_summary = "visualize the summary of a MMIF file"
-    h_input = "input file, either a MMIF file or a summary"
+    h_input = "input file, either a MMIF file, a graph snapshot, a summary or a directory of summaries"
     h_output = "output directory for graphviz files (default='.')"
+    h_window = "only draw the graph between two times in milliseconds"
+    h_collapse = "draw similar nodes in the graph as one node"
+    h_max_nodes = "draw a sample of at most N nodes (default=0, which draws all nodes)"
+    h_seed = "seed for sampling nodes (default=0)"
+    h_jobs = f"number of graphviz processes running at the same time (default={JOBS})"
     parser = argparse.ArgumentParser()
     parser.add_argument('--mmif', action="store_true", help=h_mmif)
-    parser.add_argument('--graph', action="store_true", help=h_mmif)
+    parser.add_argument('--graph', action="store_true", help=h_graph)
     parser.add_argument('--summary', action="store_true", help=h_summary)
     parser.add_argument('-i', metavar='FILE', help=h_input)
     parser.add_argument('-o', metavar='PATH', help=h_output, default='.')
+    parser.add_argument('--window', metavar='START-END', type=parse_window, help=h_window)
+    parser.add_argument('--collapse', action='store_true', help=h_collapse)
+    parser.add_argument('--max-nodes', metavar='N', type=int, default=0, help=h_max_nodes)
+    parser.add_argument('--seed', metavar='N', type=int, default=0, help=h_seed)
+    parser.add_argument('--jobs', metavar='N', type=int, default=JOBS, help=h_jobs)
     return parser
 
 
@@ -319,19 +480,34 @@ if __name__ == '__main__':
         exit()
 
 
-    if args.graph or args.mmif:
-        mmif = Mmif(open(args.i).read())
-        if args.graph:
-            graph = Graph(mmif)
-            visualize_graph(graph, f'{args.o}.graph')
-        if args.mmif:
-            mmif = Mmif(open(args.i).read())
-            graph = Graph(mmif)
-            #graph.trim(0, 10000)
-            visualize_mmif(mmif, f'{args.o}.mmif')
+    with Renderer(args.jobs) as renderer:
 
-    if args.summary:
-        visualize_summary(args.i, args.o)
+        if (args.graph or args.mmif) and Graph.is_snapshot(args.i):
+            # a snapshot has the graph but not the raw MMIF
+            if args.mmif:
+                print('\nWARNING: cannot use --mmif on a graph snapshot\n')
+            if args.graph:
+                graph = Graph.load(args.i)
+                visualize_graph(graph, f'{args.o}.graph', args.window, args.collapse,
+                                args.max_nodes, args.seed, renderer)
+
+        elif args.graph or args.mmif:
+            mmif = Mmif(open(args.i).read())
+            # the raw MMIF is drawn first because creating the graph may add
+            # properties to annotations, its images render while the graph is built
+            if args.mmif:
+                visualize_mmif(mmif, f'{args.o}.mmif', args.max_nodes, args.seed, renderer)
+            if args.graph:
+                # tokens and time frames in token tables are drawn from the selected
+                # rows of the tables, which also makes the time window cheap
+                graph = Graph(mmif, RunConfig(asr_tables=True))
+                visualize_graph(graph, f'{args.o}.graph', args.window, args.collapse,
+                                args.max_nodes, args.seed, renderer)
+
+        if args.summary and os.path.isdir(args.i):
+            visualize_summaries(args.i, args.o, renderer)
+        elif args.summary:
+            visualize_summary(args.i, args.o, renderer)
 
     #doctr_example(sys.argv[1])
 